@@ -0,0 +1,286 @@
+# Time Ducky's main operations, on the bundled arid.bin and on seeded synthetic tiles, i.e.:
+#
+#   python benchmarks/run_benchmarks.py --output baseline.json
+#   ... make changes ...
+#   python benchmarks/run_benchmarks.py --baseline baseline.json
+#
+# Every benchmark records its best and median time over several runs, and the peak memory allocated
+# during one extra run (measured with tracemalloc, which sees everything allocated through Python,
+# including NumPy arrays, but not the pixel buffers of Pillow images). Comparing against a baseline flags anything that got slower or
+# hungrier than the thresholds, and exits with 1.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sw_ducky import MapGeometry, TileSet
+from sw_ducky.glyphs import glyph_quads
+from sw_ducky.synthetic import synthetic_tile, write_synthetic_island
+
+RESULTS_VERSION = 1
+
+ARID_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arid.bin')
+
+RENDER_SIZES = [100, 500, 1000, 2000]
+
+# A benchmark is a setup function, returning the function to time. Setup is never timed.
+BENCHMARKS: Dict[str, Callable[[dict], Callable[[], object]]] = {}
+
+def benchmark(name: str):
+
+    def register(setup: Callable[[dict], Callable[[], object]]):
+
+        BENCHMARKS[name] = setup
+
+        return setup
+
+    return register
+
+def synthetic(settings: dict, **overrides) -> MapGeometry:
+
+    arguments = {key: settings[key] for key in ('seed', 'triangles_per_layer', 'quads_per_group', 'text_labels')}
+    arguments.update(overrides)
+
+    return synthetic_tile(**arguments)
+
+def synthetic_path(settings: dict) -> str:
+
+    path = os.path.join(settings['work_directory'], 'synthetic_map_geometry.bin')
+
+    if not os.path.exists(path):
+        synthetic(settings).save_as(path)
+
+    return path
+
+@benchmark('from_file/arid')
+def _(settings):
+    return lambda: MapGeometry.from_file(ARID_PATH)
+
+@benchmark('from_file/arid/compact')
+def _(settings):
+    return lambda: MapGeometry.from_file(ARID_PATH, compact = True)
+
+@benchmark('from_file/synthetic')
+def _(settings):
+    path = synthetic_path(settings)
+    return lambda: MapGeometry.from_file(path)
+
+@benchmark('from_file/synthetic/compact')
+def _(settings):
+    path = synthetic_path(settings)
+    return lambda: MapGeometry.from_file(path, compact = True)
+
+@benchmark('save_as/arid/unmodified')
+def _(settings):
+    geo = MapGeometry.from_file(ARID_PATH)
+    path = os.path.join(settings['work_directory'], 'saved.bin')
+    return lambda: geo.save_as(path)
+
+@benchmark('save_as/synthetic')
+def _(settings):
+    geo = synthetic(settings)
+    path = os.path.join(settings['work_directory'], 'saved.bin')
+    return lambda: geo.save_as(path)
+
+def _render(geo: MapGeometry, size: int) -> Callable[[], object]:
+    return lambda: geo.render_to_image(size)
+
+for _size in RENDER_SIZES:
+    benchmark(f'render_to_image/arid/{_size}')(lambda settings, size = _size: _render(MapGeometry.from_file(ARID_PATH), size))
+    benchmark(f'render_to_image/synthetic/{_size}')(lambda settings, size = _size: _render(synthetic(settings), size))
+
+def _text(settings: dict, bolded: bool) -> Callable[[], object]:
+
+    rng = np.random.default_rng(settings['seed'])
+
+    labels = [
+        (''.join(rng.choice(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'), 8)), *rng.uniform(-450, 400, 2).tolist())
+        for _ in range(settings['text_benchmark_labels'])
+    ]
+
+    def run():
+
+        # Start from a cold glyph cache every time
+        glyph_quads.cache_clear()
+
+        geo = MapGeometry()
+
+        for text, x, y in labels:
+            if bolded:
+                geo.add_bolded_text(1, text, x, y, 30)
+            else:
+                geo.add_text(1, text, x, y, 30)
+
+        return geo
+
+    return run
+
+@benchmark('add_text')
+def _(settings):
+    return _text(settings, False)
+
+@benchmark('add_bolded_text')
+def _(settings):
+    return _text(settings, True)
+
+@benchmark('tileset_load')
+def _(settings):
+
+    directory = os.path.join(settings['work_directory'], 'grid')
+
+    if not os.path.exists(directory):
+        size = settings['grid_size']
+        write_synthetic_island(directory, 'synthetic_island', size, size, seed = settings['seed'], triangles_per_layer = settings['triangles_per_layer'], quads_per_group = settings['quads_per_group'])
+
+    return lambda: TileSet(directory, 'synthetic_island').load(processes = settings['grid_processes'])
+
+def measure(function: Callable[[], object], repeat: int) -> dict:
+
+    '''
+    Time a function over several runs, then measure its peak memory in one extra run.
+    '''
+
+    times = []
+
+    for _ in range(repeat):
+
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+
+    try:
+        function()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min_seconds': min(times),
+        'median_seconds': statistics.median(times),
+        'peak_bytes': peak_bytes,
+        'runs': repeat,
+    }
+
+def compare(results: dict, baseline: dict, time_threshold: float, memory_threshold: float) -> List[str]:
+
+    '''
+    List every benchmark which got slower (by median time) or used more memory than the baseline allows.
+    '''
+
+    regressions = []
+
+    for name, result in results['results'].items():
+
+        previous = baseline['results'].get(name)
+
+        if previous is None:
+            continue
+
+        time_ratio = result['median_seconds'] / max(previous['median_seconds'], 1e-9)
+        memory_ratio = result['peak_bytes'] / max(previous['peak_bytes'], 1)
+
+        if time_ratio > 1 + time_threshold:
+            regressions.append(f'{name}: {time_ratio:.2f}x slower ({previous["median_seconds"] * 1000:.2f} ms -> {result["median_seconds"] * 1000:.2f} ms)')
+
+        if memory_ratio > 1 + memory_threshold:
+            regressions.append(f'{name}: {memory_ratio:.2f}x more memory ({previous["peak_bytes"]} -> {result["peak_bytes"]} bytes)')
+
+    return regressions
+
+def run(settings: dict, names: List[str], repeat: int) -> dict:
+
+    results = {}
+
+    for name in names:
+
+        function = BENCHMARKS[name](settings)
+
+        results[name] = measure(function, 1 if name == 'tileset_load' else repeat)
+
+        print(f'{name:40} {results[name]["median_seconds"] * 1000:10.2f} ms {results[name]["peak_bytes"] / 2 ** 20:10.2f} MiB', file = sys.stderr)
+
+    return results
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description = 'Benchmark Ducky, and compare the results against a baseline.')
+
+    parser.add_argument('--output', help = 'File to save the results to, as JSON')
+    parser.add_argument('--baseline', help = 'Results of an earlier run to compare against')
+    parser.add_argument('--filter', default = '', help = 'Only run benchmarks whose names contain this')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Timed runs per benchmark')
+    parser.add_argument('--time-threshold', type = float, default = 0.2, help = 'Allowed slowdown, as a fraction (default: 0.2, so 20%%)')
+    parser.add_argument('--memory-threshold', type = float, default = 0.1, help = 'Allowed memory increase, as a fraction')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--triangles-per-layer', type = int, default = 5000)
+    parser.add_argument('--quads-per-group', type = int, default = 2000)
+    parser.add_argument('--text-labels', type = int, default = 20, help = 'Words of text on the synthetic tile')
+    parser.add_argument('--text-benchmark-labels', type = int, default = 50, help = 'Words added by the add_text benchmarks')
+    parser.add_argument('--grid-size', type = int, default = 6, help = 'Width and height of the synthetic island loaded by tileset_load')
+    parser.add_argument('--grid-processes', type = int, default = None, help = 'Processes used by tileset_load (default: one per CPU)')
+
+    args = parser.parse_args(argv)
+
+    settings = {
+        'seed': args.seed,
+        'triangles_per_layer': args.triangles_per_layer,
+        'quads_per_group': args.quads_per_group,
+        'text_labels': args.text_labels,
+        'text_benchmark_labels': args.text_benchmark_labels,
+        'grid_size': args.grid_size,
+        'grid_processes': args.grid_processes,
+    }
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+
+    with tempfile.TemporaryDirectory() as work_directory:
+
+        results = run({**settings, 'work_directory': work_directory}, names, args.repeat)
+
+    output = {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'settings': settings,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as file_obj:
+            json.dump(output, file_obj, indent = 4)
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline, 'r') as file_obj:
+        baseline = json.load(file_obj)
+
+    if baseline.get('settings') != settings:
+        print('Warning: the baseline was run with different settings, so the results may not be comparable', file = sys.stderr)
+
+    regressions = compare(output, baseline, args.time_threshold, args.memory_threshold)
+
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file = sys.stderr)
+
+    if len(regressions) == 0:
+        print('No regressions against the baseline', file = sys.stderr)
+
+    return int(len(regressions) > 0)
+
+if __name__ == '__main__':
+    sys.exit(main())
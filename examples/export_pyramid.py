@@ -0,0 +1,16 @@
+# Export the main island as a pyramid of 256px tiles, ready for a slippy map viewer (Leaflet, OpenLayers...)
+
+from sw_ducky import TileSet
+from sw_ducky.pyramid import export_pyramid
+import os
+
+from stormworks_path import STORMWORKS_PATH
+
+if __name__ == '__main__':
+
+    island = TileSet(os.path.join(STORMWORKS_PATH, 'rom', 'data', 'tiles'), 'mega_island')
+
+    # Running this again later only regenerates the tiles above .bin files that changed
+    counts = export_pyramid(island, 'mega_island_tiles', detail_levels = 2)
+
+    print(counts)
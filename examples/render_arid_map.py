@@ -1,54 +1,35 @@
 # Render the main island, using ducky image generation
 
-from sw_ducky import MapGeometry
+from sw_ducky import TileSet
 from PIL import Image
 import os
 
 from stormworks_path import STORMWORKS_PATH
 
 SIZE = 60
-WIDTH = 31
-HEIGHT = 16
 
-def request_image(x, y):
+if __name__ == '__main__':
 
-    # Find the bin file
+    # Find, and load every tile of the island in parallel. Missing tiles are loaded as empty tiles.
+    island = TileSet(os.path.join(STORMWORKS_PATH, 'rom', 'data', 'tiles'), 'arid_island').load()
 
-    filename = f'arid_island_{x}_{y}_map_geometry.bin'
+    print(f'Loaded {len(island.tiles)} tiles, grid is {island.width} x {island.height}')
 
-    print(f'Loading: {filename}', end = ' ')
+    grid_width = island.width * SIZE
+    grid_height = island.height * SIZE
 
-    full_path = os.path.join(STORMWORKS_PATH, 'rom', 'data', 'tiles', filename)
+    map_img = Image.new('RGB', (grid_width, grid_height))
 
-    try:
-        geo = MapGeometry.from_file(full_path)
-        print('Success')
-    except FileNotFoundError:
-        geo = MapGeometry() # File not found. Assume empty
-        print('Fail!')
+    for (x, y), geo in island:
 
-    image = geo.render_to_image(SIZE)
+        # At this size most of the triangles are smaller than a pixel, so only draw the visible detail
+        tile_image = geo.render_to_image(SIZE, lod = True)
 
-    return image
+        column, row = island.grid_position(x, y)
 
-offset_y = 3 # because of course the corner isn't at 0,0 for this island. 
-offset_x = 2
+        map_img.paste(tile_image, (column * SIZE, row * SIZE))
 
-grid_width = (WIDTH-offset_x) * SIZE
-grid_height = (HEIGHT - offset_y) * SIZE
 
-map_img = Image.new('RGB', (grid_width, grid_height))
+    # map_img = map_img.resize((island.width * 100, island.height * 100))
 
-for y in range(offset_y, HEIGHT):
-    for x in range(offset_x, WIDTH):
-
-        tile_image = request_image(x, y)
-
-        y_location = SIZE * ((HEIGHT - 1) - y)
-
-        map_img.paste(tile_image, ((x - offset_x) * SIZE, y_location))
-
-
-# map_img = map_img.resize((WIDTH * 100, HEIGHT * 100))
-
-map_img.show()
\ No newline at end of file
+    map_img.show()
\ No newline at end of file
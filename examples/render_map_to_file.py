@@ -0,0 +1,16 @@
+# Render the main island straight to a png file, without ever holding the full image in memory
+
+from sw_ducky import TileSet
+from sw_ducky.mosaic import render_island
+import os
+
+from stormworks_path import STORMWORKS_PATH
+
+SIZE = 1000
+
+if __name__ == '__main__':
+
+    island = TileSet(os.path.join(STORMWORKS_PATH, 'rom', 'data', 'tiles'), 'mega_island')
+
+    # Tiles are loaded, and rendered across all cores, and written out one row of tiles at a time
+    render_island(island, SIZE, 'mega_island.png')
@@ -1 +1,2 @@
-from .sw_ducky import MapGeometry
\ No newline at end of file
+from .sw_ducky import MapGeometry
+from .tileset import TileSet
\ No newline at end of file
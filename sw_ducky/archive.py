@@ -0,0 +1,299 @@
+import hashlib
+import mmap
+import os
+import struct
+import weakref
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .lazy import map_file
+from .sw_ducky import MapGeometry
+from .tileset import TileSet, tile_filename
+
+# Archive layout:
+#
+#   header   magic, version, flags, offset of the index, length of the island name, island name (utf-8)
+#   blobs    the contents of every distinct tile, one after the other
+#   index    entry count, then one entry per tile: x, y, blob offset, blob length, sha256 of the blob
+#
+# The index goes last so the archive can be written in a single pass, with the offset patched in at
+# the end. Tiles with identical contents (empty sea tiles, mostly) share a single blob.
+ARCHIVE_MAGIC = b'DUCKYARC'
+ARCHIVE_VERSION = 1
+
+HEADER_FORMAT = struct.Struct('<8sHHQH')
+INDEX_COUNT_FORMAT = struct.Struct('<I')
+INDEX_ENTRY_FORMAT = struct.Struct('<iiQQ32s')
+
+FLAG_MOON = 1
+
+class ArchiveEntry(NamedTuple):
+
+    offset: int
+    length: int
+    sha256: bytes
+
+def write_archive(archive_path: Union[str, os.PathLike, BinaryIO], island: str, tiles: Iterable[Tuple[Tuple[int, int], bytes]], moon: bool = False) -> dict:
+
+    '''
+    Write tiles into a single archive file, i.e.:
+
+    write_archive('arid_island.duckyarc', 'arid_island', {(0, 0): geo.to_bytes(), ...}.items())
+
+    tiles gives ((x, y), contents of the .bin file) pairs, and is only read once, so it can be a generator
+    that reads the files one at a time. Instead of a path, a writable, seekable binary file-like
+    object can be given.
+
+    Returns a dict of stats: the number of tiles, the number of distinct blobs stored, and the
+    total bytes of the tiles before and after deduplication.
+    '''
+
+    if isinstance(archive_path, (str, os.PathLike)):
+        with open(archive_path, 'wb') as file_obj:
+            return write_archive(file_obj, island, tiles, moon)
+
+    file_obj = archive_path
+
+    name = island.encode('utf-8')
+
+    start = file_obj.tell()
+
+    # Leave the index offset as 0 for now
+    file_obj.write(HEADER_FORMAT.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, FLAG_MOON if moon else 0, 0, len(name)))
+    file_obj.write(name)
+
+    offset = HEADER_FORMAT.size + len(name)
+
+    # sha256 -> (offset, length) of the blobs written so far
+    blobs: Dict[bytes, Tuple[int, int]] = {}
+    index: Dict[Tuple[int, int], ArchiveEntry] = {}
+
+    total_bytes = 0
+
+    for (x, y), data in tiles:
+
+        if (x, y) in index:
+            raise ValueError(f'Tile {x}_{y} was given more than once')
+
+        digest = hashlib.sha256(data).digest()
+
+        if digest not in blobs:
+            file_obj.write(data)
+            blobs[digest] = (offset, len(data))
+            offset += len(data)
+
+        index[(x, y)] = ArchiveEntry(*blobs[digest], digest)
+
+        total_bytes += len(data)
+
+    index_offset = offset
+
+    file_obj.write(INDEX_COUNT_FORMAT.pack(len(index)))
+
+    for (x, y), entry in sorted(index.items(), key = lambda item: (item[0][1], item[0][0])):
+        file_obj.write(INDEX_ENTRY_FORMAT.pack(x, y, *entry))
+
+    end = file_obj.tell()
+
+    # Go back and fill in where the index is
+    file_obj.seek(start)
+    file_obj.write(HEADER_FORMAT.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, FLAG_MOON if moon else 0, index_offset, len(name)))
+    file_obj.seek(end)
+
+    return {
+        'tiles': len(index),
+        'blobs': len(blobs),
+        'tile_bytes': total_bytes,
+        'stored_bytes': sum(length for _, length in blobs.values()),
+    }
+
+def pack_island(island: TileSet, archive_path: Union[str, os.PathLike, BinaryIO]) -> dict:
+
+    '''
+    Pack all the geometry files of an island into a single archive, i.e.:
+
+    pack_island(TileSet('.../Stormworks/rom/data/tiles', 'arid_island'), 'arid_island.duckyarc')
+
+    The files are copied as they are, one at a time, so the island doesn't need to be loaded first
+    (and anything already loaded is ignored). Returns the same stats as write_archive.
+    '''
+
+    def read_tiles() -> Iterator[Tuple[Tuple[int, int], bytes]]:
+
+        for position, path in sorted(island.paths.items(), key = lambda item: (item[0][1], item[0][0])):
+            with open(path, 'rb') as file_obj:
+                yield position, file_obj.read()
+
+    return write_archive(archive_path, island.island, read_tiles(), island.moon)
+
+class IslandArchive:
+
+    '''
+    Random access to the tiles of an archive written by write_archive / pack_island, i.e.:
+
+    with IslandArchive('arid_island.duckyarc') as archive:
+        geo = archive.load(3, 5)
+
+    The archive is memory mapped, and only the header and index are read on opening.
+    Loading a tile only touches the pages holding that tile.
+    '''
+
+    def __init__(self, archive_path: Union[str, os.PathLike]):
+
+        self.path = archive_path
+        self.data = map_file(archive_path)
+
+        # Tiles loaded with lazy = True, which read straight out of the memory map
+        self._lazy_tiles = weakref.WeakSet()
+
+        if len(self.data) < HEADER_FORMAT.size:
+            raise ValueError(f'Not an island archive (too short): {archive_path}')
+
+        magic, version, flags, index_offset, name_length = HEADER_FORMAT.unpack_from(self.data, 0)
+
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f'Not an island archive (bad magic bytes): {archive_path}')
+
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f'Unsupported island archive version {version}: {archive_path}')
+
+        if index_offset == 0:
+            raise ValueError(f'Island archive was not finished writing: {archive_path}')
+
+        self.island = bytes(self.data[HEADER_FORMAT.size:HEADER_FORMAT.size + name_length]).decode('utf-8')
+        self.moon = bool(flags & FLAG_MOON)
+
+        # (x, y) -> ArchiveEntry
+        self.entries: Dict[Tuple[int, int], ArchiveEntry] = {}
+
+        entry_count, = INDEX_COUNT_FORMAT.unpack_from(self.data, index_offset)
+
+        if index_offset + INDEX_COUNT_FORMAT.size + entry_count * INDEX_ENTRY_FORMAT.size > len(self.data):
+            raise ValueError(f'Island archive index is truncated: {archive_path}')
+
+        for x, y, offset, length, digest in INDEX_ENTRY_FORMAT.iter_unpack(self.data[index_offset + INDEX_COUNT_FORMAT.size:index_offset + INDEX_COUNT_FORMAT.size + entry_count * INDEX_ENTRY_FORMAT.size]):
+
+            if offset + length > index_offset:
+                raise ValueError(f'Tile {x}_{y} lies outside the blobs of the archive: {archive_path}')
+
+            self.entries[(x, y)] = ArchiveEntry(offset, length, digest)
+
+        if len(self.entries) > 0:
+            xs = [x for x, _ in self.entries]
+            ys = [y for _, y in self.entries]
+
+            self.min_x, self.max_x = min(xs), max(xs)
+            self.min_y, self.max_y = min(ys), max(ys)
+
+    def tile_bytes(self, x: int, y: int) -> memoryview:
+
+        '''
+        Get the contents of a tile's .bin file, as a view into the archive (no copy is made).
+        Raises KeyError for tiles which aren't in the archive.
+        '''
+
+        offset, length, _ = self.entries[(x, y)]
+
+        return memoryview(self.data)[offset:offset + length]
+
+    def load(self, x: int, y: int, lazy: bool = False, **kwargs) -> MapGeometry:
+
+        '''
+        Build a MapGeometry for a single tile. Any extra keyword arguments are passed through to
+        MapGeometry.from_bytes (i.e. compact = True).
+
+        With lazy = True, the tile is read straight out of the memory mapped archive as chunks are
+        needed. Closing the archive copies the bytes of such tiles out first, so they keep working.
+        Otherwise the tile's bytes are copied out right away.
+        '''
+
+        data = self.tile_bytes(x, y)
+
+        if not lazy:
+            return MapGeometry.from_bytes(bytes(data), moon = self.moon, **kwargs)
+
+        geo = MapGeometry.from_bytes(data, moon = self.moon, lazy = True, **kwargs)
+
+        self._lazy_tiles.add(geo)
+
+        return geo
+
+    def verify(self) -> List[Tuple[int, int]]:
+
+        '''
+        Check every tile against the hash stored in the index.
+        Returns the (x, y) of every tile whose contents don't match.
+        '''
+
+        checked: Dict[Tuple[int, int], bool] = {}
+        bad = []
+
+        for position, (offset, length, digest) in sorted(self.entries.items()):
+
+            # Shared blobs only need hashing once
+            if (offset, length) not in checked:
+                checked[(offset, length)] = hashlib.sha256(self.data[offset:offset + length]).digest() == digest
+
+            if not checked[(offset, length)]:
+                bad.append(position)
+
+        return bad
+
+    def export(self, directory: str, island: Optional[str] = None) -> Dict[Tuple[int, int], str]:
+
+        '''
+        Write every tile back out as a loose .bin file, named like the game names them, so TileSet
+        can load the directory again. island defaults to the name the archive was packed with.
+
+        Returns a dict of (x, y) -> path to the tile
+        '''
+
+        os.makedirs(directory, exist_ok = True)
+
+        paths = {}
+
+        for (x, y) in self.entries:
+
+            path = os.path.join(directory, tile_filename(island or self.island, x, y))
+
+            with open(path, 'wb') as file_obj:
+                file_obj.write(self.tile_bytes(x, y))
+
+            paths[(x, y)] = path
+
+        return paths
+
+    def close(self):
+
+        '''
+        Release the memory mapped archive. Tiles loaded with lazy = True which are still in use
+        (and weren't closed or fully loaded) get a copy of their bytes first, as the memory map
+        can't be closed while they still point into it.
+        '''
+
+        for geo in list(self._lazy_tiles):
+            geo._detach_source()
+
+        self._lazy_tiles = weakref.WeakSet()
+
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> 'IslandArchive':
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+
+        return position in self.entries
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+
+        return iter(sorted(self.entries, key = lambda position: (position[1], position[0])))
+
+    def __len__(self) -> int:
+
+        return len(self.entries)
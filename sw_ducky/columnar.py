@@ -0,0 +1,292 @@
+from collections.abc import MutableSequence
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from .parsing import read_line_quad_arrays, read_mesh_chunk_arrays
+
+class ArrayList(MutableSequence):
+
+    '''
+    A list-like view over a growable, contiguous NumPy array.
+
+    Each row of the array is one element of the list. Reading an element gives back the same
+    (nested) tuples that the list based storage uses, so code written against lists keeps working,
+    while the data itself only costs a few bytes per value. Appending is amortized O(1), and
+    extending with an array copies it in one go.
+    '''
+
+    __slots__ = ('_data', '_size', 'dirty', 'version')
+
+    # Overridden by the subclasses
+    dtype = np.float32
+    row_shape: Tuple[int, ...] = ()
+
+    def __init__(self, values: Iterable = ()):
+
+        self._data = np.empty((0,) + self.row_shape, dtype = self.dtype)
+        self._size = 0
+
+        self.version = 0
+
+        self.extend(values)
+
+        # Set by every change, so saving can tell if this still matches the file it was loaded from
+        self.dirty = False
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> 'ArrayList':
+
+        '''
+        Create a new list from an existing array, taking a private copy of it if needed.
+        '''
+
+        output = cls()
+
+        output._data = np.require(np.asarray(array, dtype = cls.dtype).reshape((-1,) + cls.row_shape), requirements = ['C', 'W', 'O'])
+        output._size = len(output._data)
+        output.version = 0
+
+        return output
+
+    @property
+    def array(self) -> np.ndarray:
+
+        '''
+        A view of the stored values, as an array with one row per element.
+        Changes made through the view aren't tracked, so call touch() after writing to it.
+        '''
+
+        return self._data[:self._size]
+
+    def __array__(self, dtype = None, copy = None):
+
+        if dtype is None:
+            return self.array
+
+        return self.array.astype(dtype)
+
+    def _reserve(self, capacity: int):
+
+        # Grow the backing array geometrically, so repeated appends stay cheap
+        if capacity <= len(self._data):
+            return
+
+        new_data = np.empty((max(capacity, 2 * len(self._data), 8),) + self.row_shape, dtype = self.dtype)
+        new_data[:self._size] = self._data[:self._size]
+
+        self._data = new_data
+
+    def _to_row(self, value) -> np.ndarray:
+
+        return np.asarray(value, dtype = self.dtype).reshape(self.row_shape)
+
+    def __len__(self) -> int:
+
+        return self._size
+
+    def touch(self):
+
+        '''
+        Record a modification made some other way than through the list's own methods (i.e. through array).
+        '''
+
+        self.dirty = True
+        self.version += 1
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return self.from_array(self.array[index])
+
+        return _to_tuple(self.array[index].tolist())
+
+    def __setitem__(self, index, value):
+
+        self.touch()
+
+        if isinstance(index, slice):
+            self.array[index] = np.asarray(value, dtype = self.dtype).reshape((-1,) + self.row_shape)
+            return
+
+        self.array[index] = self._to_row(value)
+
+    def __delitem__(self, index):
+
+        self.touch()
+
+        keep = np.ones(self._size, dtype = bool)
+        keep[index] = False
+
+        self._data = self.array[keep].copy()
+        self._size = len(self._data)
+
+    def insert(self, index: int, value):
+
+        self.touch()
+
+        # Normalize the index the same way list.insert does
+        index = min(max(index + self._size if index < 0 else index, 0), self._size)
+
+        self._reserve(self._size + 1)
+
+        self._data[index + 1: self._size + 1] = self._data[index: self._size].copy()
+        self._data[index] = self._to_row(value)
+
+        self._size += 1
+
+    def append(self, value):
+
+        self.touch()
+
+        self._reserve(self._size + 1)
+
+        self._data[self._size] = self._to_row(value)
+
+        self._size += 1
+
+    def extend(self, values: Iterable):
+
+        self.touch()
+
+        if isinstance(values, ArrayList):
+            values = values.array
+        elif not isinstance(values, np.ndarray):
+            values = list(values)
+
+        values = np.asarray(values, dtype = self.dtype).reshape((-1,) + self.row_shape)
+
+        self._reserve(self._size + len(values))
+
+        self._data[self._size: self._size + len(values)] = values
+
+        self._size += len(values)
+
+    def clear(self):
+
+        self.touch()
+
+        self._data = np.empty((0,) + self.row_shape, dtype = self.dtype)
+        self._size = 0
+
+    def __iter__(self):
+
+        return iter(self.tolist())
+
+    def tolist(self) -> list:
+
+        '''
+        Convert to the list of tuples used by the list based storage.
+        '''
+
+        return [_to_tuple(row) for row in self.array.tolist()]
+
+    def __eq__(self, other) -> bool:
+
+        if isinstance(other, ArrayList):
+            return np.array_equal(self.array, other.array)
+
+        try:
+            return self.tolist() == [_to_tuple(item) for item in other]
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+
+        return f'{type(self).__name__}({self.tolist()})'
+
+    def __getstate__(self):
+
+        return self.array.copy(), self.dirty
+
+    def __setstate__(self, state):
+
+        self._data, self.dirty = state
+        self._size = len(self._data)
+        self.version = 0
+
+class VertexArray(ArrayList):
+
+    '''
+    Compact storage for the X,Y vertices of a mesh layer, as an (N, 2) float32 array.
+    '''
+
+    __slots__ = ()
+
+    dtype = np.float32
+    row_shape = (2,)
+
+class TriangleArray(ArrayList):
+
+    '''
+    Compact storage for the triangle indices of a mesh layer, as an (N, 3) uint16 array.
+    '''
+
+    __slots__ = ()
+
+    dtype = np.uint16
+    row_shape = (3,)
+
+    def _to_row(self, value) -> np.ndarray:
+
+        # Refuse to silently wrap indices which don't fit in the file format
+        row = np.asarray(value)
+
+        if row.size > 0 and (row.min() < 0 or row.max() > 0xFFFF):
+            raise ValueError('Triangle indices must fit in an unsigned 16 bit integer')
+
+        return row.astype(self.dtype).reshape(self.row_shape)
+
+    def extend(self, values: Iterable):
+
+        if not isinstance(values, (ArrayList, np.ndarray)):
+            values = list(values)
+
+        values = np.asarray(values)
+
+        if values.size > 0 and values.dtype != self.dtype and (values.min() < 0 or values.max() > 0xFFFF):
+            raise ValueError('Triangle indices must fit in an unsigned 16 bit integer')
+
+        super().extend(values)
+
+class QuadArray(ArrayList):
+
+    '''
+    Compact storage for the quads of a line group, as an (N, 4, 2) float32 array.
+    '''
+
+    __slots__ = ()
+
+    dtype = np.float32
+    row_shape = (4, 2)
+
+def _to_tuple(value):
+
+    '''
+    Recursively convert the nested lists given by ndarray.tolist() into tuples.
+    '''
+
+    if isinstance(value, list):
+        return tuple(_to_tuple(v) for v in value)
+
+    return value
+
+def read_compact_mesh_chunk(bin: bytes, index: int) -> Tuple[Tuple[VertexArray, TriangleArray], int]:
+
+    '''
+    Read a chunk containing mesh data straight into compact array storage.
+    '''
+
+    (coordinates, tris), size = read_mesh_chunk_arrays(bin, index)
+
+    return (VertexArray.from_array(coordinates), TriangleArray.from_array(tris)), size
+
+def read_compact_line_quads(bin: bytes, index: int) -> Tuple[QuadArray, int]:
+
+    '''
+    Read a chunk containing quad data straight into compact array storage.
+    '''
+
+    quads, size = read_line_quad_arrays(bin, index)
+
+    return QuadArray.from_array(quads), size
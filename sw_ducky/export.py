@@ -0,0 +1,458 @@
+import json
+import os
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from .spatial import TILE_MIN, TILE_SIZE
+from .sw_ducky import BASE_COLORS, EARTH_COLORS, EARTH_LAYER_RENDER_ORDER, LINE_COLORS, MOON_COLORS, MOON_LAYER_RENDER_ORDER, MapGeometry
+from .tile_drawing import DASH_GAP, DASH_LENGTH, LINE_WIDTH
+from .tileset import TileSet
+from .world import tile_offset
+
+# Coordinates are written to the millimetre
+DECIMALS = 3
+
+def hex_color(color: Tuple[int, int, int]) -> str:
+
+    return '#{:02x}{:02x}{:02x}'.format(*color)
+
+def _flip_y(points: np.ndarray) -> np.ndarray:
+
+    # Rounding first, and adding 0 to turn -0.0 into 0.0, keeps tiny values from being written as -0.000
+    return np.round(points * (1, -1), DECIMALS) + 0.0
+
+def _format_rows(template: str, rows: np.ndarray) -> str:
+
+    # Format every row of an array with the same %-template in one go, which is much faster than a loop
+    return (template * len(rows)) % tuple(np.asarray(rows).ravel().tolist())
+
+class _VectorWriter:
+
+    '''
+    Shared driver of the vector writers: walks the layers (in render order) and line groups of each
+    tile given to write_tile, moved into world coordinates, and hands them to the format's methods.
+    Nothing is kept between tiles, so islands can be written one tile at a time.
+    '''
+
+    def __init__(self, file_obj: BinaryIO, moon: bool = False, bounds: Optional[Tuple[float, float, float, float]] = None):
+
+        self.file_obj = file_obj
+        self.moon = moon
+
+        self.layer_colors = MOON_COLORS if moon else EARTH_COLORS
+        self.render_order = MOON_LAYER_RENDER_ORDER if moon else EARTH_LAYER_RENDER_ORDER
+        self.base_color = BASE_COLORS['Moon' if moon else 'Earth']
+
+        # (min x, min y, max x, max y) of the area being exported, defaults to a single tile
+        self.bounds = bounds or (TILE_MIN, TILE_MIN, TILE_MIN + TILE_SIZE, TILE_MIN + TILE_SIZE)
+
+        self.tiles_written = 0
+
+    def _write(self, text: str):
+
+        self.file_obj.write(text.encode('utf-8'))
+
+    def write_tile(self, geo: MapGeometry, x: Optional[int] = None, y: Optional[int] = None):
+
+        '''
+        Write out a tile. With a tile position, its geometry is moved into world coordinates
+        (see world.tile_offset), otherwise it is written in its own local coordinates.
+        '''
+
+        if geo.moon != self.moon:
+            raise ValueError('Earth and Moon tiles cannot be mixed in one export')
+
+        offset = np.array(tile_offset(x, y) if x is not None else (0.0, 0.0))
+
+        self._begin_tile(x, y)
+
+        for layer_index, layer in enumerate(self.render_order):
+
+            tris = np.asarray(geo.terrain_tris[layer], dtype = np.int64).reshape(-1, 3)
+
+            if len(tris) > 0:
+                verts = np.asarray(geo.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2) + offset
+                self._write_layer(x, y, layer_index, layer, verts, tris)
+
+        for group_index in range(len(geo.line_data)):
+
+            points, offsets = geo.line_paths(group_index)
+
+            if len(points) > 0:
+                self._write_lines(x, y, group_index, points + offset, offsets)
+
+        self._end_tile(x, y)
+
+        self.tiles_written += 1
+
+    def line_style(self, group_index: int) -> Tuple[Tuple[int, int, int], bool]:
+
+        '''
+        Get the (color, dashed) of a line group, matching render_to_image: the groups alternate solid and dashed.
+        '''
+
+        dashed = group_index % 2 == 1
+
+        return LINE_COLORS[dashed], dashed
+
+    def _begin_tile(self, x: Optional[int], y: Optional[int]):
+        pass
+
+    def _end_tile(self, x: Optional[int], y: Optional[int]):
+        pass
+
+    def _write_layer(self, x: Optional[int], y: Optional[int], layer_index: int, layer: str, verts: np.ndarray, tris: np.ndarray):
+        raise NotImplementedError
+
+    def _write_lines(self, x: Optional[int], y: Optional[int], group_index: int, points: np.ndarray, offsets: np.ndarray):
+        raise NotImplementedError
+
+    def close(self):
+
+        '''
+        Finish the document. Does not close the underlying file object.
+        '''
+
+class SVGWriter(_VectorWriter):
+
+    '''
+    Write tiles into an SVG document, one <g> per tile holding a <path> per terrain layer
+    and per line group, styled like render_to_image.
+
+    SVG runs Y downwards, so Y is flipped. size gives the width and height in pixels of each tile
+    (so the document size), line widths and dashes stay in pixels whatever the zoom level.
+    '''
+
+    def __init__(self, file_obj: BinaryIO, moon: bool = False, bounds: Optional[Tuple[float, float, float, float]] = None, size: int = 1000):
+
+        super().__init__(file_obj, moon, bounds)
+
+        min_x, min_y, max_x, max_y = self.bounds
+
+        width, height = max_x - min_x, max_y - min_y
+
+        self._write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{round(width * size / TILE_SIZE)}" height="{round(height * size / TILE_SIZE)}" '
+            f'viewBox="{min_x:g} {-max_y:g} {width:g} {height:g}">\n'
+        )
+        self._write(f'<rect x="{min_x:g}" y="{-max_y:g}" width="{width:g}" height="{height:g}" fill="{hex_color(self.base_color)}"/>\n')
+
+    def _begin_tile(self, x: Optional[int], y: Optional[int]):
+
+        self._write('<g>\n' if x is None else f'<g id="tile_{x}_{y}">\n')
+
+    def _end_tile(self, x: Optional[int], y: Optional[int]):
+
+        self._write('</g>\n')
+
+    def _write_layer(self, x: Optional[int], y: Optional[int], layer_index: int, layer: str, verts: np.ndarray, tris: np.ndarray):
+
+        corners = _flip_y(verts[tris])
+
+        # Antialiasing would show the seams between neighbouring triangles
+        self._write(f'<path class="{layer}" fill="{hex_color(self.layer_colors[layer])}" shape-rendering="crispEdges" d="')
+        self._write(_format_rows(f'M%.{DECIMALS}f %.{DECIMALS}fL%.{DECIMALS}f %.{DECIMALS}fL%.{DECIMALS}f %.{DECIMALS}fZ', corners.reshape(-1, 6)))
+        self._write('"/>\n')
+
+    def _write_lines(self, x: Optional[int], y: Optional[int], group_index: int, points: np.ndarray, offsets: np.ndarray):
+
+        color, dashed = self.line_style(group_index)
+
+        dashes = f' stroke-dasharray="{DASH_LENGTH} {DASH_GAP}"' if dashed else ''
+
+        # Move to the start of each path, and draw a line to every point after it
+        commands = np.full(len(points), 'L', dtype = object)
+        commands[offsets[:-1]] = 'M'
+
+        rows = np.empty((len(points), 3), dtype = object)
+        rows[:, 0] = commands
+        rows[:, 1:] = _flip_y(points)
+
+        self._write(
+            f'<path class="lines-{group_index}" fill="none" stroke="{hex_color(color)}" stroke-width="{LINE_WIDTH}"{dashes} '
+            f'vector-effect="non-scaling-stroke" d="'
+        )
+        self._write(_format_rows(f'%s%.{DECIMALS}f %.{DECIMALS}f', rows))
+        self._write('"/>\n')
+
+    def close(self):
+
+        '''
+        Finish the document. Does not close the underlying file object.
+        '''
+
+        self._write('</svg>\n')
+
+class GeoJSONWriter(_VectorWriter):
+
+    '''
+    Write tiles into a GeoJSON FeatureCollection: a MultiPolygon of triangles per terrain layer,
+    and a MultiLineString of paths per line group, for each tile.
+
+    Coordinates are in metres (X east, Y north), not longitude and latitude, so GIS tools need to
+    be told to treat them as a local projected system. Each feature has its layer or line group,
+    tile, and simplestyle properties (fill, stroke) taken from the renderer's colors.
+    '''
+
+    def __init__(self, file_obj: BinaryIO, moon: bool = False, bounds: Optional[Tuple[float, float, float, float]] = None):
+
+        super().__init__(file_obj, moon, bounds)
+
+        self._features_written = 0
+
+        self._write('{"type":"FeatureCollection","bbox":%s,"features":[\n' % json.dumps(list(self.bounds), separators = (',', ':')))
+
+    def _write_feature(self, geometry_type: str, coordinates: str, properties: dict):
+
+        # The coordinates come already formatted, json.dumps is slow for hundreds of thousands of floats
+        separator = ',\n' if self._features_written > 0 else ''
+
+        self._write(
+            f'{separator}{{"type":"Feature","properties":{json.dumps(properties, separators = (",", ":"))},'
+            f'"geometry":{{"type":"{geometry_type}","coordinates":[{coordinates}]}}}}'
+        )
+
+        self._features_written += 1
+
+    def _tile_property(self, x: Optional[int], y: Optional[int]) -> Optional[list]:
+
+        return None if x is None else [x, y]
+
+    def _write_layer(self, x: Optional[int], y: Optional[int], layer_index: int, layer: str, verts: np.ndarray, tris: np.ndarray):
+
+        # Each triangle is a polygon with a single, closed, CCW ring (as RFC 7946 asks for), but the
+        # triangles of a tile don't all wind the same way, so flip the CW ones first. Slivers can change
+        # winding when rounded, so this goes by the coordinates as they are written.
+        corners = np.round(verts[tris], DECIMALS)
+        doubled_area = (
+            (corners[:, 1, 0] - corners[:, 0, 0]) * (corners[:, 2, 1] - corners[:, 0, 1]) -
+            (corners[:, 1, 1] - corners[:, 0, 1]) * (corners[:, 2, 0] - corners[:, 0, 0])
+        )
+
+        tris = np.where(doubled_area[:, None] < 0, tris[:, ::-1], tris)
+
+        rings = verts[tris[:, [0, 1, 2, 0]]].reshape(-1, 8)
+
+        point = f'[%.{DECIMALS}f,%.{DECIMALS}f]'
+
+        self._write_feature('MultiPolygon', _format_rows(f'[[{point},{point},{point},{point}]],', rings)[:-1], {
+            'kind': 'terrain',
+            'layer': layer,
+            'render_index': layer_index,
+            'tile': self._tile_property(x, y),
+            'fill': hex_color(self.layer_colors[layer]),
+            'fill-opacity': 1,
+            'stroke-width': 0,
+        })
+
+    def _write_lines(self, x: Optional[int], y: Optional[int], group_index: int, points: np.ndarray, offsets: np.ndarray):
+
+        color, dashed = self.line_style(group_index)
+
+        paths = ','.join('[' + _format_rows(f'[%.{DECIMALS}f,%.{DECIMALS}f],', path)[:-1] + ']' for path in np.split(points, offsets[1:-1]))
+
+        self._write_feature('MultiLineString', paths, {
+            'kind': 'lines',
+            'group': group_index,
+            'tile': self._tile_property(x, y),
+            'stroke': hex_color(color),
+            'stroke-width': LINE_WIDTH,
+            'dashed': dashed,
+        })
+
+    def close(self):
+
+        '''
+        Finish the document. Does not close the underlying file object.
+        '''
+
+        self._write('\n]}\n')
+
+class OBJWriter(_VectorWriter):
+
+    '''
+    Write tiles into a Wavefront OBJ file, with an object per terrain layer (of triangle faces)
+    and per line group (of polylines), for each tile.
+
+    The map lies flat on the XZ plane with Y up, like most 3D tools expect: map X is OBJ X,
+    and map Y (north) is OBJ -Z. Layers that overlap would be drawn at the same height, so
+    layer_spacing lifts each layer above the one rendered before it, and lines above them all.
+
+    Materials named after the layers and line groups are used. If material_library is given,
+    it is referenced with mtllib, see write_materials for writing it.
+    '''
+
+    def __init__(self, file_obj: BinaryIO, moon: bool = False, bounds: Optional[Tuple[float, float, float, float]] = None, layer_spacing: float = 0.0, material_library: Optional[str] = None):
+
+        super().__init__(file_obj, moon, bounds)
+
+        self.layer_spacing = layer_spacing
+
+        # OBJ indices count from 1, across the whole file
+        self._vertices_written = 0
+
+        self._write('# Stormworks map geometry\n')
+
+        if material_library is not None:
+            self._write(f'mtllib {material_library}\n')
+
+    def _object_name(self, x: Optional[int], y: Optional[int], name: str) -> str:
+
+        return name if x is None else f'tile_{x}_{y}_{name}'
+
+    def _write_vertices(self, points: np.ndarray, height: float):
+
+        flipped = _flip_y(points)
+
+        vertices = np.column_stack([flipped[:, 0], np.full(len(points), height), flipped[:, 1]])
+
+        self._write(_format_rows(f'v %.{DECIMALS}f %.{DECIMALS}f %.{DECIMALS}f\n', vertices))
+
+        first = self._vertices_written + 1
+
+        self._vertices_written += len(points)
+
+        return first
+
+    def _write_layer(self, x: Optional[int], y: Optional[int], layer_index: int, layer: str, verts: np.ndarray, tris: np.ndarray):
+
+        self._write(f'o {self._object_name(x, y, layer)}\nusemtl {layer}\n')
+
+        first = self._write_vertices(verts, layer_index * self.layer_spacing)
+
+        self._write(_format_rows('f %d %d %d\n', tris + first))
+
+    def _write_lines(self, x: Optional[int], y: Optional[int], group_index: int, points: np.ndarray, offsets: np.ndarray):
+
+        name = f'lines-{group_index}'
+
+        self._write(f'o {self._object_name(x, y, name)}\nusemtl {name}\n')
+
+        first = self._write_vertices(points, len(self.render_order) * self.layer_spacing)
+
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            self._write('l ' + ' '.join(map(str, range(first + start, first + end))) + '\n')
+
+def write_materials(file_obj: BinaryIO, moon: bool = False):
+
+    '''
+    Write the Wavefront MTL material library used by OBJWriter, with the renderer's colors.
+    '''
+
+    def material(name: str, color: Tuple[int, int, int]) -> str:
+
+        red, green, blue = (channel / 255 for channel in color)
+
+        return f'newmtl {name}\nKd {red:.4f} {green:.4f} {blue:.4f}\nillum 0\n\n'
+
+    colors = MOON_COLORS if moon else EARTH_COLORS
+
+    text = ''.join(material(layer, colors[layer]) for layer in (MOON_LAYER_RENDER_ORDER if moon else EARTH_LAYER_RENDER_ORDER))
+    text += ''.join(material(f'lines-{index}', LINE_COLORS[index % 2]) for index in range(10))
+
+    file_obj.write(text.encode('utf-8'))
+
+VECTOR_WRITERS = {
+    'svg': SVGWriter,
+    'geojson': GeoJSONWriter,
+    'json': GeoJSONWriter,
+    'obj': OBJWriter,
+}
+
+def _export(output: Union[str, os.PathLike, BinaryIO], export_format: Optional[str], moon: bool, bounds: Tuple[float, float, float, float], tiles: Iterator[Tuple[Optional[int], Optional[int], MapGeometry]], **kwargs):
+
+    # Shared by export_tile and export_island: pick the writer, and stream the tiles through it
+    if export_format is None:
+
+        if hasattr(output, 'write'):
+            raise ValueError('Please specify an export_format when writing into a file object')
+
+        export_format = os.path.splitext(os.fspath(output))[1].lstrip('.')
+
+    export_format = export_format.lower()
+
+    if export_format not in VECTOR_WRITERS:
+        raise ValueError(f'Unsupported export format: {export_format}, use one of: {list(VECTOR_WRITERS)}')
+
+    writer_class = VECTOR_WRITERS[export_format]
+
+    # Next to an OBJ file, write its materials too
+    if writer_class is OBJWriter and not hasattr(output, 'write') and 'material_library' not in kwargs:
+
+        material_path = os.path.splitext(os.fspath(output))[0] + '.mtl'
+
+        with open(material_path, 'wb') as material_file:
+            write_materials(material_file, moon)
+
+        kwargs['material_library'] = os.path.basename(material_path)
+
+    output_file = output if hasattr(output, 'write') else open(output, 'wb')
+
+    try:
+
+        writer = writer_class(output_file, moon, bounds, **kwargs)
+
+        for x, y, geo in tiles:
+            writer.write_tile(geo, x, y)
+
+        writer.close()
+
+    finally:
+
+        if output_file is not output:
+            output_file.close()
+
+def export_tile(geo: MapGeometry, output: Union[str, os.PathLike, BinaryIO], export_format: Optional[str] = None, x: Optional[int] = None, y: Optional[int] = None, **kwargs):
+
+    '''
+    Export a single tile to an SVG, GeoJSON or OBJ file, i.e.:
+
+    export_tile(MapGeometry.from_file('arid.bin'), 'arid.svg')
+
+    The format is taken from the file extension, or from export_format ('svg', 'geojson' or 'obj')
+    when writing into a binary file object. The tile is written in its own coordinates, unless its
+    position (x, y) is given, which moves it into world coordinates.
+
+    Any extra keyword arguments go to the writer (i.e. size for SVGWriter, layer_spacing for OBJWriter).
+    An OBJ file written to a path gets its materials written next to it, with the extension .mtl.
+    '''
+
+    min_x, min_y = tile_offset(x, y) if x is not None else (0.0, 0.0)
+
+    bounds = (min_x + TILE_MIN, min_y + TILE_MIN, min_x + TILE_MIN + TILE_SIZE, min_y + TILE_MIN + TILE_SIZE)
+
+    _export(output, export_format, geo.moon, bounds, iter([(x, y, geo)]), **kwargs)
+
+def _island_tiles(island: TileSet) -> Iterator[Tuple[int, int, MapGeometry]]:
+
+    # Tiles that are already loaded are used as they are. The rest are loaded one at a time and
+    # dropped again after being written, rather than being kept in the TileSet.
+    for x, y in island.coordinates():
+
+        if (x, y) in island.tiles:
+            yield x, y, island.tiles[(x, y)]
+
+        elif (x, y) in island.paths:
+            yield x, y, MapGeometry.from_file(island.paths[(x, y)], moon = island.moon, **island._load_kwargs)
+
+def export_island(island: TileSet, output: Union[str, os.PathLike, BinaryIO], export_format: Optional[str] = None, **kwargs):
+
+    '''
+    Export a whole island to an SVG, GeoJSON or OBJ file in world coordinates (see world.tile_offset), i.e.:
+
+    export_island(TileSet('.../Stormworks/rom/data/tiles', 'mega_island'), 'mega_island.geojson')
+
+    Tiles are written out one at a time as they are loaded, so only one tile, and none of the
+    document, is held in memory at once. Missing tiles are left out. Otherwise works like export_tile.
+    '''
+
+    bounds = (
+        island.min_x * TILE_SIZE + TILE_MIN,
+        island.min_y * TILE_SIZE + TILE_MIN,
+        island.max_x * TILE_SIZE + TILE_MIN + TILE_SIZE,
+        island.max_y * TILE_SIZE + TILE_MIN + TILE_SIZE,
+    )
+
+    _export(output, export_format, island.moon, bounds, _island_tiles(island), **kwargs)
@@ -0,0 +1,66 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+from .letter_data import LETTERS
+from .utilitity import quads_from_lines
+
+# Text is drawn with the default line thickness of MapGeometry.add_line
+TEXT_THICKNESS = 4
+
+@lru_cache(maxsize = 4096)
+def glyph_quads(character: str, size: float, thickness: float = TEXT_THICKNESS) -> np.ndarray:
+
+    '''
+    Get the quads of a character at a given size, with its bottom left corner at 0, 0.
+    The result is cached, so placing a glyph only costs a translation. The array is read only.
+    '''
+
+    if character not in LETTERS:
+        raise ValueError(f'Non-letter character specified: {character}')
+
+    segments = np.asarray(LETTERS[character], dtype = np.float64).reshape(-1, 2, 2) * size
+
+    quads = quads_from_lines(segments[:, 0], segments[:, 1], thickness)
+    quads.setflags(write = False)
+
+    return quads
+
+def text_quads(text: str, location_x: float, location_y: float, size: float, thickness: float = TEXT_THICKNESS) -> np.ndarray:
+
+    '''
+    Lay out a string of text, returning the quads of every character as a single (N, 4, 2) array.
+    Follows the same rules as MapGeometry.add_text (upper case, size wide characters, 1.3 * size line spacing).
+    '''
+
+    glyphs: List[np.ndarray] = []
+    offsets: List[Tuple[float, float]] = []
+
+    x, y = location_x, location_y
+
+    for character in text.upper():
+
+        # If space, just advance location, and continue
+        if character == ' ':
+            x += size
+            continue
+
+        # If newline, return x to original position, advance y position, and continue
+        if character == '\n':
+            x = location_x
+            y -= size * 1.3
+            continue
+
+        glyphs.append(glyph_quads(character, size, thickness))
+        offsets.append((x, y))
+
+        x += size
+
+    if len(glyphs) == 0:
+        return np.empty((0, 4, 2))
+
+    # Move every glyph into place at once
+    counts = [len(glyph) for glyph in glyphs]
+
+    return np.concatenate(glyphs) + np.repeat(np.asarray(offsets), counts, axis = 0)[:, None, :]
@@ -0,0 +1,266 @@
+import mmap
+from collections.abc import MutableMapping, MutableSequence
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from .parsing import index_chunks
+
+def map_file(path_to_bin_file: str) -> Union[mmap.mmap, bytes]:
+
+    '''
+    Memory map a file for reading.
+    '''
+
+    with open(path_to_bin_file, 'rb') as file_obj:
+
+        try:
+            return mmap.mmap(file_obj.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be memory mapped, so just read them normally
+            return file_obj.read()
+
+class ChunkSource:
+
+    '''
+    The contents of a geometry file (usually memory mapped, see map_file), along with a table of where each chunk lives in it.
+
+    Building the source only walks the length headers of the file. Chunks are decoded
+    the first time they are requested, and cached from then on.
+    '''
+
+    def __init__(self, data: Union[mmap.mmap, memoryview, bytes], mesh_reader: Callable, quad_reader: Callable):
+
+        self.data = data
+
+        # Build the chunk offset table
+        self.mesh_spans, self.quad_spans, self.end = index_chunks(self.data)
+
+        # Functions used to decode a single chunk, like read_single_mesh_chunk / read_line_quads
+        self.mesh_reader = mesh_reader
+        self.quad_reader = quad_reader
+
+        self._meshes: Dict[int, Tuple[list, list]] = {}
+        self._quads: Dict[int, list] = {}
+
+        self.closed = False
+
+    def _check_open(self):
+
+        if self.closed:
+            raise ValueError('The file behind this lazily loaded MapGeometry was closed, so chunks which were never read are gone. Call load_all before closing to keep them')
+
+    def mesh(self, chunk_index: int) -> Tuple[list, list]:
+
+        '''
+        Get the (vertices, triangles) of a given mesh chunk, decoding it if needed.
+        '''
+
+        if chunk_index not in self._meshes:
+
+            self._check_open()
+
+            self._meshes[chunk_index], _ = self.mesh_reader(self.data, self.mesh_spans[chunk_index][0])
+
+        return self._meshes[chunk_index]
+
+    def quads(self, chunk_index: int) -> list:
+
+        '''
+        Get the quads of a given quad chunk, decoding it if needed.
+        '''
+
+        if chunk_index not in self._quads:
+
+            self._check_open()
+
+            self._quads[chunk_index], _ = self.quad_reader(self.data, self.quad_spans[chunk_index][0])
+
+        return self._quads[chunk_index]
+
+    def trailing_bytes(self) -> bytes:
+
+        '''
+        Get any bytes that follow the last quad chunk.
+        '''
+
+        return bytes(self.data[self.end:])
+
+    def detach(self):
+
+        '''
+        Copy the data into memory, and release the memory map (or view) it came from.
+        Everything can still be read afterwards.
+        '''
+
+        if self.closed or isinstance(self.data, bytes):
+            return
+
+        data = bytes(self.data)
+
+        self.close()
+
+        self.data = data
+        self.closed = False
+
+    def close(self):
+
+        '''
+        Release the memory map (or view). Chunks which were not decoded yet can no longer be read.
+        '''
+
+        self.closed = True
+
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        elif isinstance(self.data, memoryview):
+            # A view into something else (like an island archive), which stays open
+            self.data.release()
+
+class LazyLayers(MutableMapping):
+
+    '''
+    A dict-like mapping of layer name -> vertices or triangles, which decodes each layer
+    from a ChunkSource the first time it is read.
+    '''
+
+    def __init__(self, source: ChunkSource, memory_order: List[str], part: int):
+
+        self.source = source
+        self.memory_order = memory_order
+
+        # 0 for vertices, 1 for triangles
+        self.part = part
+
+        self._loaded: Dict[str, Any] = {}
+        self._deleted = set()
+
+    def is_loaded(self, layer: str) -> bool:
+
+        '''
+        Determine if a layer has been decoded (or assigned) yet.
+        '''
+
+        return layer in self._loaded
+
+    def __getitem__(self, layer: str):
+
+        if layer not in self._loaded:
+
+            if layer in self._deleted or layer not in self.memory_order:
+                raise KeyError(layer)
+
+            self._loaded[layer] = self.source.mesh(self.memory_order.index(layer))[self.part]
+
+        return self._loaded[layer]
+
+    def __setitem__(self, layer: str, value):
+
+        self._deleted.discard(layer)
+        self._loaded[layer] = value
+
+    def __delitem__(self, layer: str):
+
+        if layer not in self:
+            raise KeyError(layer)
+
+        self._loaded.pop(layer, None)
+        self._deleted.add(layer)
+
+    def __contains__(self, layer) -> bool:
+
+        if layer in self._loaded:
+            return True
+
+        return layer in self.memory_order and layer not in self._deleted
+
+    def __iter__(self):
+
+        for layer in self.memory_order:
+
+            if layer in self:
+                yield layer
+
+        # Any extra keys that were assigned by hand
+        for layer in self._loaded:
+
+            if layer not in self.memory_order:
+                yield layer
+
+    def __len__(self) -> int:
+
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+
+        return f'LazyLayers(loaded={list(self._loaded)})'
+
+class LazyLines(MutableSequence):
+
+    '''
+    A list-like sequence of line groups, which decodes each group from a ChunkSource
+    the first time it is read.
+    '''
+
+    def __init__(self, source: ChunkSource):
+
+        self.source = source
+
+        # None marks a group which hasn't been decoded yet
+        self._groups: List[Any] = [None] * len(source.quad_spans)
+
+        # Position in the file of each entry, or None for groups added by hand
+        self._chunk_indices: List[Any] = list(range(len(source.quad_spans)))
+
+    def is_loaded(self, index: int) -> bool:
+
+        '''
+        Determine if a line group has been decoded (or assigned) yet.
+        '''
+
+        return self._groups[index] is not None
+
+    def _load(self, index: int):
+
+        if self._groups[index] is None:
+            self._groups[index] = self.source.quads(self._chunk_indices[index])
+
+        return self._groups[index]
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return [self._load(i) for i in range(len(self._groups))[index]]
+
+        # Normalize negative indices, and raise IndexError when out of range
+        index = range(len(self._groups))[index]
+
+        return self._load(index)
+
+    def __setitem__(self, index, value):
+
+        if isinstance(index, slice):
+            raise TypeError('Slice assignment is not supported on lazily loaded line data')
+
+        self._groups[index] = value
+        self._chunk_indices[index] = None
+
+    def __delitem__(self, index):
+
+        del self._groups[index]
+        del self._chunk_indices[index]
+
+    def __len__(self) -> int:
+
+        return len(self._groups)
+
+    def insert(self, index: int, value):
+
+        self._groups.insert(index, value)
+        self._chunk_indices.insert(index, None)
+
+    def __eq__(self, other) -> bool:
+
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+
+        return f'LazyLines(loaded={[i for i in range(len(self)) if self.is_loaded(i)]})'
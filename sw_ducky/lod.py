@@ -0,0 +1,146 @@
+from typing import Tuple
+
+import numpy as np
+
+from .tile_drawing import convert_coords_array
+
+def pixel_centers_to_tile(size: int, cells: np.ndarray) -> np.ndarray:
+
+    '''
+    Convert an (N, 2) array of pixel (column, row) indices into the tile coordinates of the pixel centers.
+    This is the inverse of convert_coords_array, so converting the result back lands inside the same pixels.
+    '''
+
+    centers = np.asarray(cells, dtype = np.float64).reshape(-1, 2) + 0.5
+
+    coords = np.empty_like(centers)
+    coords[:, 0] = centers[:, 0] * 1000 / size - 500
+    coords[:, 1] = (size - centers[:, 1]) * 1000 / size - 500
+
+    return coords
+
+def simplify_mesh(size: int, verts, tris) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    '''
+    Simplify a mesh layer for rendering at size x size pixels, by clustering vertices per pixel.
+
+    Every vertex is snapped to the center of the pixel it falls in, and vertices landing in the same pixel
+    are merged. Triangles which end up covering a single pixel are turned into dots, duplicate and entirely
+    off screen triangles are dropped. At small sizes this removes most of the triangles of a tile, while
+    the result still covers (within half a pixel) the same area.
+
+    Returns (vertices, triangles, dots), where vertices and dots are in tile coordinates.
+    '''
+
+    verts = np.asarray(verts, dtype = np.float64).reshape(-1, 2)
+    tris = np.asarray(tris, dtype = np.int64).reshape(-1, 3)
+
+    if len(tris) == 0:
+        return np.empty((0, 2)), np.empty((0, 3), dtype = np.int64), np.empty((0, 2))
+
+    # Find the pixel each vertex falls in
+    cells = np.floor(convert_coords_array(size, verts)).astype(np.int64)
+
+    # Drop triangles which are entirely off one side of the image
+    tri_cells = cells[tris]
+    on_screen = (tri_cells.max(axis = 1) >= 0).all(axis = 1) & (tri_cells.min(axis = 1) < size).all(axis = 1)
+    tris = tris[on_screen]
+
+    # Merge the vertices which share a pixel, numbering the pixels so the search can work on plain integers
+    corner = cells.min(axis = 0)
+    columns = cells[:, 0] - corner[0]
+    rows = cells[:, 1] - corner[1]
+
+    pixel_ids, first_vertex, cluster = np.unique(columns * (rows.max() + 1) + rows, return_index = True, return_inverse = True)
+    unique_cells = cells[first_vertex]
+
+    clustered = cluster.reshape(-1)[tris]
+
+    # Triangles that collapsed into one pixel become a dot
+    collapsed = (clustered[:, 0] == clustered[:, 1]) & (clustered[:, 1] == clustered[:, 2])
+
+    dot_cells = unique_cells[np.unique(clustered[collapsed, 0])]
+    dot_cells = dot_cells[((dot_cells >= 0) & (dot_cells < size)).all(axis = 1)]
+
+    # Sorting the corners doesn't change what a triangle covers, and makes duplicates easy to spot
+    kept = np.sort(clustered[~collapsed], axis = 1)
+
+    cluster_count = len(pixel_ids)
+    _, first_seen = np.unique((kept[:, 0] * cluster_count + kept[:, 1]) * cluster_count + kept[:, 2], return_index = True)
+
+    kept = kept[first_seen]
+
+    # Only keep the vertices that are still used, and renumber the triangles to match
+    used, kept = np.unique(kept, return_inverse = True)
+
+    return pixel_centers_to_tile(size, unique_cells[used]), kept.reshape(-1, 3), pixel_centers_to_tile(size, dot_cells)
+
+def simplify_lines(size: int, quads) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    Simplify a group of line quads for rendering at size x size pixels.
+
+    Consecutive quads that join up are chained into a path, and every point of the path that stays in
+    the same pixel as the one before it is dropped, so runs of tiny quads collapse into a few segments
+    at least a pixel long. Each path still keeps its first and last point. Segments which then cover the
+    same pixels as an earlier one (like the stacked copies of bolded text) are only drawn once.
+
+    Returns (starts, ends) of the remaining line segments, in tile coordinates.
+    '''
+
+    quads = np.asarray(quads, dtype = np.float64).reshape(-1, 4, 2)
+
+    if len(quads) == 0:
+        return np.empty((0, 2)), np.empty((0, 2))
+
+    # Same as line_from_quad, the middle of each end of the quad
+    starts = (quads[:, 0] + quads[:, 1]) / 2
+    ends = (quads[:, 2] + quads[:, 3]) / 2
+
+    start_pixels = convert_coords_array(size, starts)
+    end_pixels = convert_coords_array(size, ends)
+
+    # A quad continues the path when it starts (within half a pixel) where the previous one ended
+    chain_start = np.ones(len(quads), dtype = bool)
+    chain_start[1:] = np.hypot(*(start_pixels[1:] - end_pixels[:-1]).T) >= 0.5
+
+    # Lay out the points of all the paths one after the other: the start of each path, then every end point
+    points = np.stack([starts, ends], axis = 1).reshape(-1, 2)
+    pixels = np.floor(np.stack([start_pixels, end_pixels], axis = 1).reshape(-1, 2)).astype(np.int64)
+
+    present = np.ones(2 * len(quads), dtype = bool)
+    present[0::2] = chain_start
+
+    chain = np.repeat(np.cumsum(chain_start), 2)[present]
+    points, pixels = points[present], pixels[present]
+
+    first = np.ones(len(points), dtype = bool)
+    first[1:] = chain[1:] != chain[:-1]
+
+    last = np.ones(len(points), dtype = bool)
+    last[:-1] = first[1:]
+
+    moved = np.ones(len(points), dtype = bool)
+    moved[1:] = (pixels[1:] != pixels[:-1]).any(axis = 1)
+
+    keep = first | last | moved
+
+    points, first = points[keep], first[keep]
+
+    # Join every kept point to the next one on the same path
+    joined = ~first[1:]
+
+    starts, ends = points[:-1][joined], points[1:][joined]
+
+    # Drop repeats of a segment between the same 2 pixels, in either direction
+    start_pixels = np.floor(convert_coords_array(size, starts)).astype(np.int64)
+    end_pixels = np.floor(convert_coords_array(size, ends)).astype(np.int64)
+
+    swap = (start_pixels[:, 0] > end_pixels[:, 0]) | ((start_pixels[:, 0] == end_pixels[:, 0]) & (start_pixels[:, 1] > end_pixels[:, 1]))
+
+    ordered = np.where(swap[:, None], np.hstack([end_pixels, start_pixels]), np.hstack([start_pixels, end_pixels]))
+
+    _, first_seen = np.unique(ordered, axis = 0, return_index = True)
+    first_seen.sort()
+
+    return starts[first_seen], ends[first_seen]
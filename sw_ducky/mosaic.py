@@ -0,0 +1,310 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .render_cache import RenderCache
+from .sw_ducky import MapGeometry
+from .tileset import TileSet
+
+class PNGBandWriter:
+
+    '''
+    Write an RGB PNG one horizontal band of rows at a time, so the full image never has to exist in memory.
+    Works on any writable binary file-like object, it doesn't need to be seekable.
+    '''
+
+    def __init__(self, file_obj: BinaryIO, width: int, height: int, compression_level: int = 6):
+
+        self.file_obj = file_obj
+        self.width = width
+        self.height = height
+
+        self.rows_written = 0
+
+        self._compressor = zlib.compressobj(compression_level)
+
+        self.file_obj.write(b'\x89PNG\r\n\x1a\n')
+
+        # 8 bits per channel, color type 2 (RGB), no interlacing
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+
+        self.file_obj.write(struct.pack('>I', len(data)))
+        self.file_obj.write(chunk_type)
+        self.file_obj.write(data)
+        self.file_obj.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+    def write_rows(self, band: np.ndarray):
+
+        '''
+        Write a (rows, width, 3) uint8 array of pixels.
+        '''
+
+        rows = band.reshape(len(band), self.width * 3)
+
+        # Use the PNG "Sub" filter (each byte minus the same channel of the pixel to its left),
+        # which makes the big flat areas of a map compress really well.
+        filtered = np.empty((len(rows), 1 + self.width * 3), dtype = np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        filtered[:, 4:] = rows[:, 3:] - rows[:, :-3]
+
+        compressed = self._compressor.compress(filtered.tobytes())
+
+        if len(compressed) > 0:
+            self._write_chunk(b'IDAT', compressed)
+
+        self.rows_written += len(rows)
+
+    def close(self):
+
+        '''
+        Finish the image. Does not close the underlying file object.
+        '''
+
+        if self.rows_written != self.height:
+            raise ValueError(f'Expected {self.height} rows to be written, but got {self.rows_written}')
+
+        self._write_chunk(b'IDAT', self._compressor.flush())
+        self._write_chunk(b'IEND', b'')
+
+class TIFFBandWriter:
+
+    '''
+    Write an RGB TIFF one horizontal band of rows at a time, storing each band as a deflate compressed strip.
+    Every band has to have the same number of rows, except for the last one.
+    The file object has to be seekable, as the image directory is written at the end.
+    '''
+
+    def __init__(self, file_obj: BinaryIO, width: int, height: int, compression_level: int = 6):
+
+        self.file_obj = file_obj
+        self.width = width
+        self.height = height
+        self.compression_level = compression_level
+
+        self.rows_written = 0
+        self.rows_per_strip: Optional[int] = None
+
+        self.strip_offsets: List[int] = []
+        self.strip_byte_counts: List[int] = []
+
+        self._start = file_obj.tell()
+
+        # Little endian header, the directory offset is filled in by close()
+        self.file_obj.write(b'II*\x00' + struct.pack('<I', 0))
+
+    def _tell(self) -> int:
+
+        return self.file_obj.tell() - self._start
+
+    def write_rows(self, band: np.ndarray):
+
+        '''
+        Write a (rows, width, 3) uint8 array of pixels.
+        '''
+
+        if self.rows_per_strip is None:
+            self.rows_per_strip = len(band)
+        elif self.rows_written % self.rows_per_strip != 0:
+            raise ValueError('Only the last band of a TIFF may be shorter than the others')
+
+        data = zlib.compress(np.ascontiguousarray(band, dtype = np.uint8).tobytes(), self.compression_level)
+
+        self.strip_offsets.append(self._tell())
+        self.strip_byte_counts.append(len(data))
+
+        self.file_obj.write(data)
+
+        self.rows_written += len(band)
+
+    def close(self):
+
+        '''
+        Write the image directory, and finish the image. Does not close the underlying file object.
+        '''
+
+        if self.rows_written != self.height:
+            raise ValueError(f'Expected {self.height} rows to be written, but got {self.rows_written}')
+
+        # Word align the extra data
+        if self._tell() % 2:
+            self.file_obj.write(b'\x00')
+
+        def write_array(format_char: str, values: List[int]) -> int:
+
+            # Write out-of-line tag data, returning where it was written
+            offset = self._tell()
+            self.file_obj.write(struct.pack('<' + format_char * len(values), *values))
+
+            return offset
+
+        bits_per_sample_offset = write_array('H', [8, 8, 8])
+
+        strip_count = len(self.strip_offsets)
+
+        if strip_count == 1:
+            strip_offsets_value, strip_counts_value = self.strip_offsets[0], self.strip_byte_counts[0]
+        else:
+            strip_offsets_value = write_array('I', self.strip_offsets)
+            strip_counts_value = write_array('I', self.strip_byte_counts)
+
+        SHORT, LONG = 3, 4
+
+        # (tag, type, count, value) sorted by tag, as the spec requires
+        entries = [
+            (256, LONG, 1, self.width), # ImageWidth
+            (257, LONG, 1, self.height), # ImageLength
+            (258, SHORT, 3, bits_per_sample_offset), # BitsPerSample
+            (259, SHORT, 1, 8), # Compression (Deflate)
+            (262, SHORT, 1, 2), # PhotometricInterpretation (RGB)
+            (273, LONG, strip_count, strip_offsets_value), # StripOffsets
+            (277, SHORT, 1, 3), # SamplesPerPixel
+            (278, LONG, 1, self.rows_per_strip), # RowsPerStrip
+            (279, LONG, strip_count, strip_counts_value), # StripByteCounts
+            (284, SHORT, 1, 1), # PlanarConfiguration (chunky)
+        ]
+
+        directory_offset = self._tell()
+
+        directory = struct.pack('<H', len(entries))
+
+        for tag, value_type, count, value in entries:
+
+            if value_type == SHORT and count == 1:
+                # Short values are left justified in the 4 byte value field
+                directory += struct.pack('<HHIHH', tag, value_type, count, value, 0)
+            else:
+                directory += struct.pack('<HHII', tag, value_type, count, value)
+
+        # No next directory
+        directory += struct.pack('<I', 0)
+
+        self.file_obj.write(directory)
+
+        end = self.file_obj.tell()
+
+        # Go back and point the header at the directory
+        self.file_obj.seek(self._start + 4)
+        self.file_obj.write(struct.pack('<I', directory_offset))
+        self.file_obj.seek(end)
+
+BAND_WRITERS = {
+    'png': PNGBandWriter,
+    'tif': TIFFBandWriter,
+    'tiff': TIFFBandWriter,
+}
+
+@lru_cache(maxsize = None)
+def _open_cache(directory: str, max_bytes: int, image_format: str) -> RenderCache:
+
+    # Each worker opens the render cache once, rather than rebuilding its index for every tile
+    return RenderCache(directory, max_bytes, image_format)
+
+def _render_tile(arguments: Tuple[Union[str, MapGeometry, None], bool, dict, int, Optional[tuple], bool]) -> bytes:
+
+    # Runs inside the worker processes. Tiles are given as a path when they haven't been loaded yet,
+    # so the loading happens in the workers too, and as None when they are missing from the island.
+    source, moon, kwargs, size, cache_settings, lod = arguments
+
+    cache = None if cache_settings is None else _open_cache(*cache_settings)
+
+    if isinstance(source, str):
+        geo = MapGeometry.from_file(source, moon = moon, **kwargs)
+    elif source is None:
+        geo = MapGeometry(moon = moon)
+    else:
+        geo = source
+
+    return geo.render_to_image(size, cache = cache, lod = lod).tobytes()
+
+def render_island(island: TileSet, size: int, output: Union[str, os.PathLike, BinaryIO], image_format: Optional[str] = None, processes: Optional[int] = None, rows_in_flight: int = 2, cache: Optional[RenderCache] = None, lod: bool = False):
+
+    '''
+    Render a whole island to a PNG or TIFF file, with each tile rendered at size x size pixels.
+
+    Tiles are rendered across a pool of worker processes, and the image is written out one row of
+    tiles at a time, so peak memory is bounded by a few rows of tiles rather than the full mosaic.
+    rows_in_flight controls how many rows of tiles are rendered ahead of the one being written.
+
+    The format is taken from the file extension, or from image_format ('png' or 'tiff') when
+    writing into a file object. Tiles that are already loaded in the TileSet are sent to the workers
+    as is, otherwise the workers load them from disk themselves.
+
+    With a RenderCache, tiles whose content was rendered before (including every copy of
+    an identical tile, like open sea) are read back from the cache instead of being drawn again.
+
+    Set lod = True for overview renders at small tile sizes, see MapGeometry.render_to_image.
+    '''
+
+    if image_format is None:
+
+        if hasattr(output, 'write'):
+            raise ValueError('Please specify an image_format when writing into a file object')
+
+        image_format = os.path.splitext(os.fspath(output))[1].lstrip('.')
+
+    image_format = image_format.lower()
+
+    if image_format not in BAND_WRITERS:
+        raise ValueError(f'Unsupported image format: {image_format}, use one of: {list(BAND_WRITERS)}')
+
+    width = island.width * size
+    height = island.height * size
+
+    cache_settings = None if cache is None else (cache.directory, cache.max_bytes, cache.image_format)
+
+    # Memory mapped tiles can't be sent to the workers, so they get loaded from disk again there
+    load_kwargs = {key: value for key, value in island._load_kwargs.items() if key != 'lazy'}
+
+    def tile_arguments(x: int, y: int):
+
+        if (x, y) in island.tiles and island.tiles[(x, y)]._source is None:
+            source = island.tiles[(x, y)]
+        else:
+            source = island.paths.get((x, y))
+
+        return source, island.moon, load_kwargs, size, cache_settings, lod
+
+    # Rows of tiles, from the top of the image to the bottom
+    tile_rows = [[(x, y) for x in range(island.min_x, island.max_x + 1)] for y in range(island.max_y, island.min_y - 1, -1)]
+
+    output_file = output if hasattr(output, 'write') else open(output, 'wb')
+
+    try:
+
+        writer = BAND_WRITERS[image_format](output_file, width, height)
+
+        with ProcessPoolExecutor(max_workers = processes) as executor:
+
+            pending = []
+
+            for row_index in range(len(tile_rows)):
+
+                # Keep a bounded number of rows rendering ahead of the one being written
+                while len(pending) < rows_in_flight + 1 and row_index + len(pending) < len(tile_rows):
+
+                    next_row = tile_rows[row_index + len(pending)]
+
+                    pending.append([executor.submit(_render_tile, tile_arguments(x, y)) for x, y in next_row])
+
+                band = np.empty((size, width, 3), dtype = np.uint8)
+
+                for column, future in enumerate(pending.pop(0)):
+
+                    band[:, column * size: (column + 1) * size] = np.frombuffer(future.result(), dtype = np.uint8).reshape(size, size, 3)
+
+                writer.write_rows(band)
+
+        writer.close()
+
+    finally:
+
+        if output_file is not output:
+            output_file.close()
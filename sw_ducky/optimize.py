@@ -0,0 +1,96 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Vertex and triangle index counts are stored as unsigned 16 bit integers
+UINT16_LIMIT = 0xFFFF
+
+def mesh_headroom(vertex_count: int, triangle_count: int) -> Dict[str, int]:
+
+    '''
+    Work out how much room is left in a mesh layer before it no longer fits in the file format.
+    '''
+
+    return {
+        'vertex_headroom': UINT16_LIMIT - vertex_count,
+        'index_headroom': UINT16_LIMIT - 3 * triangle_count,
+    }
+
+def optimize_mesh(verts, tris, tolerance: float = 0.0) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+
+    '''
+    Compact a mesh layer:
+
+        Weld vertices that share a position, or snap to the same point on a grid of the given tolerance
+        Drop triangles with no area (a repeated corner, or 3 corners in a line), or the same corners as an earlier one
+        Drop vertices no triangle uses, and renumber the triangles to match
+
+    Each welded vertex keeps the position of its first occurrence, and vertices keep their relative order.
+    Everything is done with sorting based NumPy operations, so this runs in O(n log n).
+
+    Returns (vertices, triangles, report), where the report counts what was removed, and how much
+    headroom is left under the 65535 limit of the format.
+    '''
+
+    verts = np.asarray(verts, dtype = np.float64).reshape(-1, 2)
+    tris = np.asarray(tris, dtype = np.int64).reshape(-1, 3)
+
+    if tris.size > 0 and (tris.min() < 0 or tris.max() >= len(verts)):
+        raise ValueError('Triangle indices must refer to existing vertices')
+
+    # Hash every position into a single sortable value
+    positions = verts if tolerance == 0 else np.round(verts / tolerance)
+    keys = positions[:, 0] + 1j * positions[:, 1]
+
+    _, first_seen, cluster = np.unique(keys, return_index = True, return_inverse = True)
+    cluster = cluster.reshape(-1)
+
+    # Number the welded vertices in order of first appearance, rather than sorted order
+    order = np.argsort(first_seen)
+    rank = np.empty(len(order), dtype = np.int64)
+    rank[order] = np.arange(len(order))
+
+    welded = rank[cluster][tris]
+    representative = first_seen[order]
+
+    # Triangles with 2 corners on the same vertex, or no area at all. The area is worked out from the
+    # float32 positions the file will hold, the same way validate.py checks for degenerate triangles.
+    corners = verts[representative].astype(np.float32).astype(np.float64)[welded]
+
+    with np.errstate(invalid = 'ignore'):
+
+        doubled_area = (
+            (corners[:, 1, 0] - corners[:, 0, 0]) * (corners[:, 2, 1] - corners[:, 0, 1]) -
+            (corners[:, 1, 1] - corners[:, 0, 1]) * (corners[:, 2, 0] - corners[:, 0, 0])
+        )
+
+    degenerate = (welded[:, 0] == welded[:, 1]) | (welded[:, 1] == welded[:, 2]) | (welded[:, 2] == welded[:, 0]) | (doubled_area == 0)
+    welded = welded[~degenerate]
+
+    # Triangles on the same 3 vertices fill the same pixels, whatever their winding
+    corners = np.sort(welded, axis = 1)
+    _, unique_tris = np.unique((corners[:, 0] * len(order) + corners[:, 1]) * len(order) + corners[:, 2], return_index = True)
+    unique_tris.sort()
+
+    duplicates = len(welded) - len(unique_tris)
+    welded = welded[unique_tris]
+
+    used, new_tris = np.unique(welded, return_inverse = True)
+
+    new_verts = verts[representative[used]]
+    new_tris = new_tris.reshape(-1, 3)
+
+    report = {
+        'vertices_before': len(verts),
+        'vertices_after': len(new_verts),
+        'welded_vertices': len(verts) - len(order),
+        'unreferenced_vertices': len(order) - len(used),
+        'triangles_before': len(tris),
+        'triangles_after': len(new_tris),
+        'degenerate_triangles': int(degenerate.sum()),
+        'duplicate_triangles': duplicates,
+    }
+
+    report.update(mesh_headroom(len(new_verts), len(new_tris)))
+
+    return new_verts, new_tris, report
@@ -1,7 +1,22 @@
 import struct
 from typing import List, Tuple, Any
 
-from .utilitity import is_cord_valid, is_poly_valid
+import numpy as np
+
+from .profiling import count
+from .utilitity import is_cord_valid, is_poly_valid, valid_coords_mask
+
+# Layout of a single XYZ vertex inside a mesh chunk
+VERTEX_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+
+# Layout of the 3 indices of a single triangle inside a mesh chunk
+TRIANGLE_DTYPE = np.dtype([('a', '<u2'), ('b', '<u2'), ('c', '<u2')])
+
+# Layout of a single quad corner ("coordinate group") inside a quad chunk
+QUAD_CORNER_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('alt', '<u4'), ('one_or_zero', '<f4')])
+
+# Layout of a full quad, 4 corners, 80 bytes
+QUAD_DTYPE = np.dtype([('corners', QUAD_CORNER_DTYPE, (4,))])
 
 def read_single_mesh_chunk(bin: bytes, index: int) -> Tuple[Tuple[List[Tuple[float, float]], List[Tuple[int, int, int]]], int]:
 
@@ -89,6 +104,8 @@ def read_line_quads(bin: bytes, index: int) -> Tuple[List[Tuple[Tuple[float, flo
 
         if not is_poly_valid(quad):
             # This happens from time to time, likely due to SW devs shitty dev codebase. We can safely ignore these packets though, because of the way that the later rendering works.
+            count('dropped_quads')
+
             continue
 
         quads.append(quad)
@@ -96,6 +113,111 @@ def read_line_quads(bin: bytes, index: int) -> Tuple[List[Tuple[Tuple[float, flo
     # Return the quads, and the number of bytes read    
     return quads, part_index - index
 
+def read_mesh_chunk_arrays(bin: bytes, index: int) -> Tuple[Tuple[np.ndarray, np.ndarray], int]:
+
+    '''
+    Vectorized version of read_single_mesh_chunk.
+
+    Views the chunk with np.frombuffer rather than unpacking it element by element, and returns
+    an (N, 2) float32 array of X,Y coordinates, and an (M, 3) uint16 array of triangle indices.
+    Works on anything supporting the buffer protocol (bytes, mmap, memoryview).
+    '''
+
+    # Read the chunk length of the coordinates section.
+    chunk_length = struct.unpack_from('<H', bin, index)[0]
+
+    read_index = 2 + index
+
+    # View all the vertices at once
+    raw_vertices = np.frombuffer(bin, dtype = VERTEX_DTYPE, count = chunk_length, offset = read_index)
+
+    # Ditch middle coordinate (always zero)
+    coordinates = np.empty((chunk_length, 2), dtype = np.float32)
+    coordinates[:, 0] = raw_vertices['x']
+    coordinates[:, 1] = raw_vertices['z']
+
+    valid = valid_coords_mask(coordinates)
+
+    if not valid.all():
+        # Report the first offending coordinate, the same way the scalar parser would
+        bad = int(np.argmin(valid))
+        x, y = coordinates[bad].tolist()
+
+        raise ValueError(f'An invalid coordinate was read from the file: {(x, y)} at index: {read_index + bad * VERTEX_DTYPE.itemsize}')
+
+    read_index += chunk_length * VERTEX_DTYPE.itemsize
+
+    # The read point now lies at the triangle index section.
+    tris_chunk_length = struct.unpack_from('<H', bin, read_index)[0]
+
+    read_index += 2
+
+    tris_count = tris_chunk_length // 3
+
+    # View all the triangles at once, and convert them into a plain (M, 3) array
+    raw_tris = np.frombuffer(bin, dtype = TRIANGLE_DTYPE, count = tris_count, offset = read_index)
+    tris = raw_tris.view('<u2').reshape(tris_count, 3)
+
+    read_index += tris_count * TRIANGLE_DTYPE.itemsize
+
+    return (coordinates, tris), read_index - index
+
+def read_line_quad_arrays(bin: bytes, index: int) -> Tuple[np.ndarray, int]:
+
+    '''
+    Vectorized version of read_line_quads.
+
+    Returns an (N, 4, 2) float32 array containing the X,Y values of each quad corner.
+    Quads containing NaNs or infs are dropped, exactly like the scalar parser.
+    '''
+
+    # Read the length of the quads chunk
+    chunk_length = struct.unpack_from('<H', bin, index)[0]
+
+    part_index = 2 + index
+
+    quad_count = chunk_length // 4
+
+    raw_quads = np.frombuffer(bin, dtype = QUAD_DTYPE, count = quad_count, offset = part_index)['corners']
+
+    quads = np.empty((quad_count, 4, 2), dtype = np.float32)
+    quads[:, :, 0] = raw_quads['x']
+    quads[:, :, 1] = raw_quads['z']
+
+    part_index += quad_count * QUAD_DTYPE.itemsize
+
+    # Drop the broken quads in one go
+    valid = valid_coords_mask(quads)
+
+    if not valid.all():
+        quads = quads[valid]
+
+        count('dropped_quads', quad_count - len(quads))
+
+    return quads, part_index - index
+
+def read_single_mesh_chunk_vectorized(bin: bytes, index: int) -> Tuple[Tuple[List[Tuple[float, float]], List[Tuple[int, int, int]]], int]:
+
+    '''
+    Drop in replacement for read_single_mesh_chunk, which parses using read_mesh_chunk_arrays.
+    The output is identical to read_single_mesh_chunk.
+    '''
+
+    (coordinates, tris), size = read_mesh_chunk_arrays(bin, index)
+
+    return (list(map(tuple, coordinates.tolist())), list(map(tuple, tris.tolist()))), size
+
+def read_line_quads_vectorized(bin: bytes, index: int) -> Tuple[List[Tuple[Tuple[float, float]]], int]:
+
+    '''
+    Drop in replacement for read_line_quads, which parses using read_line_quad_arrays.
+    The output is identical to read_line_quads.
+    '''
+
+    quads, size = read_line_quad_arrays(bin, index)
+
+    return [tuple(map(tuple, quad)) for quad in quads.tolist()], size
+
 def read_n_using_func(bin: bytes, index: int, number: int, function) -> Tuple[List[Any], int]:
 
     '''
@@ -123,6 +245,64 @@ def read_n_using_func(bin: bytes, index: int, number: int, function) -> Tuple[Li
     
     return results, part_index - index
 
+def mesh_chunk_size(bin: bytes, index: int) -> int:
+
+    '''
+    Determine the size in bytes of the mesh chunk at a given index, by only reading its length headers.
+    '''
+
+    chunk_length = struct.unpack_from('<H', bin, index)[0]
+
+    # Skip over the vertex data to find the triangle length header
+    tris_index = index + 2 + chunk_length * 12
+
+    tris_chunk_length = struct.unpack_from('<H', bin, tris_index)[0]
+
+    return (tris_index + 2 + (tris_chunk_length // 3) * 6) - index
+
+def quad_chunk_size(bin: bytes, index: int) -> int:
+
+    '''
+    Determine the size in bytes of the quad chunk at a given index, by only reading its length header.
+    '''
+
+    chunk_length = struct.unpack_from('<H', bin, index)[0]
+
+    return 2 + (chunk_length // 4) * 80
+
+def index_chunks(bin: bytes, index: int = 0) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]], int]:
+
+    '''
+    Walk the length headers of a full geometry file, without decoding any of the chunk contents.
+
+    Returns the (start, end) byte spans of the 11 mesh chunks, the (start, end) byte spans
+    of the 10 quad chunks, and the index where the quad chunks end.
+    '''
+
+    part_index = index
+
+    mesh_spans = []
+
+    for _ in range(11):
+
+        size = mesh_chunk_size(bin, part_index)
+
+        mesh_spans.append((part_index, part_index + size))
+
+        part_index += size
+
+    quad_spans = []
+
+    for _ in range(10):
+
+        size = quad_chunk_size(bin, part_index)
+
+        quad_spans.append((part_index, part_index + size))
+
+        part_index += size
+
+    return mesh_spans, quad_spans, part_index
+
 def add_length(byte_string: bytes, value: int) -> bytes:
 
     '''
@@ -134,33 +314,45 @@ def add_length(byte_string: bytes, value: int) -> bytes:
     return length_bytes + byte_string
     
 
-def pack_single_mesh(verts: List[Tuple[float, float]], tris: List[Tuple[int, int, int]]) -> bytes:
+def mesh_chunk_parts(verts: List[Tuple[float, float]], tris: List[Tuple[int, int, int]]) -> List[bytes]:
 
     '''
-    Pack a mesh chunk, using vertex and triangle data
+    Pack a mesh chunk into its 4 parts (vertex length, vertex data, triangle length, triangle data).
+    Each part is packed in bulk, so this runs in linear time. Accepts lists of tuples or arrays.
     '''
 
-    verts_bytes = b''
+    verts_array = np.asarray(verts, dtype = np.float32).reshape(-1, 2)
+    tris_array = np.asarray(tris).reshape(-1, 3)
 
-    # Pack all the vertices
-    for vert in verts:
+    # Pack all the vertices, with the middle coordinate left as zero
+    packed_verts = np.zeros(len(verts_array), dtype = VERTEX_DTYPE)
+    packed_verts['x'] = verts_array[:, 0]
+    packed_verts['z'] = verts_array[:, 1]
 
-        verts_bytes += struct.pack('<fff', vert[0], 0, vert[1])
+    if tris_array.size > 0 and (tris_array.min() < 0 or tris_array.max() > 0xFFFF):
+        raise ValueError('Triangle indices must fit in an unsigned 16 bit integer')
 
-    # Add a length prefix indicating the number of vertices 
-    verts_bytes = add_length(verts_bytes, len(verts))
+    # The counts are stored as unsigned 16 bit integers too
+    if len(verts_array) > 0xFFFF or len(tris_array) * 3 > 0xFFFF:
+        raise ValueError(f'Mesh layer too large for the file format ({len(verts_array)} vertices, {len(tris_array) * 3} triangle indices, the limit is 65535 each). Try MapGeometry.optimize_geometry')
 
-    tri_bytes = b''
-    
     # Pack all the triangles
-    for tri in tris:
+    packed_tris = np.ascontiguousarray(tris_array, dtype = '<u2')
 
-        tri_bytes += struct.pack('<HHH', *tri)
+    return [
+        struct.pack('<H', len(verts_array)), # Number of vertices
+        packed_verts.tobytes(),
+        struct.pack('<H', len(tris_array) * 3), # Number of triangle indices
+        packed_tris.tobytes()
+    ]
 
-    # Add a length prefix indicating the number of triangle indices 
-    tri_bytes = add_length(tri_bytes, len(tris) * 3)
-    
-    return verts_bytes + tri_bytes
+def pack_single_mesh(verts: List[Tuple[float, float]], tris: List[Tuple[int, int, int]]) -> bytes:
+
+    '''
+    Pack a mesh chunk, using vertex and triangle data
+    '''
+
+    return b''.join(mesh_chunk_parts(verts, tris))
 
 def pack_single_quad(quad: Tuple[Tuple[float, float]]) -> bytes:
 
@@ -177,16 +369,30 @@ def pack_single_quad(quad: Tuple[Tuple[float, float]]) -> bytes:
             quad[3][0], 0, quad[3][1], 0, 1
         )
 
-def pack_quads(quad_list: List[Tuple[Tuple[float, float]]]) -> bytes:
+def quad_chunk_parts(quad_list: List[Tuple[Tuple[float, float]]]) -> List[bytes]:
 
     '''
-    Pack a list of quads into a single bytes object
+    Pack a quad chunk into its 2 parts (length, quad data), packing all the quads in bulk.
+    Accepts a list of quads, or an (N, 4, 2) array.
     '''
 
-    output_bytes = b''
+    quads_array = np.asarray(quad_list, dtype = np.float32).reshape(-1, 4, 2)
 
-    for quad in quad_list:
+    packed_quads = np.zeros(len(quads_array), dtype = QUAD_DTYPE)
+    corners = packed_quads['corners']
 
-        output_bytes += pack_single_quad(quad)
-    
-    return add_length(output_bytes, len(quad_list) * 4)
\ No newline at end of file
+    corners['x'] = quads_array[:, :, 0]
+    corners['z'] = quads_array[:, :, 1]
+
+    # Emulate the 1, 0, 0, 1 pattern, and just leave the weirdo altitude field as zero
+    corners['one_or_zero'] = (1, 0, 0, 1)
+
+    return [struct.pack('<H', len(quads_array) * 4), packed_quads.tobytes()]
+
+def pack_quads(quad_list: List[Tuple[Tuple[float, float]]]) -> bytes:
+
+    '''
+    Pack a list of quads into a single bytes object
+    '''
+
+    return b''.join(quad_chunk_parts(quad_list))
@@ -0,0 +1,501 @@
+import difflib
+import hashlib
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .parsing import index_chunks
+from .sw_ducky import MapGeometry
+from .tileset import find_tiles, tile_filename
+
+# A tile patch is the magic bytes and version, followed by a zlib compressed list of operations.
+# Every operation targets one chunk of the file, and holds the hash of that chunk before and after,
+# so a patch can be applied to any tile whose touched chunks match (even if other chunks were changed
+# by something else), and the result is always checked.
+#
+# Chunks are edited as hunks from a sequence diff of their records: each hunk replaces a range of
+# records of the base chunk with some new ones, and everything between the hunks is kept. For meshes,
+# triangles are remapped to the new vertex positions before being diffed, so inserting or removing
+# a vertex doesn't turn every later triangle into a change. Chunks where this would be bigger than
+# the chunk itself are stored whole instead.
+PATCH_MAGIC = b'DUCKYPAT'
+ISLAND_PATCH_MAGIC = b'DUCKYIPT'
+PATCH_VERSION = 2
+
+HEADER_FORMAT = struct.Struct('<8sH')
+OPERATION_FORMAT = struct.Struct('<BBB16s16s')
+ISLAND_ENTRY_FORMAT = struct.Struct('<iiI')
+
+# Operation kinds
+MESH, QUADS, TRAILING = range(3)
+
+# Operation modes
+EDIT, REPLACE = range(2)
+
+VERTEX_SIZE = 12
+QUAD_SIZE = 80
+
+def chunk_hash(data: bytes) -> bytes:
+
+    '''
+    Hash the bytes of a single chunk.
+    '''
+
+    return hashlib.blake2b(data, digest_size = 16).digest()
+
+def _split(data: bytes) -> Tuple[List[bytes], List[bytes], bytes]:
+
+    # Cut a file up into its 11 mesh chunks, 10 quad chunks and trailing bytes
+    mesh_spans, quad_spans, end = index_chunks(data)
+
+    view = memoryview(data)
+
+    meshes = [view[start:stop] for start, stop in mesh_spans]
+    quads = [view[start:stop] for start, stop in quad_spans]
+
+    return meshes, quads, view[end:]
+
+def _records(data: bytes, offset: int, count: int, size: int) -> np.ndarray:
+
+    # View fixed size records as opaque values, so they compare (and copy) byte for byte
+    return np.frombuffer(data, dtype = f'V{size}', count = count, offset = offset)
+
+def _mesh_arrays(chunk: bytes) -> Tuple[np.ndarray, np.ndarray]:
+
+    vertex_count = struct.unpack_from('<H', chunk, 0)[0]
+    index_count = struct.unpack_from('<H', chunk, 2 + vertex_count * VERTEX_SIZE)[0]
+
+    verts = _records(chunk, 2, vertex_count, VERTEX_SIZE)
+    tris = np.frombuffer(chunk, dtype = '<u2', count = (index_count // 3) * 3, offset = 4 + vertex_count * VERTEX_SIZE).reshape(-1, 3)
+
+    return verts, tris
+
+def _quad_array(chunk: bytes) -> np.ndarray:
+
+    return _records(chunk, 2, struct.unpack_from('<H', chunk, 0)[0] // 4, QUAD_SIZE)
+
+def _hunks(base: list, target: list) -> np.ndarray:
+
+    # Diff two lists of records. Returns an (N, 3) array of (base start, base end, target count) for
+    # each hunk, where base[start:end] is replaced by the next target count records of the target.
+    limit = min(len(base), len(target))
+
+    # Most edits touch a few records, so skip the common ends before the (slower) full diff
+    prefix = 0
+
+    while prefix < limit and base[prefix] == target[prefix]:
+        prefix += 1
+
+    suffix = 0
+
+    while suffix < limit - prefix and base[-1 - suffix] == target[-1 - suffix]:
+        suffix += 1
+
+    matcher = difflib.SequenceMatcher(None, base[prefix:len(base) - suffix], target[prefix:len(target) - suffix], autojunk = False)
+
+    hunks = [(prefix + i1, prefix + i2, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+    return np.array(hunks, dtype = np.int64).reshape(-1, 3)
+
+def _added(target: np.ndarray, hunks: np.ndarray) -> np.ndarray:
+
+    # The target records the hunks put in, one after the other
+    if len(hunks) == 0:
+        return target[:0]
+
+    # Each hunk starts in the target where it starts in the base, shifted by the hunks before it
+    growth = hunks[:, 2] - (hunks[:, 1] - hunks[:, 0])
+    starts = hunks[:, 0] + np.cumsum(growth) - growth
+
+    return np.concatenate([target[start:start + count] for start, count in zip(starts.tolist(), hunks[:, 2].tolist())])
+
+def _apply_hunks(base: np.ndarray, hunks: np.ndarray, added: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    # Rebuild the target records. Also returns where each base record ends up, or -1 if it was replaced.
+    if ((hunks[:, 0] > hunks[:, 1]) | (hunks[:, 1] > len(base))).any() or (hunks[1:, 0] < hunks[:-1, 1]).any() or hunks[:, 2].sum() != len(added):
+        raise ValueError('Patch hunks are out of order, or out of range')
+
+    pieces = []
+    remap = np.full(len(base), -1, dtype = np.int64)
+
+    position = 0
+    output = 0
+    taken = 0
+
+    for start, end, count in hunks.tolist():
+
+        pieces.append(base[position:start])
+        remap[position:start] = np.arange(output, output + start - position)
+        output += start - position
+
+        pieces.append(added[taken:taken + count])
+        taken += count
+        output += count
+
+        position = end
+
+    pieces.append(base[position:])
+    remap[position:] = np.arange(output, output + len(base) - position)
+
+    return np.concatenate(pieces), remap
+
+def _pack_array(array: np.ndarray, dtype: str) -> bytes:
+
+    array = np.ascontiguousarray(array, dtype = dtype)
+
+    return struct.pack('<I', len(array)) + array.tobytes()
+
+def _pack_records(records: np.ndarray) -> bytes:
+
+    return struct.pack('<I', len(records)) + records.tobytes()
+
+def _read_array(body: bytes, index: int, dtype: str) -> Tuple[np.ndarray, int]:
+
+    count = struct.unpack_from('<I', body, index)[0]
+    array = np.frombuffer(body, dtype = dtype, count = count, offset = index + 4)
+
+    return array, index + 4 + array.nbytes
+
+def _read_records(body: bytes, index: int, size: int) -> Tuple[np.ndarray, int]:
+
+    count = struct.unpack_from('<I', body, index)[0]
+
+    return _records(body, index + 4, count, size), index + 4 + count * size
+
+def _read_hunks(body: bytes, index: int) -> Tuple[np.ndarray, int]:
+
+    hunks, index = _read_array(body, index, '<u4')
+
+    return hunks.astype(np.int64).reshape(-1, 3), index
+
+def _diff_mesh(base: bytes, target: bytes) -> bytes:
+
+    base_verts, base_tris = _mesh_arrays(base)
+    target_verts, target_tris = _mesh_arrays(target)
+
+    vert_hunks = _hunks(base_verts.tolist(), target_verts.tolist())
+
+    # Where each base vertex ends up, or -1 if it was replaced
+    _, remap = _apply_hunks(np.arange(len(base_verts)), vert_hunks, np.full(vert_hunks[:, 2].sum(), -1))
+
+    remapped = remap[base_tris.astype(np.int64)]
+
+    # Triangles using replaced vertices never match, as the target has no -1 indices
+    tri_hunks = _hunks([tuple(tri) for tri in remapped.tolist()], [tuple(tri) for tri in target_tris.tolist()])
+
+    return (
+        _pack_array(vert_hunks.reshape(-1), '<u4') +
+        _pack_records(_added(target_verts, vert_hunks)) +
+        _pack_array(tri_hunks.reshape(-1), '<u4') +
+        _pack_array(_added(target_tris, tri_hunks).reshape(-1), '<u2')
+    )
+
+def _apply_mesh(base: bytes, body: bytes, index: int) -> Tuple[bytes, int]:
+
+    base_verts, base_tris = _mesh_arrays(base)
+
+    vert_hunks, index = _read_hunks(body, index)
+    added_verts, index = _read_records(body, index, VERTEX_SIZE)
+    tri_hunks, index = _read_hunks(body, index)
+    added_tris, index = _read_array(body, index, '<u2')
+
+    verts, remap = _apply_hunks(base_verts, vert_hunks, added_verts)
+
+    tris, _ = _apply_hunks(remap[base_tris.astype(np.int64)], tri_hunks, added_tris.reshape(-1, 3).astype(np.int64))
+
+    # Added triangles can't have negative indices, so these are kept ones
+    if (tris < 0).any():
+        raise ValueError('Patch keeps a triangle whose vertex it removes')
+
+    tris = tris.reshape(-1).astype('<u2')
+
+    return struct.pack('<H', len(verts)) + verts.tobytes() + struct.pack('<H', len(tris)) + tris.tobytes(), index
+
+def _diff_quads(base: bytes, target: bytes) -> bytes:
+
+    base_quads = _quad_array(base)
+    target_quads = _quad_array(target)
+
+    hunks = _hunks(base_quads.tolist(), target_quads.tolist())
+
+    return _pack_array(hunks.reshape(-1), '<u4') + _pack_records(_added(target_quads, hunks))
+
+def _apply_quads(base: bytes, body: bytes, index: int) -> Tuple[bytes, int]:
+
+    base_quads = _quad_array(base)
+
+    hunks, index = _read_hunks(body, index)
+    added, index = _read_records(body, index, QUAD_SIZE)
+
+    quads, _ = _apply_hunks(base_quads, hunks, added)
+
+    return struct.pack('<H', len(quads) * 4) + quads.tobytes(), index
+
+_DIFFERS = {MESH: _diff_mesh, QUADS: _diff_quads}
+_APPLIERS = {MESH: _apply_mesh, QUADS: _apply_quads}
+
+def diff_bytes(base: bytes, target: bytes) -> bytes:
+
+    '''
+    Make a patch which turns the contents of one .bin file into another.
+
+    Chunks with the same hash are skipped. Changed chunks are stored as a diff of their records
+    (vertices, triangles or quads), or whole if that is smaller.
+    '''
+
+    base_meshes, base_quads, base_trailing = _split(base)
+    target_meshes, target_quads, target_trailing = _split(target)
+
+    operations = []
+
+    chunk_pairs = [(MESH, chunk, pair) for chunk, pair in enumerate(zip(base_meshes, target_meshes))]
+    chunk_pairs += [(QUADS, chunk, pair) for chunk, pair in enumerate(zip(base_quads, target_quads))]
+
+    for kind, chunk, (base_chunk, target_chunk) in chunk_pairs:
+
+        base_hash, target_hash = chunk_hash(base_chunk), chunk_hash(target_chunk)
+
+        if base_hash == target_hash:
+            continue
+
+        edit = _DIFFERS[kind](base_chunk, target_chunk)
+
+        # Edits rebuild the length headers from the records, so chunks with leftover partial triangles
+        # or quads can't always be reproduced. Check, and store those whole.
+        if len(edit) < len(target_chunk) and _APPLIERS[kind](base_chunk, edit, 0)[0] == target_chunk:
+            operations.append(OPERATION_FORMAT.pack(kind, chunk, EDIT, base_hash, target_hash) + edit)
+        else:
+            operations.append(OPERATION_FORMAT.pack(kind, chunk, REPLACE, base_hash, target_hash) + struct.pack('<I', len(target_chunk)) + bytes(target_chunk))
+
+    if bytes(base_trailing) != bytes(target_trailing):
+        operations.append(OPERATION_FORMAT.pack(TRAILING, 0, REPLACE, chunk_hash(base_trailing), chunk_hash(target_trailing)) + struct.pack('<I', len(target_trailing)) + bytes(target_trailing))
+
+    body = struct.pack('<H', len(operations)) + b''.join(operations)
+
+    return HEADER_FORMAT.pack(PATCH_MAGIC, PATCH_VERSION) + zlib.compress(body)
+
+def apply_patch_bytes(base: bytes, patch: bytes) -> bytes:
+
+    '''
+    Apply a patch made by diff_bytes (or diff_geometry) to the contents of a .bin file.
+
+    Only the chunks the patch touches have to match the ones it was made from, everything else is
+    copied across as is. Raises ValueError if a touched chunk doesn't match, or the result isn't
+    what the patch was made to produce.
+    '''
+
+    magic, version = HEADER_FORMAT.unpack_from(patch, 0)
+
+    if magic != PATCH_MAGIC:
+        raise ValueError('Not a tile patch (bad magic bytes)')
+
+    if version != PATCH_VERSION:
+        raise ValueError(f'Unsupported tile patch version {version}')
+
+    body = zlib.decompress(patch[HEADER_FORMAT.size:])
+
+    meshes, quads, trailing = _split(base)
+    chunks = {MESH: meshes, QUADS: quads, TRAILING: [trailing]}
+
+    operation_count = struct.unpack_from('<H', body, 0)[0]
+    index = 2
+
+    for _ in range(operation_count):
+
+        kind, chunk, mode, base_hash, target_hash = OPERATION_FORMAT.unpack_from(body, index)
+        index += OPERATION_FORMAT.size
+
+        base_chunk = chunks[kind][chunk]
+
+        if chunk_hash(base_chunk) != base_hash:
+            raise ValueError(f'Patch does not apply: {("mesh", "quad", "trailing")[kind]} chunk {chunk} differs from the one the patch was made from')
+
+        if mode == REPLACE:
+            length = struct.unpack_from('<I', body, index)[0]
+            new_chunk = body[index + 4:index + 4 + length]
+            index += 4 + length
+        else:
+            new_chunk, index = _APPLIERS[kind](base_chunk, body, index)
+
+        if chunk_hash(new_chunk) != target_hash:
+            raise ValueError(f'Patch produced the wrong result for {("mesh", "quad", "trailing")[kind]} chunk {chunk}')
+
+        chunks[kind][chunk] = new_chunk
+
+    return b''.join([*meshes, *quads, trailing])
+
+def diff_geometry(base: MapGeometry, target: MapGeometry) -> bytes:
+
+    '''
+    Make a patch which turns one MapGeometry into another, i.e.:
+
+    patch = diff_geometry(MapGeometry.from_file('original.bin'), modded_geo)
+    '''
+
+    return diff_bytes(base.to_bytes(), target.to_bytes())
+
+def diff_files(base_path: str, target_path: str) -> bytes:
+
+    '''
+    Make a patch which turns one .bin file into another.
+    '''
+
+    with open(base_path, 'rb') as file_obj:
+        base = file_obj.read()
+
+    with open(target_path, 'rb') as file_obj:
+        target = file_obj.read()
+
+    return diff_bytes(base, target)
+
+def apply_patch(geo: MapGeometry, patch: bytes, **kwargs) -> MapGeometry:
+
+    '''
+    Apply a patch to a MapGeometry, giving a new MapGeometry. Any extra keyword arguments are passed
+    through to MapGeometry.from_bytes (i.e. compact = True). The original object is left as is.
+    '''
+
+    return MapGeometry.from_bytes(apply_patch_bytes(geo.to_bytes(), patch), moon = geo.moon, **kwargs)
+
+def diff_island(base_directory: str, target_directory: str, island: str) -> bytes:
+
+    '''
+    Make a patch for every tile of an island that differs between two tiles directories.
+
+    Tiles that only exist in the target are patched against an empty tile, and tiles that only
+    exist in the base are removed when the patch is applied.
+    '''
+
+    base_paths = find_tiles(base_directory, island)
+    target_paths = find_tiles(target_directory, island)
+
+    empty = MapGeometry().to_bytes()
+
+    entries = []
+
+    for position in sorted(set(base_paths) | set(target_paths), key = lambda position: (position[1], position[0])):
+
+        if position not in target_paths:
+            # Zero length means remove the tile
+            entries.append(ISLAND_ENTRY_FORMAT.pack(*position, 0))
+            continue
+
+        with open(target_paths[position], 'rb') as file_obj:
+            target = file_obj.read()
+
+        if position in base_paths:
+            with open(base_paths[position], 'rb') as file_obj:
+                base = file_obj.read()
+        else:
+            base = empty
+
+        if base == target:
+            continue
+
+        patch = diff_bytes(base, target)
+
+        entries.append(ISLAND_ENTRY_FORMAT.pack(*position, len(patch)) + patch)
+
+    return ISLAND_PATCH_MAGIC + struct.pack('<I', len(entries)) + b''.join(entries)
+
+def read_island_patch(patch: bytes) -> Dict[Tuple[int, int], Optional[bytes]]:
+
+    '''
+    Split an island patch into (x, y) -> tile patch, or None for tiles the patch removes.
+    '''
+
+    if patch[:len(ISLAND_PATCH_MAGIC)] != ISLAND_PATCH_MAGIC:
+        raise ValueError('Not an island patch (bad magic bytes)')
+
+    index = len(ISLAND_PATCH_MAGIC)
+
+    entry_count = struct.unpack_from('<I', patch, index)[0]
+    index += 4
+
+    tiles = {}
+
+    for _ in range(entry_count):
+
+        x, y, length = ISLAND_ENTRY_FORMAT.unpack_from(patch, index)
+        index += ISLAND_ENTRY_FORMAT.size
+
+        tiles[(x, y)] = patch[index:index + length] if length > 0 else None
+        index += length
+
+    return tiles
+
+def _patch_tile(arguments: Tuple[Optional[str], bytes]) -> bytes:
+
+    # Runs inside the worker processes, so it has to live at module level to be picklable
+    base_path, patch = arguments
+
+    if base_path is None:
+        base = MapGeometry().to_bytes()
+    else:
+        with open(base_path, 'rb') as file_obj:
+            base = file_obj.read()
+
+    return apply_patch_bytes(base, patch)
+
+def apply_island_patch(patch: bytes, tiles_directory: str, island: str, output_directory: Optional[str] = None, processes: Optional[int] = None) -> Dict[Tuple[int, int], str]:
+
+    '''
+    Apply a patch made by diff_island to the tiles of an island, i.e.:
+
+    apply_island_patch(patch, '.../Stormworks/rom/data/tiles', 'arid_island')
+
+    The patched tiles are written to output_directory, or over the original files if it isn't given.
+    Tiles are patched across a pool of worker processes (processes defaults to the number of cores,
+    use processes = 1 to patch in the current process). Every tile is patched in memory before
+    anything is written, so a patch that doesn't apply leaves the tiles untouched.
+
+    Returns a dict of (x, y) -> path of every tile written or removed.
+    '''
+
+    tiles = read_island_patch(patch)
+    paths = find_tiles(tiles_directory, island)
+
+    changed = [position for position, tile_patch in tiles.items() if tile_patch is not None]
+    arguments = [(paths.get(position), tiles[position]) for position in changed]
+
+    try:
+        if processes == 1 or len(arguments) <= 1:
+            patched = list(map(_patch_tile, arguments))
+        else:
+            workers = processes or os.cpu_count() or 1
+
+            # Hand out work in batches, so the per tile overhead stays small
+            chunksize = max(1, len(arguments) // (4 * workers))
+
+            with ProcessPoolExecutor(max_workers = workers) as executor:
+                patched = list(executor.map(_patch_tile, arguments, chunksize = chunksize))
+
+    except ValueError as error:
+        raise ValueError(f'Island patch does not apply, no tiles were changed: {error}') from None
+
+    output_directory = output_directory or tiles_directory
+    os.makedirs(output_directory, exist_ok = True)
+
+    written = {}
+
+    for position, data in zip(changed, patched):
+
+        written[position] = os.path.join(output_directory, tile_filename(island, *position))
+
+        with open(written[position], 'wb') as file_obj:
+            file_obj.write(data)
+
+    for position, tile_patch in tiles.items():
+
+        if tile_patch is None:
+
+            written[position] = os.path.join(output_directory, tile_filename(island, *position))
+
+            if os.path.exists(written[position]):
+                os.remove(written[position])
+
+    return written
@@ -0,0 +1,173 @@
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+# Profiles currently collecting, innermost last. Every instrumentation point checks this first, so while
+# nothing is being profiled the cost is a single truth test (phase also returns a shared do-nothing context).
+_profiles: List['Profile'] = []
+
+_NULL_PHASE = nullcontext()
+
+class Profile:
+
+    '''
+    Collect timings and counters from Ducky while in use as a context manager, i.e.:
+
+    with Profile() as profile:
+        geo = MapGeometry.from_file('arid.bin')
+        geo.render_to_image(1000)
+
+    print(profile.summary())
+
+    Phases (like 'parse/mesh_chunk', 'render/fill' or 'render/lines/dashed') record their call count
+    and total wall time. Counters (like 'bytes_read', 'dropped_quads' or 'render/triangles/Sand') add
+    up values. Nested phases are each timed in full, so their times overlap.
+
+    If a callback is given, it is also called with ('phase', name, seconds) at the end of every phase,
+    and ('count', name, value) for every counter update.
+
+    Profiles can be nested, and each one sees everything that happens while it is active.
+    Only the current process is profiled, so work done inside worker processes isn't counted.
+    '''
+
+    def __init__(self, callback: Optional[Callable[[str, str, float], None]] = None):
+
+        self.callback = callback
+
+        # Phase name -> [calls, total seconds]
+        self.phases: Dict[str, List[float]] = {}
+
+        # Counter name -> total
+        self.counters: Dict[str, float] = {}
+
+    def __enter__(self) -> 'Profile':
+
+        _profiles.append(self)
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        _profiles.remove(self)
+
+    def _add_phase(self, name: str, seconds: float):
+
+        totals = self.phases.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+        if self.callback is not None:
+            self.callback('phase', name, seconds)
+
+    def _add_count(self, name: str, value: float):
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+        if self.callback is not None:
+            self.callback('count', name, value)
+
+    def report(self) -> dict:
+
+        '''
+        Get everything collected so far as a JSON friendly dict.
+        '''
+
+        return {
+            'phases': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in sorted(self.phases.items())},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def summary(self) -> str:
+
+        '''
+        Format everything collected so far as a table, slowest phases first.
+        '''
+
+        lines = [f'{"phase":40} {"calls":>8} {"total ms":>12} {"per call ms":>12}']
+
+        for name, (calls, seconds) in sorted(self.phases.items(), key = lambda item: -item[1][1]):
+            lines.append(f'{name:40} {calls:8d} {seconds * 1000:12.3f} {seconds * 1000 / calls:12.4f}')
+
+        if len(self.counters) > 0:
+
+            lines.append('')
+            lines.append(f'{"counter":40} {"total":>8}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{name:40} {value:8g}')
+
+        return '\n'.join(lines)
+
+class _Phase:
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+
+        self.name = name
+
+    def __enter__(self):
+
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+
+        seconds = time.perf_counter() - self.start
+
+        for profile in _profiles:
+            profile._add_phase(self.name, seconds)
+
+def phase(name: str):
+
+    '''
+    Time a block of code for any active profiles, i.e.:
+
+    with phase('render/lines'):
+        ...
+    '''
+
+    if not _profiles:
+        return _NULL_PHASE
+
+    return _Phase(name)
+
+def count(name: str, value: float = 1):
+
+    '''
+    Add to a counter of any active profiles.
+    '''
+
+    if not _profiles:
+        return
+
+    for profile in _profiles:
+        profile._add_count(name, value)
+
+def is_profiling() -> bool:
+
+    '''
+    Check if any profile is active, to skip gathering numbers that would only be thrown away.
+    '''
+
+    return len(_profiles) > 0
+
+def profiled_reader(reader: Callable, name: str) -> Callable:
+
+    '''
+    Wrap a chunk reader (like read_single_mesh_chunk or read_line_quads), so that the time it takes,
+    and the number of bytes it reads, are recorded under the given phase name.
+    '''
+
+    def read(bin: bytes, index: int):
+
+        if not _profiles:
+            return reader(bin, index)
+
+        with _Phase(name):
+            data, size = reader(bin, index)
+
+        count('bytes_read', size)
+
+        return data, size
+
+    return read
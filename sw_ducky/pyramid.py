@@ -0,0 +1,277 @@
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from .sw_ducky import MapGeometry
+from .tileset import TileSet
+
+# Stored next to the tiles, to work out what needs regenerating on the next export
+MANIFEST_FILENAME = 'pyramid.json'
+MANIFEST_VERSION = 1
+
+def pyramid_zoom_levels(island: TileSet, detail_levels: int = 0) -> int:
+
+    '''
+    Get the deepest zoom level of the pyramid for an island.
+
+    At detail_levels = 0 every map tile becomes a single pyramid tile at the deepest level,
+    each extra detail level doubles the resolution (so splits every map tile into 4 times as many).
+    '''
+
+    return math.ceil(math.log2(max(island.width, island.height))) + detail_levels
+
+def _file_hash(path: str) -> str:
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file_obj:
+
+        for block in iter(lambda: file_obj.read(1024 * 1024), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+def _pillow_format(image_format: str) -> str:
+
+    # Pillow's name for the format of a file extension (jpg -> JPEG, tif -> TIFF)
+    pillow_format = Image.registered_extensions().get('.' + image_format.lower())
+
+    if pillow_format is None:
+        raise ValueError(f'Unsupported image format: {image_format}')
+
+    return pillow_format
+
+def _save_tile(img: Image.Image, path: str, image_format: str):
+
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+
+    # Write to a temporary name first, so an interrupted export never leaves a truncated tile behind
+    temp_path = path + '.tmp'
+
+    img.save(temp_path, format = _pillow_format(image_format))
+
+    os.replace(temp_path, path)
+
+def _render_map_tile(arguments: Tuple[Optional[str], bool, dict, int, int, List[Tuple[int, int, str]], str]):
+
+    # Runs inside the worker processes. Renders a whole map tile at once, and cuts it up into pyramid tiles.
+    source, moon, kwargs, tile_size, split, outputs, image_format = arguments
+
+    geo = MapGeometry(moon = moon) if source is None else MapGeometry.from_file(source, moon = moon, **kwargs)
+
+    img = geo.render_to_image(tile_size * split)
+
+    for column, row, path in outputs:
+
+        box = (column * tile_size, row * tile_size, (column + 1) * tile_size, (row + 1) * tile_size)
+
+        _save_tile(img.crop(box), path, image_format)
+
+def _downsample_tile(arguments: Tuple[List[Optional[str]], str, int, Tuple[int, int, int], str]):
+
+    # Runs inside the worker processes. Stitches the 4 children of a tile together, and shrinks them by half.
+    child_paths, path, tile_size, base_color, image_format = arguments
+
+    stitched = Image.new('RGB', (tile_size * 2, tile_size * 2), base_color)
+
+    # Children in the order: top left, top right, bottom left, bottom right
+    for index, child_path in enumerate(child_paths):
+
+        if child_path is None:
+            continue
+
+        with Image.open(child_path) as child:
+            stitched.paste(child.convert('RGB'), ((index % 2) * tile_size, (index // 2) * tile_size))
+
+    _save_tile(stitched.reduce(2), path, image_format)
+
+def export_pyramid(
+    island: TileSet,
+    output_directory: str,
+    tile_size: int = 256,
+    detail_levels: int = 0,
+    image_format: str = 'png',
+    scheme: str = 'xyz',
+    processes: Optional[int] = None,
+    force: bool = False
+) -> Dict[str, int]:
+
+    '''
+    Export an island as a pyramid of tile_size x tile_size images, for use in slippy map viewers, i.e.:
+
+    export_pyramid(TileSet('.../Stormworks/rom/data/tiles', 'mega_island'), 'web/mega_island')
+
+    Tiles are written to output_directory/{z}/{x}/{y}.png. The island sits in the top left corner of
+    the grid, with y counting down from the top (scheme = 'xyz'), or up from the bottom (scheme = 'tms').
+
+    Only the deepest zoom level is rendered from geometry, each coarser level is made by downsampling
+    the 4 tiles below it. Work is spread across processes (processes = 1 to do everything in the
+    current process).
+
+    The export is incremental: the contents of every .bin file are recorded in a manifest next to the
+    tiles, and the next export only regenerates the pyramid tiles above files which were added, removed,
+    or changed (or whose output is missing). Changing any setting, or the extents of the island, redoes
+    everything, as does force = True.
+
+    Returns the number of tiles that were rendered, downsampled, and skipped.
+    '''
+
+    image_format = image_format.lower()
+
+    # Fail before rendering anything, rather than on every tile
+    _pillow_format(image_format)
+
+    if scheme not in ('xyz', 'tms'):
+        raise ValueError(f'Unknown tile scheme: {scheme}, use "xyz" or "tms"')
+
+    max_zoom = pyramid_zoom_levels(island, detail_levels)
+    split = 2 ** detail_levels
+
+    # Memory mapped tiles can't be sent to the workers, so they get loaded from disk again there
+    load_kwargs = {key: value for key, value in island._load_kwargs.items() if key != 'lazy'}
+
+    settings = {
+        'tile_size': tile_size,
+        'detail_levels': detail_levels,
+        'image_format': image_format,
+        'scheme': scheme,
+        'moon': island.moon,
+        'extents': [island.min_x, island.max_x, island.min_y, island.max_y],
+    }
+
+    manifest_path = os.path.join(output_directory, MANIFEST_FILENAME)
+
+    previous_sources = {}
+
+    if not force and os.path.exists(manifest_path):
+
+        with open(manifest_path, 'r') as file_obj:
+            manifest = json.load(file_obj)
+
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('settings') == settings:
+            previous_sources = manifest['sources']
+
+    rebuild = len(previous_sources) == 0
+
+    sources = {f'{x}_{y}': _file_hash(path) for (x, y), path in island.paths.items()}
+
+    def tile_path(z: int, x: int, y: int) -> str:
+
+        if scheme == 'tms':
+            y = 2 ** z - 1 - y
+
+        return os.path.join(output_directory, str(z), str(x), f'{y}.{image_format}')
+
+    # Work out which map tiles need rendering again
+    render_arguments = []
+    deepest_tiles: Set[Tuple[int, int]] = set()
+    dirty: Set[Tuple[int, int]] = set()
+
+    for x, y in island.coordinates():
+
+        column, row = island.grid_position(x, y)
+        key = f'{x}_{y}'
+
+        outputs = []
+
+        for sub_row in range(split):
+            for sub_column in range(split):
+
+                pyramid_x, pyramid_y = column * split + sub_column, row * split + sub_row
+
+                deepest_tiles.add((pyramid_x, pyramid_y))
+                outputs.append((sub_column, sub_row, tile_path(max_zoom, pyramid_x, pyramid_y), (pyramid_x, pyramid_y)))
+
+        # Files which were added or removed count as changed too
+        changed = sources.get(key) != previous_sources.get(key)
+        missing = any(not os.path.exists(path) for _, _, path, _ in outputs)
+
+        if rebuild or changed or missing:
+
+            dirty.update(position for _, _, _, position in outputs)
+
+            render_arguments.append((
+                island.paths.get((x, y)),
+                island.moon,
+                load_kwargs,
+                tile_size,
+                split,
+                [(sub_column, sub_row, path) for sub_column, sub_row, path, _ in outputs],
+                image_format
+            ))
+
+    counts = {'rendered': len(dirty), 'downsampled': 0, 'skipped': len(deepest_tiles) - len(dirty)}
+
+    # Then build each coarser level from the one below, and only where something below changed
+    levels = []
+    level_tiles = deepest_tiles
+
+    for z in range(max_zoom - 1, -1, -1):
+
+        parents = {(x // 2, y // 2) for x, y in level_tiles}
+        dirty_parents = {(x // 2, y // 2) for x, y in dirty}
+
+        downsample_arguments = []
+
+        for x, y in sorted(parents):
+
+            if (x, y) not in dirty_parents and os.path.exists(tile_path(z, x, y)):
+                counts['skipped'] += 1
+                continue
+
+            dirty_parents.add((x, y))
+
+            children = [(2 * x, 2 * y), (2 * x + 1, 2 * y), (2 * x, 2 * y + 1), (2 * x + 1, 2 * y + 1)]
+            child_paths = [tile_path(z + 1, *child) if child in level_tiles else None for child in children]
+
+            downsample_arguments.append((child_paths, tile_path(z, x, y), tile_size, island.empty_tile().base_color, image_format))
+
+        levels.append(downsample_arguments)
+        counts['downsampled'] += len(downsample_arguments)
+
+        level_tiles, dirty = parents, dirty_parents
+
+    def run(function, arguments: List[tuple], executor: Optional[ProcessPoolExecutor]):
+
+        if executor is None:
+            results: Iterable = map(function, arguments)
+        else:
+            results = executor.map(function, arguments, chunksize = max(1, len(arguments) // (4 * workers)))
+
+        # Wait for everything, and raise any errors from the workers
+        for _ in results:
+            pass
+
+    workers = processes or os.cpu_count() or 1
+
+    if processes == 1:
+
+        run(_render_map_tile, render_arguments, None)
+
+        for downsample_arguments in levels:
+            run(_downsample_tile, downsample_arguments, None)
+
+    else:
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            run(_render_map_tile, render_arguments, executor)
+
+            # Each level depends on the one below it being finished
+            for downsample_arguments in levels:
+                run(_downsample_tile, downsample_arguments, executor)
+
+    # Only record the new state once every tile was written, so a failed export is redone next time
+    os.makedirs(output_directory, exist_ok = True)
+
+    with open(manifest_path + '.tmp', 'w') as file_obj:
+        json.dump({'version': MANIFEST_VERSION, 'settings': settings, 'sources': sources}, file_obj, indent = 4)
+
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    return counts
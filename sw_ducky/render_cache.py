@@ -0,0 +1,287 @@
+import hashlib
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .parsing import read_line_quad_arrays, read_mesh_chunk_arrays
+from .sw_ducky import LINE_COLORS, MapGeometry
+from .tile_drawing import DASH_GAP, DASH_LENGTH, LINE_WIDTH
+
+# Bump this whenever the output of render_to_image changes, so old cache entries stop matching
+RENDER_VERSION = 2
+
+CACHE_FORMATS = ('png', 'raw')
+
+def _drawn_arrays(geo: MapGeometry) -> Iterator[np.ndarray]:
+
+    # Everything the renderer reads from a tile: the X,Y of the vertices, the triangles, and the quads.
+    # Unmodified chunks are viewed straight from the original data, so lazy tiles don't get decoded.
+    for index, key in enumerate(geo.memory_order):
+
+        if geo._mesh_is_clean(key):
+            (verts, tris), _ = read_mesh_chunk_arrays(geo._original_data, geo._mesh_spans[index][0])
+        else:
+            verts, tris = geo.terrain_vertices[key], geo.terrain_tris[key]
+
+        yield np.asarray(verts, dtype = '<f4').reshape(-1, 2)
+        yield np.asarray(tris, dtype = '<i8').reshape(-1, 3)
+
+    for index in range(len(geo.line_data)):
+
+        if geo._quads_are_clean(index):
+            quads, _ = read_line_quad_arrays(geo._original_data, geo._quad_spans[index][0])
+        else:
+            quads = geo.line_data[index]
+
+        yield np.asarray(quads, dtype = '<f4').reshape(-1, 4, 2)
+
+class RenderCache:
+
+    '''
+    An on-disk cache of rendered tiles, i.e.:
+
+    cache = RenderCache('render_cache', max_bytes = 512 * 1024 * 1024)
+    img = geo.render_to_image(1000, cache = cache)
+
+    Entries are keyed by a hash of the tile geometry along with everything that affects how it
+    is drawn (size, palette, line styling, backend, level of detail). The key only depends on what gets
+    drawn (not the unused altitude values or trailing bytes of the file), so all the identical tiles
+    of an island (open sea, empty tiles...) share a single entry, and editing a tile automatically
+    misses the cache.
+
+    Entries are stored as PNG files (or raw RGB buffers with image_format = 'raw', which are bigger but
+    faster to read back). Once the cache grows past max_bytes, the least recently used entries are deleted.
+    '''
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, image_format: str = 'png'):
+
+        if image_format not in CACHE_FORMATS:
+            raise ValueError(f'Unsupported cache format: {image_format}, use one of: {list(CACHE_FORMATS)}')
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+
+        os.makedirs(directory, exist_ok = True)
+
+        # key -> size in bytes, ordered from least to most recently used
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self._scan()
+
+    def _scan(self):
+
+        # Rebuild the index from the files already on disk, using the modification time as the last use
+        found = []
+
+        for key, path in self._iter_files():
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            found.append((stat.st_mtime, key, stat.st_size))
+
+        for _, key, size in sorted(found):
+
+            self._entries[key] = size
+            self.total_bytes += size
+
+    def _iter_files(self) -> Iterator[Tuple[str, str]]:
+
+        extension = '.' + self.image_format
+
+        for shard in os.listdir(self.directory):
+
+            shard_path = os.path.join(self.directory, shard)
+
+            if not os.path.isdir(shard_path):
+                continue
+
+            for filename in os.listdir(shard_path):
+
+                if filename.endswith(extension):
+                    yield filename[:-len(extension)], os.path.join(shard_path, filename)
+
+    def _path(self, key: str) -> str:
+
+        # Spread the files over subdirectories, so no single directory gets huge
+        return os.path.join(self.directory, key[:2], f'{key}.{self.image_format}')
+
+    @staticmethod
+    def key(geo: MapGeometry, size: int, backend: str = 'pil', lod: bool = False) -> str:
+
+        '''
+        Get the cache key of a tile rendered at a given size.
+        '''
+
+        digest = hashlib.sha256()
+
+        for array in _drawn_arrays(geo):
+            digest.update(struct.pack('<I', len(array)))
+            digest.update(array.tobytes())
+
+        parameters = (
+            RENDER_VERSION,
+            size,
+            backend,
+            lod,
+            sorted(geo.lod_meshes) if lod else None,
+            geo.base_color,
+            [(layer, geo.layer_colors[layer]) for layer in geo.render_order],
+            LINE_COLORS,
+            LINE_WIDTH,
+            DASH_LENGTH,
+            DASH_GAP,
+        )
+
+        digest.update(repr(parameters).encode())
+
+        return digest.hexdigest()
+
+    def get(self, key: str, size: int) -> Optional[Image.Image]:
+
+        '''
+        Get a cached image, or None if it isn't in the cache.
+        '''
+
+        path = self._path(key)
+
+        try:
+
+            if self.image_format == 'raw':
+
+                with open(path, 'rb') as file_obj:
+                    img = Image.frombytes('RGB', (size, size), file_obj.read())
+
+            else:
+
+                with Image.open(path) as file_img:
+                    img = file_img.convert('RGB')
+
+        except (FileNotFoundError, OSError, ValueError):
+
+            # Missing, or evicted by another process using the same directory
+            self._forget(key)
+            self.misses += 1
+
+            return None
+
+        self.hits += 1
+
+        # Mark as most recently used, on disk as well so the order survives a restart
+        if key in self._entries:
+            self._entries.move_to_end(key)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return img
+
+    def put(self, key: str, img: Image.Image):
+
+        '''
+        Store an image in the cache, evicting old entries if it grows past max_bytes.
+        '''
+
+        path = self._path(key)
+
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        # Write to a temporary file first, so other processes never see a half written entry
+        descriptor, temp_path = tempfile.mkstemp(dir = os.path.dirname(path), suffix = '.tmp')
+
+        try:
+
+            with os.fdopen(descriptor, 'wb') as file_obj:
+
+                if self.image_format == 'raw':
+                    file_obj.write(img.convert('RGB').tobytes())
+                else:
+                    img.save(file_obj, format = 'PNG')
+
+            os.replace(temp_path, path)
+
+        except BaseException:
+
+            os.remove(temp_path)
+            raise
+
+        self._forget(key)
+
+        self._entries[key] = os.path.getsize(path)
+        self.total_bytes += self._entries[key]
+
+        self._evict()
+
+    def render(self, geo: MapGeometry, size: int, backend: str = 'pil', lod: bool = False) -> Image.Image:
+
+        '''
+        Render a tile, reusing the cached image when the same content was rendered before.
+        '''
+
+        key = self.key(geo, size, backend, lod)
+
+        img = self.get(key, size)
+
+        if img is None:
+
+            img = geo.render_to_image(size, backend = backend, lod = lod)
+
+            self.put(key, img)
+
+        return img
+
+    def _forget(self, key: str):
+
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)
+
+    def _evict(self):
+
+        # Drop the least recently used entries until everything fits again
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+
+            key, _ = next(iter(self._entries.items()))
+
+            self._forget(key)
+
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+
+        '''
+        Delete every entry in the cache.
+        '''
+
+        for key in list(self._entries):
+
+            self._forget(key)
+
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, key: str) -> bool:
+
+        return key in self._entries
+
+    def __len__(self) -> int:
+
+        return len(self._entries)
@@ -0,0 +1,345 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tracking import change_key
+
+# The grid covers the tile itself, geometry hanging over the edges is filed under the border cells
+TILE_MIN = -500
+TILE_SIZE = 1000
+
+def _build_grid(mins: np.ndarray, maxs: np.ndarray, cells: int) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    File every item (given by the corners of its bounding box) under each grid cell it overlaps.
+
+    Returns (starts, items), in compressed sparse row form: the items in cell c are items[starts[c]:starts[c + 1]],
+    with cells numbered row * cells + column.
+    '''
+
+    cell_size = TILE_SIZE / cells
+
+    low = np.clip(np.floor((mins - TILE_MIN) / cell_size), 0, cells - 1).astype(np.int64)
+    high = np.clip(np.floor((maxs - TILE_MIN) / cell_size), 0, cells - 1).astype(np.int64)
+
+    widths = high[:, 0] - low[:, 0] + 1
+    counts = widths * (high[:, 1] - low[:, 1] + 1)
+
+    # Expand into one entry per (item, cell) pair
+    owner = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    columns = low[owner, 0] + local % widths[owner]
+    rows = low[owner, 1] + local // widths[owner]
+
+    cell_ids = rows * cells + columns
+    order = np.argsort(cell_ids, kind = 'stable')
+
+    starts = np.zeros(cells * cells + 1, dtype = np.int64)
+    starts[1:] = np.cumsum(np.bincount(cell_ids, minlength = cells * cells))
+
+    return starts, owner[order]
+
+def _cells_of(points: np.ndarray, cells: int) -> np.ndarray:
+
+    cell_size = TILE_SIZE / cells
+
+    index = np.clip(np.floor((points - TILE_MIN) / cell_size), 0, cells - 1).astype(np.int64)
+
+    return index[:, 1] * cells + index[:, 0]
+
+def _cross(origin: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+
+    return (a[..., 0] - origin[..., 0]) * (b[..., 1] - origin[..., 1]) - (a[..., 1] - origin[..., 1]) * (b[..., 0] - origin[..., 0])
+
+def _polygons_overlap_box(polygons: np.ndarray, box: Tuple[float, float, float, float]) -> np.ndarray:
+
+    '''
+    Separating axis test between an (N, K, 2) array of convex polygons and an axis aligned box.
+    Touching counts as overlapping.
+    '''
+
+    min_x, min_y, max_x, max_y = box
+
+    # The axes of the box
+    overlap = (polygons[:, :, 0].max(axis = 1) >= min_x) & (polygons[:, :, 0].min(axis = 1) <= max_x)
+    overlap &= (polygons[:, :, 1].max(axis = 1) >= min_y) & (polygons[:, :, 1].min(axis = 1) <= max_y)
+
+    box_corners = np.array([[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]])
+
+    # The normal of every edge of the polygons
+    edges = np.roll(polygons, -1, axis = 1) - polygons
+    normals = np.stack([-edges[:, :, 1], edges[:, :, 0]], axis = 2)
+
+    polygon_projection = np.einsum('nkd,njd->nkj', normals, polygons)
+    box_projection = np.einsum('nkd,jd->nkj', normals, box_corners)
+
+    separated = (polygon_projection.max(axis = 2) < box_projection.min(axis = 2)) | (box_projection.max(axis = 2) < polygon_projection.min(axis = 2))
+
+    return overlap & ~separated.any(axis = 1)
+
+def _segment_distances(point: Tuple[float, float], starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+
+    direction = ends - starts
+    length_squared = (direction ** 2).sum(axis = 1)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        along = ((np.asarray(point) - starts) * direction).sum(axis = 1) / length_squared
+
+    # Zero length segments are just their start point
+    along = np.clip(np.nan_to_num(along), 0, 1)
+
+    closest = starts + direction * along[:, None]
+
+    return np.hypot(*(closest - np.asarray(point)).T)
+
+class SpatialIndex:
+
+    '''
+    A uniform grid over the terrain triangles and line quads of a MapGeometry, for answering
+    point and region queries without scanning all of the geometry, i.e.:
+
+    index = geo.spatial_index()
+
+    index.layer_at(120, -40)                # -> 'Grass'
+    index.layers_at(spawn_points)           # Many points at once
+    index.lines_in_box(-100, -100, 100, 100)
+    index.nearest_line(0, 0)
+
+    Use MapGeometry.spatial_index() rather than building one directly, it rebuilds the index whenever
+    the geometry was changed, by add_geometry, add_line, clear_geometry, or by editing a layer in place.
+    '''
+
+    def __init__(self, geo, cells: int = 32):
+
+        self.cells = cells
+        self.render_order = list(geo.render_order)
+
+        self._signature = self.signature(geo)
+
+        # Every triangle of every layer, in one table
+        tri_points, tri_layers, tri_indices = [], [], []
+
+        for rank, layer in enumerate(self.render_order):
+
+            verts = np.asarray(geo.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2)
+            tris = np.asarray(geo.terrain_tris[layer], dtype = np.int64).reshape(-1, 3)
+
+            points = verts[tris]
+
+            # Flat triangles can't contain anything, and would confuse the inside test
+            solid = _cross(points[:, 0], points[:, 1], points[:, 2]) != 0
+
+            tri_points.append(points[solid])
+            tri_layers.append(np.full(solid.sum(), rank))
+            tri_indices.append(np.flatnonzero(solid))
+
+        self.tri_points = np.concatenate(tri_points)
+        self.tri_layers = np.concatenate(tri_layers)
+        self.tri_indices = np.concatenate(tri_indices)
+
+        self._tri_starts, self._tri_items = _build_grid(self.tri_points.min(axis = 1), self.tri_points.max(axis = 1), cells)
+
+        # Every quad of every line group, along with the line it stands for
+        quad_points, quad_groups, quad_indices = [], [], []
+
+        for group_index, quads in enumerate(geo.line_data):
+
+            quads = np.asarray(quads, dtype = np.float64).reshape(-1, 4, 2)
+
+            quad_points.append(quads)
+            quad_groups.append(np.full(len(quads), group_index))
+            quad_indices.append(np.arange(len(quads)))
+
+        self.quad_points = np.concatenate(quad_points) if quad_points else np.empty((0, 4, 2))
+        self.quad_groups = np.concatenate(quad_groups) if quad_groups else np.empty(0, dtype = np.int64)
+        self.quad_indices = np.concatenate(quad_indices) if quad_indices else np.empty(0, dtype = np.int64)
+
+        # Same as line_from_quad
+        self.line_starts = (self.quad_points[:, 0] + self.quad_points[:, 1]) / 2
+        self.line_ends = (self.quad_points[:, 2] + self.quad_points[:, 3]) / 2
+
+        self._quad_starts, self._quad_items = _build_grid(self.quad_points.min(axis = 1), self.quad_points.max(axis = 1), cells)
+
+    @staticmethod
+    def signature(geo) -> list:
+
+        '''
+        Capture the state of the geometry containers: each container, along with its change key (see
+        tracking.change_key). Editing a layer / line group in place bumps its version, and clearing one
+        replaces the container, so comparing signatures tells if an index is out of date.
+        '''
+
+        signature = []
+
+        for layer in geo.render_order:
+
+            signature.append((geo.terrain_vertices[layer], change_key(geo.terrain_vertices[layer])))
+            signature.append((geo.terrain_tris[layer], change_key(geo.terrain_tris[layer])))
+
+        signature.append((geo.line_data, len(geo.line_data)))
+
+        for quads in geo.line_data:
+            signature.append((quads, change_key(quads)))
+
+        return signature
+
+    def is_current(self, geo) -> bool:
+
+        '''
+        Determine if the index still matches the geometry of a MapGeometry.
+        '''
+
+        signature = self.signature(geo)
+
+        if len(signature) != len(self._signature):
+            return False
+
+        # Compare by identity, as the containers themselves can be large
+        return all(a is b and key_a == key_b for (a, key_a), (b, key_b) in zip(signature, self._signature))
+
+    def _candidates(self, starts: np.ndarray, items: np.ndarray, cell_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+        # Get (query, item) pairs for every item filed under the cell of each query
+        counts = starts[cell_ids + 1] - starts[cell_ids]
+
+        owner = np.repeat(np.arange(len(cell_ids)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        return owner, items[starts[cell_ids][owner] + local]
+
+    def _box_candidates(self, starts: np.ndarray, items: np.ndarray, box: Tuple[float, float, float, float]) -> np.ndarray:
+
+        min_x, min_y, max_x, max_y = box
+
+        corners = np.array([[min_x, min_y], [max_x, max_y]], dtype = np.float64)
+        (low_column, low_row), (high_column, high_row) = np.clip(np.floor((corners - TILE_MIN) / (TILE_SIZE / self.cells)), 0, self.cells - 1).astype(np.int64)
+
+        rows, columns = np.mgrid[low_row: high_row + 1, low_column: high_column + 1]
+
+        _, candidates = self._candidates(starts, items, (rows * self.cells + columns).ravel())
+
+        return np.unique(candidates)
+
+    def layers_at(self, points: Sequence[Tuple[float, float]]) -> List[Optional[str]]:
+
+        '''
+        Find the topmost terrain layer (the last one in render order) under each of a list of X,Y points.
+        None means no layer covers the point, so only the base color (usually sea) is there.
+        '''
+
+        points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+
+        owner, candidates = self._candidates(self._tri_starts, self._tri_items, _cells_of(points, self.cells))
+
+        corners = self.tri_points[candidates]
+        point = points[owner]
+
+        # Inside (or on the edge) when the point is on the same side of all 3 edges
+        sides = np.stack([_cross(corners[:, 0], corners[:, 1], point), _cross(corners[:, 1], corners[:, 2], point), _cross(corners[:, 2], corners[:, 0], point)], axis = 1)
+        inside = (sides >= 0).all(axis = 1) | (sides <= 0).all(axis = 1)
+
+        topmost = np.full(len(points), -1)
+        np.maximum.at(topmost, owner[inside], self.tri_layers[candidates[inside]])
+
+        return [None if rank < 0 else self.render_order[rank] for rank in topmost.tolist()]
+
+    def layer_at(self, x: float, y: float) -> Optional[str]:
+
+        '''
+        Find the topmost terrain layer at an X,Y position, or None if there is only the base color.
+        '''
+
+        return self.layers_at([(x, y)])[0]
+
+    def triangles_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> Dict[str, np.ndarray]:
+
+        '''
+        Find the terrain triangles which overlap a box. Returns layer -> indices into terrain_tris[layer],
+        for the layers that have any.
+        '''
+
+        box = (min_x, min_y, max_x, max_y)
+
+        candidates = self._box_candidates(self._tri_starts, self._tri_items, box)
+        candidates = candidates[_polygons_overlap_box(self.tri_points[candidates], box)]
+
+        found = {}
+
+        for rank in np.unique(self.tri_layers[candidates]).tolist():
+
+            found[self.render_order[rank]] = np.sort(self.tri_indices[candidates[self.tri_layers[candidates] == rank]])
+
+        return found
+
+    def lines_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> List[Tuple[int, int]]:
+
+        '''
+        Find the line quads which overlap a box. Returns a sorted list of (line group, index into line_data[group]).
+        '''
+
+        box = (min_x, min_y, max_x, max_y)
+
+        candidates = self._box_candidates(self._quad_starts, self._quad_items, box)
+        candidates = candidates[_polygons_overlap_box(self.quad_points[candidates], box)]
+
+        return sorted(zip(self.quad_groups[candidates].tolist(), self.quad_indices[candidates].tolist()))
+
+    def nearest_line(self, x: float, y: float, max_distance: float = math.inf) -> Optional[Tuple[int, int, float]]:
+
+        '''
+        Find the line closest to an X,Y position, measured to the center line of each quad.
+        Returns (line group, index into line_data[group], distance), or None if there are no lines within max_distance.
+        '''
+
+        if len(self.quad_points) == 0:
+            return None
+
+        cell_size = TILE_SIZE / self.cells
+
+        inside_grid = TILE_MIN <= x < TILE_MIN + TILE_SIZE and TILE_MIN <= y < TILE_MIN + TILE_SIZE
+
+        if not inside_grid:
+            # The ring search relies on the point being inside its cell, so just check everything
+            candidates = np.arange(len(self.quad_points))
+        else:
+
+            column, row = int((x - TILE_MIN) // cell_size), int((y - TILE_MIN) // cell_size)
+
+            best = math.inf
+            candidates = np.empty(0, dtype = np.int64)
+
+            # Search outwards in square rings of cells. Once the best line found is closer than
+            # the next ring could possibly be, nothing further out can beat it.
+            for ring in range(self.cells):
+
+                # Everything within ring - 1 cells was searched, so anything left is at least this far away
+                searched_distance = (ring - 1) * cell_size
+
+                if best <= searched_distance or searched_distance > max_distance:
+                    break
+
+                low_column, high_column = max(column - ring, 0), min(column + ring, self.cells - 1)
+                low_row, high_row = max(row - ring, 0), min(row + ring, self.cells - 1)
+
+                box = (TILE_MIN + low_column * cell_size, TILE_MIN + low_row * cell_size, TILE_MIN + (high_column + 1) * cell_size - 1e-9, TILE_MIN + (high_row + 1) * cell_size - 1e-9)
+
+                candidates = self._box_candidates(self._quad_starts, self._quad_items, box)
+
+                if len(candidates) > 0:
+                    best = _segment_distances((x, y), self.line_starts[candidates], self.line_ends[candidates]).min()
+
+        if len(candidates) == 0:
+            return None
+
+        distances = _segment_distances((x, y), self.line_starts[candidates], self.line_ends[candidates])
+
+        nearest = int(np.argmin(distances))
+
+        if distances[nearest] > max_distance:
+            return None
+
+        quad = candidates[nearest]
+
+        return int(self.quad_groups[quad]), int(self.quad_indices[quad]), float(distances[nearest])
@@ -2,13 +2,23 @@
 
 import math
 import os
-from typing import List, Tuple
-
-from .utilitity import line_from_quad
-from .parsing import read_n_using_func, read_line_quads, read_single_mesh_chunk, pack_single_mesh, pack_quads
-from .path_utils import scale_path, offset_path
-from .letter_data import LETTERS
-from .tile_drawing import TileCanvas
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from .utilitity import line_paths, quads_from_lines
+from .parsing import read_n_using_func, read_line_quads, read_single_mesh_chunk, read_line_quads_vectorized, read_single_mesh_chunk_vectorized, mesh_chunk_parts, quad_chunk_parts, index_chunks
+from .tile_drawing import ArrayCanvas, TileCanvas
+from .lod import simplify_lines, simplify_mesh
+from .spatial import SpatialIndex
+from .optimize import mesh_headroom, optimize_mesh
+from .tracking import TrackedList, change_key, tracked_reader
+from .profiling import count, is_profiling, phase, profiled_reader
+from .glyphs import text_quads
+from .terrain_import import image_layer_masks, mask_to_mesh
+from .transforms import apply_affine, is_mirroring
+from .lazy import ChunkSource, LazyLayers, LazyLines, map_file
+from .columnar import VertexArray, TriangleArray, QuadArray, read_compact_mesh_chunk, read_compact_line_quads
 
 EARTH_LAYER_MEM_ORDER = ['Road', 'Grass', 'Sand', 'Pond', 'Snow', 'Rock', 'HardRock', 'Sea-3', 'Sea-2', 'Sea-1','Sea-0']
 EARTH_LAYER_RENDER_ORDER = ['Sea-0', 'Sea-1', 'Sea-2','Sea-3', 'Road', 'Grass', 'Sand', 'Pond', 'Snow', 'Rock', 'HardRock']
@@ -54,10 +64,13 @@ LINE_COLORS = [(90, 90, 90), (140, 140, 140)]
 
 class MapGeometry:
 
-    def __init__(self, moon = False):
+    def __init__(self, moon = False, compact = False):
 
         self.moon = moon
 
+        # Store layers in contiguous NumPy arrays (see columnar.py) rather than lists of tuples
+        self.compact = compact
+
         # Set the colors, as well as memory and render orders based on the map being rendered
         if self.moon:
             self.memory_order = MOON_LAYER_MEM_ORDER
@@ -72,19 +85,63 @@ class MapGeometry:
 
         self.terrain_vertices = {}
         self.terrain_tris = {}
-        self.line_data = [[], [], [], [], [], [], [], [], [], []]
+        self.line_data = [self._empty_quads() for _ in range(10)]
 
         # Load in some default values
 
         for key in self.memory_order:
-            self.terrain_vertices[key] = []
-            self.terrain_tris[key] = []
+            self.terrain_vertices[key] = self._empty_vertices()
+            self.terrain_tris[key] = self._empty_tris()
+
+        # Memory mapped file backing a lazily loaded object
+        self._source = None
+
+        # Contents of the file this was loaded from, along with where each chunk is in it, and
+        # the containers each chunk was decoded into. Chunks whose containers are still the
+        # same, unmodified objects are copied straight from the file when saving.
+        self._original_data = None
+        self._mesh_spans = []
+        self._quad_spans = []
+        self._original_meshes = {}
+        self._original_quads = {}
+
+        # Image size -> simplified layers, see build_lod
+        self.lod_meshes = {}
+
+        # Built on demand by spatial_index
+        self._spatial_index = None
+
+        # Line group index -> (quads, change key, points, offsets), see line_paths
+        self._line_paths = {}
     
+    def _empty_vertices(self):
+
+        return VertexArray() if self.compact else TrackedList()
+
+    def _empty_tris(self):
+
+        return TriangleArray() if self.compact else TrackedList()
+
+    def _empty_quads(self):
+
+        return QuadArray() if self.compact else TrackedList()
+
     @staticmethod
-    def from_file(path_to_bin_file: str, moon = False):
+    def from_file(path_to_bin_file: str, moon = False, vectorized = True, lazy = False, compact = False, optimize = False, weld_tolerance = 0.0):
 
         '''
         Create a MapGeometry object from a specified bin file
+
+        By default the chunks are parsed with the NumPy based readers, set vectorized = False
+        to use the original element by element struct parser instead. Both produce identical results.
+
+        Set lazy = True to memory map the file instead of reading it. Only the chunk length headers
+        are read up front, and each layer / line group is decoded the first time it is accessed.
+
+        Set compact = True to load the layers into contiguous NumPy arrays instead of lists of tuples.
+        This uses a fraction of the memory, and the arrays still behave like the usual lists.
+
+        Set optimize = True to run optimize_geometry(weld_tolerance) on the loaded layers.
         '''
 
         # Parse the file contents, and save them into a newly created MapGeometry object
@@ -92,17 +149,71 @@ class MapGeometry:
         if not os.path.exists(path_to_bin_file):
             raise FileNotFoundError('Bin file not found! Check the path specified.')
 
+        if lazy:
+            binary_data = map_file(path_to_bin_file)
+        else:
+            # Open, and read the binary file
+            with phase('parse/read_file'), open(path_to_bin_file, 'rb') as file_obj:
+                binary_data = file_obj.read()
+
+        return MapGeometry.from_bytes(binary_data, moon, vectorized, lazy, compact, optimize, weld_tolerance)
+
+    @staticmethod
+    def from_bytes(binary_data, moon = False, vectorized = True, lazy = False, compact = False, optimize = False, weld_tolerance = 0.0):
+
+        '''
+        Create a MapGeometry object from the contents of a bin file, held in any bytes-like object
+        (bytes, mmap, memoryview...). The options are the same as from_file.
+
+        With lazy = True the data is used in place rather than copied, so it has to stay readable
+        until the object is done with it (or load_all is called).
+        '''
+
         # Create empty map object
-        map_geo = MapGeometry(moon = moon)
+        map_geo = MapGeometry(moon = moon, compact = compact)
+
+        if compact:
+            mesh_reader, quad_reader = read_compact_mesh_chunk, read_compact_line_quads
+        elif vectorized:
+            mesh_reader, quad_reader = read_single_mesh_chunk_vectorized, read_line_quads_vectorized
+        else:
+            mesh_reader, quad_reader = read_single_mesh_chunk, read_line_quads
+
+        # Keep track of changes to everything that gets loaded
+        mesh_reader, quad_reader = tracked_reader(mesh_reader), tracked_reader(quad_reader)
+
+        # Time the decoding of every chunk, when profiling (see profiling.py)
+        mesh_reader, quad_reader = profiled_reader(mesh_reader, 'parse/mesh_chunk'), profiled_reader(quad_reader, 'parse/quad_chunk')
+
+        if lazy:
+
+            source = ChunkSource(binary_data, mesh_reader, quad_reader)
+
+            map_geo._source = source
+
+            map_geo.terrain_vertices = LazyLayers(source, map_geo.memory_order, 0)
+            map_geo.terrain_tris = LazyLayers(source, map_geo.memory_order, 1)
+            map_geo.line_data = LazyLines(source)
+
+            # The source fills these in as chunks get decoded
+            map_geo._original_data = source.data
+            map_geo._mesh_spans, map_geo._quad_spans = source.mesh_spans, source.quad_spans
+            map_geo._original_meshes, map_geo._original_quads = source._meshes, source._quads
+
+            trailing_bytes = source.trailing_bytes()
+
+            if len(trailing_bytes) > 0 and trailing_bytes != b'\x00\x00\x00\x00':
+                print(f'({len(trailing_bytes)}) Extra nonzero bytes detected! {trailing_bytes}')
+
+            if optimize:
+                map_geo.optimize_geometry(weld_tolerance)
 
-        # Open, and read the binary file
-        with open(path_to_bin_file, 'rb') as file_obj:
-            binary_data = file_obj.read()
+            return map_geo
 
         total_bytes = len(binary_data)
 
         # Read the 11 mesh chunks in.
-        all_mesh_data, mesh_chunks_size = read_n_using_func(binary_data, 0, 11, read_single_mesh_chunk)
+        all_mesh_data, mesh_chunks_size = read_n_using_func(binary_data, 0, 11, mesh_reader)
 
         # Loop over all the new mesh data, and add it into the map geo object
         for key, (coordinates, tris) in zip(map_geo.memory_order, all_mesh_data):
@@ -111,69 +222,340 @@ class MapGeometry:
             map_geo.terrain_tris[key] = tris
 
         # Read the 10 quad chunks in.
-        all_line_data, lines_chunk_size = read_n_using_func(binary_data, mesh_chunks_size, 10, read_line_quads)
+        all_line_data, lines_chunk_size = read_n_using_func(binary_data, mesh_chunks_size, 10, quad_reader)
 
         # Save the quad data into the map geo object
         map_geo.line_data = all_line_data
 
+        # Remember where everything came from
+        map_geo._original_data = binary_data
+        map_geo._mesh_spans, map_geo._quad_spans, _ = index_chunks(binary_data)
+        map_geo._original_meshes = dict(enumerate(all_mesh_data))
+        map_geo._original_quads = dict(enumerate(all_line_data))
+
         # There are sometimes 4 extra 0x00 bytes after this, but I cannot find anything which suggests their meaning. 
         # I want to detect that stuff here, in case I stumble upon a file which uses them. 
 
         if total_bytes - lines_chunk_size - mesh_chunks_size > 0 and binary_data[lines_chunk_size + mesh_chunks_size:] != b'\x00\x00\x00\x00':
-            print(f'({total_bytes - lines_chunk_size - mesh_chunks_size}) Extra nonzero bytes detected! {binary_data[lines_chunk_size + mesh_chunks_size:]}')
+            print(f'({total_bytes - lines_chunk_size - mesh_chunks_size}) Extra nonzero bytes detected! {bytes(binary_data[lines_chunk_size + mesh_chunks_size:])}')
+
+        if optimize:
+            map_geo.optimize_geometry(weld_tolerance)
         
         return map_geo
 
-    def render_to_image(self, size: int):
+    def load_all(self):
+
+        '''
+        Decode every layer and line group of a lazily loaded object, and release the memory mapped file.
+        Does nothing for objects which were loaded normally.
+        '''
+
+        if self._source is None:
+            return
+
+        self.terrain_vertices = {key: self.terrain_vertices[key] for key in self.terrain_vertices}
+        self.terrain_tris = {key: self.terrain_tris[key] for key in self.terrain_tris}
+        self.line_data = list(self.line_data)
+
+        # Keep a copy of the file contents, so unmodified chunks can still be saved as is
+        self._original_data = bytes(self._source.data)
+
+        self._source.close()
+        self._source = None
+
+    def close(self):
+
+        '''
+        Release the memory mapped file behind a lazily loaded object, i.e.:
+
+        with MapGeometry.from_file('arid.bin', lazy = True) as geo:
+            image = geo.render_to_image(1000)
+
+        Otherwise the file stays mapped (and locked, on Windows) until the object is garbage collected.
+        Layers and line groups which were already read stay usable, but ones which weren't can no longer
+        be read, so call load_all instead to keep the whole tile. Does nothing for objects which were
+        loaded normally, or already closed.
+        '''
+
+        if self._source is None or self._source.closed:
+            return
+
+        self._source.close()
+
+        # Unmodified chunks can't be copied from the file when saving any more
+        self._original_data = None
+
+    def _detach_source(self):
+
+        # Copy the file behind a lazily loaded object into memory, so whatever it was mapped from can be closed
+        if self._source is None or self._source.closed:
+            return
+
+        self._source.detach()
+
+        self._original_data = self._source.data
+
+    def __enter__(self) -> 'MapGeometry':
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def render_to_image(self, size: int, backend: str = 'pil', cache = None, lod: bool = False):
 
         '''
         Render the MapGeometry object to a PIL image. 
         Use the size field to indicate the size of the resulting image. 
+
+        backend selects how the terrain triangles are filled:
+            'pil': draw each triangle with ImageDraw.polygon
+            'numpy': transform and rasterize each whole layer in one vectorized pass. This follows the same
+                     fill rules, and matches 'pil' except for rare single pixels at the tips of sliver triangles.
+
+        Pass a RenderCache (see render_cache.py) as cache to reuse the image from an earlier render of
+        identical geometry, instead of drawing it again.
+
+        Each line group is drawn in one batch, from its centre lines joined up into paths (see line_paths),
+        so the dashes of the dashed groups run on along each path rather than restarting at every quad.
+
+        Set lod = True for small renders (thumbnails, whole island overviews), to only draw the detail
+        that is visible at this size: the meshes are clustered per pixel (see lod.py), and runs of tiny
+        line quads are merged. Shapes can move by up to half a pixel. Use build_lod to precompute the
+        simplified meshes for sizes that get rendered often.
         '''
 
+        if cache is not None:
+            return cache.render(self, size, backend = backend, lod = lod)
+
+        if backend not in ('pil', 'numpy'):
+            raise ValueError(f'Unknown render backend: {backend}')
+
         # Create a canvas with some attached helper functions that make this code way cleaner
         tc = TileCanvas(size, self.base_color)
 
+        self._draw(tc, size, backend, lod)
+
+        return tc.tile_img
+
+    def render_to_array(self, size: int, out: np.ndarray = None, line_mask: bool = False, lod: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+        '''
+        Render the MapGeometry object straight into NumPy arrays, without going through a PIL image, i.e.:
+
+        pixels, layers, lines = geo.render_to_array(1000, line_mask = True)
+
+        Returns:
+            pixels: a (size, size, 3) uint8 RGB image, drawn into out if it is given (it has to have that shape and type)
+            layers: a (size, size) uint8 raster of the topmost terrain layer under each pixel, as an index into
+                    render_order, or ArrayCanvas.NO_LAYER where there is none. Lines don't affect it.
+            lines:  a (size, size) bool mask of the pixels covered by lines, if line_mask = True (otherwise None)
+
+        Everything is drawn like render_to_image(size, backend = 'numpy', lod = lod) draws it, so the pixels
+        match that image except for rare single pixels at the tips of sliver triangles.
+        '''
+
+        canvas = ArrayCanvas(size, self.base_color, line_mask = line_mask)
+
+        self._draw(canvas, size, 'numpy', lod)
+
+        return canvas.finish(out), canvas.layers, canvas.line_mask
+
+    def _draw(self, tc, size: int, backend: str, lod: bool):
+
+        # Draw the terrain and lines onto a canvas (TileCanvas or ArrayCanvas)
+        if lod:
+            with phase('render/simplify'):
+                simplified = self.simplified_layers(size)
+
         # Loop over all the geometry layers, in the order they should be rendered
-        for layer_key in self.render_order:
+        for layer_index, layer_key in enumerate(self.render_order):
 
             # Determine the color of this layer
             color = self.layer_colors[layer_key]
 
-            # Loop over each triangle in the mesh
-            for triangle in self.terrain_tris[layer_key]:
+            tc.begin_layer(layer_index)
+
+            # Only build the counter name when someone is listening
+            if is_profiling():
+                count(f'render/triangles/{layer_key}', len(self.terrain_tris[layer_key]))
+
+            with phase('render/fill'):
+
+                if lod:
+
+                    verts, tris, dots = simplified[layer_key]
+
+                    if backend == 'numpy':
+                        tc.triangles(verts, tris, color)
+                    else:
+                        for lookup_coords in verts[tris].tolist():
+                            tc.triangle(lookup_coords, color)
+
+                    # Triangles smaller than a pixel
+                    tc.points(dots, color)
+
+                elif backend == 'numpy':
+
+                    # Draw the whole layer at once, from arrays of its vertices and triangles
+                    verts = np.asarray(self.terrain_vertices[layer_key], dtype = np.float64).reshape(-1, 2)
+                    tris = np.asarray(self.terrain_tris[layer_key], dtype = np.int64).reshape(-1, 3)
+
+                    tc.triangles(verts, tris, color)
 
-                # Lookup the 2d coordinates of the triangle in the terrain vertices table
-                lookup_coords = [self.terrain_vertices[layer_key][index] for index in triangle]
+                else:
 
-                # Draw the triangle with the specified color
-                tc.triangle(lookup_coords, color)
+                    # Loop over each triangle in the mesh
+                    for triangle in self.terrain_tris[layer_key]:
+
+                        # Lookup the 2d coordinates of the triangle in the terrain vertices table
+                        lookup_coords = [self.terrain_vertices[layer_key][index] for index in triangle]
+
+                        # Draw the triangle with the specified color
+                        tc.triangle(lookup_coords, color)
 
         alternate = False # Using this to alternate solid and dashed lines (no idea if this is how they actually render them.)
 
         # Loop over each line group
-        for segments in self.line_data:
+        for group_index, segments in enumerate(self.line_data):
+
+            if is_profiling():
+                count(f'render/quads/{group_index}', len(segments))
 
-            # Loop over every quad in the line group
-            for quad in segments:
+            with phase('render/lines/dashed' if alternate else 'render/lines/solid'):
 
-                # Covert the quad element into a line
-                quad_line = line_from_quad(quad)
+                if lod:
+                    # Merge the quads that are too small to see into longer lines, each drawn on its own
+                    starts, ends = simplify_lines(size, segments)
+                    points = np.stack([starts, ends], axis = 1).reshape(-1, 2)
+                    offsets = np.arange(0, len(points) + 1, 2)
+                else:
+                    # Covert the quads into lines, joined up into paths
+                    points, offsets = self.line_paths(group_index)
 
-                # Draw the resulting line
-                tc.draw_line(*quad_line, color = LINE_COLORS[alternate], dashed = alternate)
+                # Draw the whole line group at once
+                tc.lines(points, offsets, color = LINE_COLORS[alternate], dashed = alternate)
             
             alternate = not alternate # Flip alternate between each layer
-        
-        return tc.tile_img
+
+    def line_paths(self, group_index: int) -> Tuple[np.ndarray, np.ndarray]:
+
+        '''
+        Get the centre lines of a line group, joined up into paths (see line_paths in utilitity.py).
+
+        Only the dashed (odd) groups have their collinear joints merged, so the dashes run on along each
+        path. The solid groups keep the exact line of every quad, so they draw just like the quads do.
+
+        The result is kept until the line group is replaced or modified (see tracking.change_key), so
+        repeated renders of the same tile don't work it out again. A plain list assigned to a line group
+        by hand can't report in place edits, so call clear_line_paths after editing one of those.
+        '''
+
+        quads = self.line_data[group_index]
+
+        cached = self._line_paths.get(group_index)
+
+        if cached is None or cached[0] is not quads or cached[1] != change_key(quads):
+
+            if group_index % 2 == 1:
+                paths = line_paths(quads)
+            else:
+                paths = line_paths(quads, join_tolerance = 0, angle_tolerance = None)
+
+            cached = (quads, change_key(quads), *paths)
+            self._line_paths[group_index] = cached
+
+        return cached[2], cached[3]
+
+    def clear_line_paths(self):
+
+        '''
+        Drop the paths kept by line_paths.
+        '''
+
+        self._line_paths = {}
+
+    def build_lod(self, sizes: List[int]):
+
+        '''
+        Precompute the simplified meshes used by render_to_image(size, lod = True) for some image sizes, i.e.:
+
+        geo.build_lod([60, 256])
+
+        Renders at other sizes start from the closest precomputed size above them. The simplified meshes
+        are dropped by add_geometry / clear_geometry, if the layers are edited any other way call this again.
+        '''
+
+        self.lod_meshes = {}
+
+        for size in sizes:
+
+            self.lod_meshes[size] = {
+                layer: simplify_mesh(size, self.terrain_vertices[layer], self.terrain_tris[layer]) for layer in self.render_order
+            }
+
+    def simplified_layers(self, size: int) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+
+        '''
+        Get the (vertices, triangles, dots) of every layer, simplified for rendering at a given size.
+        '''
+
+        if size in self.lod_meshes:
+            return self.lod_meshes[size]
+
+        finer = [lod_size for lod_size in self.lod_meshes if lod_size > size]
+
+        if len(finer) == 0:
+            return {layer: simplify_mesh(size, self.terrain_vertices[layer], self.terrain_tris[layer]) for layer in self.render_order}
+
+        # Simplifying an already simplified mesh is a lot cheaper than starting from scratch
+        output = {}
+
+        for layer, (verts, tris, dots) in self.lod_meshes[min(finer)].items():
+
+            verts, tris, new_dots = simplify_mesh(size, verts, tris)
+
+            output[layer] = verts, tris, np.concatenate([dots, new_dots])
+
+        return output
     
+    def spatial_index(self, cells: int = 32) -> SpatialIndex:
+
+        '''
+        Get a spatial index over the geometry, for fast point and region queries, i.e.:
+
+        geo.spatial_index().layer_at(120, -40)
+
+        The tile is split into a cells x cells grid. The index is built the first time this is called,
+        and rebuilt whenever the geometry changed since, including edits made in place to a layer or
+        line group (see tracking.change_key). A plain list assigned to a layer by hand can't report
+        in place edits, so call clear_spatial_index after editing one of those.
+        '''
+
+        index = self._spatial_index
+
+        if index is None or index.cells != cells or not index.is_current(self):
+            self._spatial_index = SpatialIndex(self, cells)
+
+        return self._spatial_index
+
+    def clear_spatial_index(self):
+
+        '''
+        Drop the index kept by spatial_index, so the next call builds it again.
+        '''
+
+        self._spatial_index = None
+
     def clear_all_lines(self):
 
         '''
         Clear all the lines in the map geometry object
         '''
 
-        self.line_data = [[], [], [], [], [], [], [], [], [], []]
+        self.line_data = [self._empty_quads() for _ in range(10)]
     
     def clear_geometry(self, layer: str):
 
@@ -185,8 +567,10 @@ class MapGeometry:
         Clears all the snow off that map tile
         '''
 
-        self.terrain_vertices[layer] = []
-        self.terrain_tris[layer] = []
+        self.terrain_vertices[layer] = self._empty_vertices()
+        self.terrain_tris[layer] = self._empty_tris()
+
+        self.lod_meshes = {}
     
     def clear_all_geometry(self):
 
@@ -197,30 +581,202 @@ class MapGeometry:
         for layer in self.memory_order:
             self.clear_geometry(layer)
 
-    def save_as(self, filepath: str):
+    def _mesh_is_clean(self, key: str) -> bool:
+
+        # Determine if a mesh layer still matches the chunk it was loaded from
+        if self._original_data is None or key not in self.memory_order:
+            return False
+
+        index = self.memory_order.index(key)
+
+        for part, layers in enumerate((self.terrain_vertices, self.terrain_tris)):
+
+            if key not in layers:
+                return False
+
+            # Lazily loaded layers which were never touched can't have changed
+            if isinstance(layers, LazyLayers) and not layers.is_loaded(key):
+                continue
+
+            original = self._original_meshes.get(index)
+
+            if original is None or layers[key] is not original[part] or getattr(layers[key], 'dirty', True):
+                return False
+
+        return True
+
+    def _quads_are_clean(self, index: int) -> bool:
+
+        # Determine if a line group still matches the chunk it was loaded from
+        if self._original_data is None or index >= len(self._quad_spans):
+            return False
+
+        if isinstance(self.line_data, LazyLines):
+
+            if self.line_data._chunk_indices[index] != index:
+                return False
+
+            if not self.line_data.is_loaded(index):
+                return True
+
+        quads = self.line_data[index]
+
+        return quads is self._original_quads.get(index) and not getattr(quads, 'dirty', True)
+
+    def modified_layers(self) -> List[str]:
+
+        '''
+        Get the mesh layers which were changed since the MapGeometry was loaded (all of them for new objects).
+        '''
+
+        return [key for key in self.memory_order if not self._mesh_is_clean(key)]
+
+    def modified_line_groups(self) -> List[int]:
+
+        '''
+        Get the indices of the line groups which were changed since the MapGeometry was loaded (all of them for new objects).
+        '''
+
+        return [index for index in range(len(self.line_data)) if not self._quads_are_clean(index)]
+
+    def iter_chunks(self, optimize = False, weld_tolerance = 0.0) -> Iterator[bytes]:
+
+        '''
+        Pack the MapGeometry one chunk part at a time, in file order.
+        Joining everything this yields gives the contents of a .bin file.
+
+        Layers and line groups which weren't modified since loading are copied straight from the
+        original file, so they round trip byte for byte (including the altitude values of the quads).
+        Only the modified ones are packed again.
+
+        With optimize = True, each layer is packed as optimize_geometry(weld_tolerance) would leave it,
+        without changing the object itself.
+        '''
+
+        # Pack all the mesh data
+        for index, key in enumerate(self.memory_order):
+
+            if not optimize and self._mesh_is_clean(key):
+
+                start, end = self._mesh_spans[index]
+                yield self._original_data[start: end]
+
+                count('save/chunks_copied')
+
+                continue
+
+            verts, tris = self.terrain_vertices[key], self.terrain_tris[key]
+
+            if optimize:
+                verts, tris, _ = optimize_mesh(verts, tris, weld_tolerance)
+
+            yield from mesh_chunk_parts(verts, tris)
+
+            count('save/chunks_packed')
+
+        # Pack all the quad data
+        for index in range(len(self.line_data)):
+
+            if self._quads_are_clean(index):
+
+                start, end = self._quad_spans[index]
+                yield self._original_data[start: end]
+
+                count('save/chunks_copied')
+
+                continue
+
+            yield from quad_chunk_parts(self.line_data[index])
+
+            count('save/chunks_packed')
+
+        # Keep whatever followed the chunks in the original file (usually 4 zero bytes)
+        if self._original_data is not None and len(self._quad_spans) > 0:
+            yield self._original_data[self._quad_spans[-1][1]:]
+
+    def to_bytes(self, optimize = False, weld_tolerance = 0.0) -> bytes:
+
+        '''
+        Pack the MapGeometry into the contents of a .bin file
+        '''
+
+        with phase('save/pack'):
+            return b''.join(self.iter_chunks(optimize, weld_tolerance))
+
+    def save_as(self, filepath: Union[str, os.PathLike, BinaryIO], optimize = False, weld_tolerance = 0.0):
         
         '''
         Save the current version of the MapGeometry back to a .bin file
+
+        Instead of a path, any writable binary file-like object can be given (an open file, a
+        BytesIO, a zipfile entry, a socket file...), in which case the chunks are streamed into it.
+        The file-like object is not closed afterwards.
+
+        Set optimize = True to weld, and strip unused data from the layers as they are written
+        (see optimize_geometry). The MapGeometry itself is left as is.
         '''
 
-        if not filepath.endswith('.bin'):
-            raise ValueError('Please specify a filepath that ends in .bin')
-        
-        output_bytes = b''
+        if hasattr(filepath, 'write'):
 
-        # Pack all the mesh data
-        for key in self.memory_order:
+            with phase('save/stream'):
+                for part in self.iter_chunks(optimize, weld_tolerance):
+                    filepath.write(part)
 
-            output_bytes += pack_single_mesh(self.terrain_vertices[key], self.terrain_tris[key])
+                    count('bytes_written', len(part))
 
-        # Pack all the quad data        
-        for line_quads in self.line_data:
+            return
 
-            output_bytes += pack_quads(line_quads)
+        if not os.fspath(filepath).endswith('.bin'):
+            raise ValueError('Please specify a filepath that ends in .bin')
         
+        # Pack everything before opening the file, so that a lazily loaded object can be saved over its own source file
+        output_bytes = self.to_bytes(optimize, weld_tolerance)
+
         # Save into file
-        with open(filepath, 'wb') as output_file:
+        with phase('save/write_file'), open(filepath, 'wb') as output_file:
             output_file.write(output_bytes)
+
+        count('bytes_written', len(output_bytes))
+
+    def optimize_geometry(self, tolerance: float = 0.0, layers: List[str] = None) -> Dict[str, dict]:
+
+        '''
+        Compact the geometry layers, which fill up quickly when editing with add_geometry, i.e.:
+
+        report = geo.optimize_geometry(tolerance = 0.01)
+
+        Vertices closer together than the tolerance are welded (by default, only exact duplicates),
+        then triangles left with no area, and vertices no triangle uses are removed (see optimize.py).
+
+        Returns layer -> report of what was removed, and the vertex / index headroom left in that layer
+        under the 65535 limit of the file format.
+        '''
+
+        reports = {}
+
+        for layer in (self.memory_order if layers is None else layers):
+
+            with phase('edit/optimize_mesh'):
+                verts, tris, reports[layer] = optimize_mesh(self.terrain_vertices[layer], self.terrain_tris[layer], tolerance)
+
+            if self.compact:
+                self.terrain_vertices[layer] = VertexArray.from_array(verts)
+                self.terrain_tris[layer] = TriangleArray.from_array(tris)
+            else:
+                self.terrain_vertices[layer] = TrackedList(tuple(vert) for vert in verts.tolist())
+                self.terrain_tris[layer] = TrackedList(tuple(tri) for tri in tris.tolist())
+
+        self.lod_meshes = {}
+
+        return reports
+
+    def geometry_headroom(self) -> Dict[str, Dict[str, int]]:
+
+        '''
+        Get how many more vertices, and triangle indices each layer can hold before it no longer fits in a .bin file.
+        '''
+
+        return {layer: mesh_headroom(len(self.terrain_vertices[layer]), len(self.terrain_tris[layer])) for layer in self.memory_order}
     
     def add_line(self, layer_index: int, from_coord: Tuple[float, float], to_coord: Tuple[float, float], thickness: float = 4):
         
@@ -250,6 +806,87 @@ class MapGeometry:
         # Add the new quad to the desired layer
         self.line_data[layer_index].append((c1, c2, c3, c4))
     
+    def transform(self, matrix: np.ndarray, layers: List[str] = None, line_groups: List[int] = None, flip_winding: bool = None):
+
+        '''
+        Apply a 2D affine transform (a 3x3 matrix, see transforms.py) to the geometry, i.e.:
+
+        geo.transform(mirror_x())                                  # Mirror the whole tile
+        geo.transform(translation(0, 5), layers = [], line_groups = [2])   # Nudge a line group up
+
+        layers and line_groups select what to transform, by default everything.
+
+        Each layer and line group is transformed in a single NumPy operation. For mirroring transforms the
+        winding of the triangles is flipped to match, set flip_winding to force flipping on or off.
+        '''
+
+        with phase('edit/transform'):
+
+            matrix = np.asarray(matrix, dtype = np.float64)
+            mirroring = is_mirroring(matrix)
+
+            if flip_winding is None:
+                flip_winding = mirroring
+
+            for layer in (self.memory_order if layers is None else layers):
+
+                verts = apply_affine(np.asarray(self.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2), matrix)
+                tris = np.asarray(self.terrain_tris[layer], dtype = np.int64).reshape(-1, 3)
+
+                if flip_winding:
+                    tris = tris[:, ::-1]
+
+                if self.compact:
+                    self.terrain_vertices[layer] = VertexArray.from_array(verts)
+                    self.terrain_tris[layer] = TriangleArray.from_array(tris)
+                else:
+                    self.terrain_vertices[layer] = TrackedList(tuple(vert) for vert in verts.tolist())
+                    self.terrain_tris[layer] = TrackedList(tuple(tri) for tri in tris.tolist())
+
+            for index in (range(len(self.line_data)) if line_groups is None else line_groups):
+
+                # Transforming the corners keeps the mitred joins between neighbouring quads lined up
+                quads = apply_affine(np.asarray(self.line_data[index], dtype = np.float64).reshape(-1, 4, 2), matrix)
+
+                # A mirrored quad has its sides swapped, so swap the corners at each end back into CCW order.
+                # Its line (see line_from_quad) keeps running in the same direction, so dashes stay in step.
+                if mirroring:
+                    quads = quads[:, [1, 0, 3, 2]]
+
+                self.line_data[index] = self._empty_quads()
+                self._append_quads(index, quads)
+
+            # Any simplified meshes are out of date now
+            self.lod_meshes = {}
+
+    def add_lines(self, layer_index: int, from_coords, to_coords, thickness: float = 4):
+
+        '''
+        Add many lines to a line layer at once, i.e.:
+
+        geo.add_lines(2, [(0, 0), (10, 0)], [(10, 0), (10, 10)])
+
+        from_coords and to_coords are matching lists (or (N, 2) arrays) of line start and end points.
+        Gives the same quads as calling add_line for each pair, but builds them all in one vectorized pass.
+        '''
+
+        self._append_quads(layer_index, quads_from_lines(from_coords, to_coords, thickness))
+
+    def _append_quads(self, layer_index: int, quads: np.ndarray):
+
+        # Add an (N, 4, 2) array of quads to a line layer, in whichever form the layer is stored
+        if len(quads) == 0:
+            return
+
+        count('edit/quads_added', len(quads))
+
+        with phase('edit/append_quads'):
+
+            if self.compact:
+                self.line_data[layer_index].extend(quads)
+            else:
+                self.line_data[layer_index].extend(tuple(tuple(corner) for corner in quad) for quad in quads.tolist())
+
     def add_path(self, layer_index: int, path: List[Tuple[Tuple[float, float]]]):
 
         '''
@@ -260,9 +897,9 @@ class MapGeometry:
         Add the sequence of lines onto the tile
         '''
 
-        for from_coord, to_coord in path:
+        segments = np.asarray(path, dtype = np.float64).reshape(-1, 2, 2)
 
-            self.add_line(layer_index, from_coord, to_coord)
+        self.add_lines(layer_index, segments[:, 0], segments[:, 1])
     
     def add_text(self, layer: int, text: str, location_x: float, location_y: float, size: float):
 
@@ -271,72 +908,100 @@ class MapGeometry:
 
         Some special characters are allowed, like spaces and '\n' but other than that, stuck to regular
         letters, or add the character you want to letter_data.py
+
+        The quads of each character are cached per size (see glyphs.py), so placing text only
+        moves them into position, and adds them all to the layer at once.
         '''
 
-        text = text.upper() # Covert to uppercase, for simplicity
+        with phase('edit/text_layout'):
+            quads = text_quads(text, location_x, location_y, size)
 
-        start_x = location_x # Keep a reference to where the text should start, for new lines
+        self._append_quads(layer, quads)
+    
+    def add_bolded_text(self, layer, text, location_x, location_y, size, thickness = 5):
 
-        # Loop over each character individually
-        for character in text:
+        '''
+        Add some thicker text to the tile.
+        '''
 
-            # If space, just advance location, and continue
-            if character == ' ':
-                location_x += size
-                continue
-            
-            # If newline, return x to original position, advance y position, and continue
-            if character == '\n':
-                location_x = start_x
-                location_y -= size * 1.3
-                continue
-            
-            if character not in LETTERS:
-                raise ValueError(f'Non-letter character specified: {character}')
+        # Lazy way to make bolded text, but surprisingly effective!
+        # Lay the text out once, then stack copies of it each shifted by 1 more unit
+        with phase('edit/text_layout'):
+            quads = text_quads(text, location_x, location_y, size)
 
-            # Lookup letter path in table            
-            letter_path = LETTERS[character].copy()
+        shifts = np.arange(thickness, dtype = np.float64)
 
-            # Scale letter to desired size, and move it to the correct position
-            letter_path = offset_path(scale_path(letter_path, size), location_x, location_y)
+        self._append_quads(layer, (quads[None, :] + shifts[:, None, None, None]).reshape(-1, 4, 2))
+    
+    def add_mask(self, layer: str, mask: np.ndarray, tolerance: float = 0.5):
 
-            # Add the letter path to the tile
-            self.add_path(layer, letter_path)
+        '''
+        Fill the area of a 2D boolean mask into a layer. The mask covers the whole tile, with row 0 at the top
+        (like an image), and can be any size.
 
-            # Advance X position for next character
-            location_x += size
-    
-    def add_bolded_text(self, layer, text, location_x, location_y, size, thickness = 5):
+        The outlines are simplified by up to tolerance pixels of the mask, more if needed to fit in the room
+        left in the layer (see terrain_import.py).
+        '''
+
+        self._add_mask(layer, mask, tolerance)
+
+    def _add_mask(self, layer: str, mask: np.ndarray, tolerance: float):
+
+        # Shared by add_mask and import_image, which are both 1 call above this. Any warning about the
+        # mask being downscaled points past them, to the code that called them.
+        headroom = mesh_headroom(len(self.terrain_vertices[layer]), len(self.terrain_tris[layer]))
+
+        verts, tris = mask_to_mesh(mask, tolerance, headroom['vertex_headroom'], headroom['index_headroom'], stacklevel = 4)
+
+        self.add_geometry(layer, [tuple(vert) for vert in verts.tolist()], [tuple(tri) for tri in tris.tolist()])
+
+    def import_image(self, image, tolerance: float = 0.5) -> List[str]:
 
         '''
-        Add some thicker text to the tile.
+        Add terrain from an image of a tile, drawn with the layer colors (layer_colors), i.e.:
+
+        geo.import_image(Image.open('island_sketch.png'))
+
+        Each pixel matching the color of a layer exactly is added to that layer, with add_mask.
+        Returns the layers that were added to.
         '''
 
-        # Lazy way to make bolded text, but surprisingly effective!
+        masks = image_layer_masks(image, self.layer_colors, self.memory_order)
 
-        for i in range(thickness):
+        for layer, mask in masks.items():
+            self._add_mask(layer, mask, tolerance)
+
+        return list(masks)
 
-            self.add_text(layer, text, location_x + i, location_y + i, size)
-    
     def add_geometry(self, layer: str, verts: List[Tuple[float, float]], tris: List[Tuple[int, int, int]]):
         '''
         Adds some geometry to a layer, specifying the verts, and tris. 
         Ducky will automatically adjust triangles indices to add to existing geometry
         '''
 
-        # Determine where there are free indices that we can add our indices to
-        current_geometry_max_index = len(self.terrain_vertices[layer])
+        with phase('edit/add_geometry'):
+
+            # Any simplified meshes are out of date now
+            self.lod_meshes = {}
+
+            # Determine where there are free indices that we can add our indices to
+            current_geometry_max_index = len(self.terrain_vertices[layer])
+
+            # tris can be any iterable, so count what was added afterwards rather than taking its length
+            triangles_before = len(self.terrain_tris[layer])
+
+            # Add the terrain vertices        
+            self.terrain_vertices[layer] += verts
 
-        # Add the terrain vertices        
-        self.terrain_vertices[layer] += verts
+            # Loop over all given triangles
+            for tri in tris:
 
-        # Loop over all given triangles
-        for tri in tris:
+                # offset the triangle to align with the new positions of the vertices in the current mesh
 
-            # offset the triangle to align with the new positions of the vertices in the current mesh
+                self.terrain_tris[layer].append((
+                    tri[0] + current_geometry_max_index, 
+                    tri[1] + current_geometry_max_index, 
+                    tri[2] + current_geometry_max_index
+                ))
 
-            self.terrain_tris[layer].append((
-                tri[0] + current_geometry_max_index, 
-                tri[1] + current_geometry_max_index, 
-                tri[2] + current_geometry_max_index
-            ))
\ No newline at end of file
+        count('edit/triangles_added', len(self.terrain_tris[layer]) - triangles_before)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import math
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .optimize import UINT16_LIMIT
+from .sw_ducky import MapGeometry
+from .tileset import tile_filename
+
+# Characters every font in letter_data.py has
+LABEL_CHARACTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+def _grid_mesh(rng: np.random.Generator, triangle_count: int) -> Tuple[np.ndarray, np.ndarray]:
+
+    # A jittered grid of quads (2 triangles each), over a random rectangle of the tile
+    if triangle_count == 0:
+        return np.empty((0, 2)), np.empty((0, 3), dtype = np.int64)
+
+    cells = math.ceil(math.sqrt(triangle_count / 2))
+
+    left, bottom = rng.uniform(-500, 0, 2)
+    width, height = rng.uniform(100, 500, 2)
+
+    columns, rows = np.meshgrid(np.arange(cells + 1), np.arange(cells + 1))
+
+    # Moving each vertex less than half a cell keeps the triangles from folding over
+    offsets = rng.uniform(-0.4, 0.4, (cells + 1, cells + 1, 2))
+    offsets[[0, -1], :] = 0
+    offsets[:, [0, -1]] = 0
+
+    verts = np.stack([
+        left + (columns + offsets[:, :, 0]) * width / cells,
+        bottom + (rows + offsets[:, :, 1]) * height / cells,
+    ], axis = 2).reshape(-1, 2)
+
+    # Corners of every cell, then 2 CCW triangles per cell
+    corner = (np.arange(cells)[None, :] + (cells + 1) * np.arange(cells)[:, None]).reshape(-1)
+
+    tris = np.concatenate([
+        np.stack([corner, corner + 1, corner + cells + 2], axis = 1),
+        np.stack([corner, corner + cells + 2, corner + cells + 1], axis = 1),
+    ], axis = 1).reshape(-1, 3)
+
+    return verts, tris[:triangle_count]
+
+def _random_walks(rng: np.random.Generator, segment_count: int, segments_per_walk: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+
+    # Wandering roads, made of segments which join end to start
+    walk_count = math.ceil(segment_count / segments_per_walk)
+
+    turns = np.cumsum(rng.normal(0, 0.3, (walk_count, segments_per_walk)), axis = 1) + rng.uniform(0, 2 * math.pi, (walk_count, 1))
+    lengths = rng.uniform(5, 20, (walk_count, segments_per_walk))
+
+    steps = np.stack([np.cos(turns), np.sin(turns)], axis = 2) * lengths[:, :, None]
+
+    points = np.concatenate([rng.uniform(-450, 450, (walk_count, 1, 2)), steps], axis = 1).cumsum(axis = 1)
+    points = np.clip(points, -500, 500)
+
+    starts = points[:, :-1].reshape(-1, 2)[:segment_count]
+    ends = points[:, 1:].reshape(-1, 2)[:segment_count]
+
+    return starts, ends
+
+def synthetic_tile(
+    seed: int = 0,
+    triangles_per_layer: int = 2000,
+    quads_per_group: int = 500,
+    text_labels: int = 0,
+    moon: bool = False,
+    compact: bool = False
+) -> MapGeometry:
+
+    '''
+    Generate a random tile, for benchmarking and testing, i.e.:
+
+    geo = synthetic_tile(seed = 1, triangles_per_layer = 5000, text_labels = 20)
+
+    Every layer gets a jittered grid mesh of triangles_per_layer triangles, every line group
+    quads_per_group quads of wandering lines, and text_labels words of text are spread over the line
+    groups. The same arguments always give the same tile.
+    '''
+
+    if 3 * triangles_per_layer > UINT16_LIMIT:
+        raise ValueError(f'At most {UINT16_LIMIT // 3} triangles per layer fit in the file format')
+
+    if 4 * quads_per_group > UINT16_LIMIT:
+        raise ValueError(f'At most {UINT16_LIMIT // 4} quads per line group fit in the file format')
+
+    rng = np.random.default_rng(seed)
+
+    geo = MapGeometry(moon = moon, compact = compact)
+
+    for layer in geo.memory_order:
+
+        verts, tris = _grid_mesh(rng, triangles_per_layer)
+
+        geo.add_geometry(layer, [tuple(vert) for vert in verts.tolist()], [tuple(tri) for tri in tris.tolist()])
+
+    for group in range(len(geo.line_data)):
+
+        if quads_per_group > 0:
+            geo.add_lines(group, *_random_walks(rng, quads_per_group))
+
+    for _ in range(text_labels):
+
+        word = ''.join(rng.choice(list(LABEL_CHARACTERS), int(rng.integers(3, 10))))
+
+        geo.add_text(int(rng.integers(len(geo.line_data))), word, *rng.uniform(-450, 400, 2).tolist(), float(rng.uniform(10, 40)))
+
+    return geo
+
+def write_synthetic_island(directory: str, island: str = 'synthetic_island', width: int = 4, height: int = 4, seed: int = 0, **kwargs) -> Dict[Tuple[int, int], str]:
+
+    '''
+    Save a width x height grid of synthetic tiles into a directory, named like real tiles so TileSet
+    can load them. Any extra keyword arguments are passed through to synthetic_tile.
+
+    Returns a dict of (x, y) -> path to the tile
+    '''
+
+    os.makedirs(directory, exist_ok = True)
+
+    paths = {}
+
+    for y in range(height):
+        for x in range(width):
+
+            path = os.path.join(directory, tile_filename(island, x, y))
+
+            # Give every tile its own, repeatable, contents
+            synthetic_tile(seed = seed * width * height + y * width + x, **kwargs).save_as(path)
+
+            paths[(x, y)] = path
+
+    return paths
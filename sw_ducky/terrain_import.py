@@ -0,0 +1,370 @@
+import warnings
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .optimize import UINT16_LIMIT
+from .triangulate import loop_areas, triangles_area, triangulate_loops
+
+# Directions of the pixel edges, counting CCW from east
+DIRECTIONS = np.array([(1, 0), (0, 1), (-1, 0), (0, -1)])
+
+# Where outlines touch diagonally, each side gets its corner cut by this many pixels, so no loops share a point
+SADDLE_OFFSET = 0.01
+
+# How many tolerances (doubling each time) to try at each resolution, before halving the resolution of a mask
+SIMPLIFY_STEPS = 3
+
+def trace_mask(mask: np.ndarray) -> Tuple[np.ndarray, List[Tuple[int, int]], np.ndarray]:
+
+    '''
+    Trace the outlines of the filled pixels of a 2D boolean mask (row 0 at the top).
+
+    Returns (points, loops, keep): the corner points of every outline one after the other, in pixel units
+    with y counting up from the bottom of the mask, the (start, end) range of each outline in points, and
+    which points have to survive simplification. Outlines run CCW and holes CW, so the filled pixels are
+    always on the left. Pixels which only touch diagonally are kept apart, with their shared corner cut.
+    '''
+
+    # Flip so that rows count upwards like tile coordinates, and pad so every region has an outline
+    filled = np.pad(np.asarray(mask, dtype = bool)[::-1], 1)
+
+    height, width = filled.shape[0] - 2, filled.shape[1] - 2
+    inside = filled[1:-1, 1:-1]
+
+    rows, columns = np.meshgrid(np.arange(height), np.arange(width), indexing = 'ij')
+
+    # Boundary edges of every pixel with an empty neighbour, as (start x, start y, direction)
+    edges = []
+
+    for direction, empty_neighbour, start in (
+        (0, ~filled[:-2, 1:-1], (0, 0)), # Bottom side, heading east
+        (1, ~filled[1:-1, 2:], (1, 0)),  # Right side, heading north
+        (2, ~filled[2:, 1:-1], (1, 1)),  # Top side, heading west
+        (3, ~filled[1:-1, :-2], (0, 1)), # Left side, heading south
+    ):
+        found = inside & empty_neighbour
+        edges.append(np.stack([columns[found] + start[0], rows[found] + start[1], np.full(found.sum(), direction)], axis = 1))
+
+    edges = np.concatenate(edges)
+
+    if len(edges) == 0:
+        return np.empty((0, 2)), [], np.empty(0, dtype = bool)
+
+    corner_count = (width + 1) * (height + 1)
+
+    starts = edges[:, 1] * (width + 1) + edges[:, 0]
+    ends = starts + DIRECTIONS[edges[:, 2], 1] * (width + 1) + DIRECTIONS[edges[:, 2], 0]
+
+    # Look up the edges leaving each corner, by direction
+    leaving = np.full((corner_count, 4), -1, dtype = np.int64)
+    leaving[starts, edges[:, 2]] = np.arange(len(edges))
+
+    # Corners where 2 outlines meet diagonally have 2 edges leaving. Always turning left there keeps the
+    # diagonal pixels in separate outlines, elsewhere there's only one edge to take.
+    following = np.full(len(edges), -1, dtype = np.int64)
+
+    for turn in (3, 0, 1):
+
+        candidate = leaving[ends, (edges[:, 2] + turn) % 4]
+        following = np.where(candidate >= 0, candidate, following)
+
+    saddle = (leaving[starts] >= 0).sum(axis = 1) == 2
+
+    # Follow the edges around each outline
+    following_list = following.tolist()
+    visited = np.zeros(len(edges), dtype = bool)
+
+    order = []
+    loop_edges = []
+
+    for first in range(len(edges)):
+
+        if visited[first]:
+            continue
+
+        start = len(order)
+        edge = first
+
+        while not visited[edge]:
+
+            visited[edge] = True
+            order.append(edge)
+
+            edge = following_list[edge]
+
+        loop_edges.append((start, len(order)))
+
+    order = np.array(order)
+    directions = edges[order, 2]
+
+    loop_starts = np.array([start for start, _ in loop_edges])
+    loop_lengths = np.array([end - start for start, end in loop_edges])
+
+    # The edge before each one in its loop
+    previous = np.arange(-1, len(order) - 1)
+    previous[loop_starts] = loop_starts + loop_lengths - 1
+
+    incoming = directions[previous]
+
+    # Only the corners where the outline turns are needed
+    turns = directions != incoming
+
+    corner_edges = order[turns]
+    corners = edges[corner_edges, :2].astype(np.float64)
+
+    # Cut the corners shared with another outline a little, towards the pixel being turned around
+    cut = saddle[corner_edges]
+
+    arriving = DIRECTIONS[incoming[turns][cut]]
+    corners[cut] += SADDLE_OFFSET * (np.stack([-arriving[:, 1], arriving[:, 0]], axis = 1) - arriving)
+
+    # Every loop turns at least 4 times, so none of them disappear
+    corner_counts = np.add.reduceat(turns, loop_starts)
+    ends = np.cumsum(corner_counts)
+
+    return corners, list(zip((ends - corner_counts).tolist(), ends.tolist())), cut
+
+def simplify_loops(points: np.ndarray, loops: List[Tuple[int, int]], keep: np.ndarray, tolerance: float) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+
+    '''
+    Simplify closed loops with Douglas-Peucker, so every dropped point is within tolerance of the new outline.
+    Points marked in keep are never dropped. Loops left with less than 3 points are removed.
+
+    Every loop is split at its first point, the point farthest from that, and the points marked in keep.
+    The runs in between are then all simplified together: each round splits every run at its farthest
+    point from the line across it, until all the points are within tolerance.
+    '''
+
+    if tolerance <= 0 or len(loops) == 0:
+        return points, loops
+
+    starts = np.array([start for start, _ in loops], dtype = np.int64)
+    lengths = np.array([end - start for start, end in loops], dtype = np.int64)
+
+    # Lay the loops out closed, with each one's first point repeated after its last
+    closed_starts = starts + np.arange(len(loops))
+    closed_index = np.insert(np.arange(len(points)), starts[1:].tolist() + [len(points)], starts)
+
+    closed = points[closed_index]
+    kept = np.append(keep, True)[np.insert(np.arange(len(points)), starts[1:].tolist() + [len(points)], len(points))]
+
+    loop_ids = np.repeat(np.arange(len(loops)), lengths + 1)
+    offsets = closed - closed[closed_starts][loop_ids]
+
+    # The farthest point from the start of each loop
+    distances = np.hypot(offsets[:, 0], offsets[:, 1])
+    farthest = np.maximum.reduceat(distances, closed_starts)
+    kept |= distances == farthest[loop_ids]
+    kept[closed_starts] = True
+
+    # Rectangles (and anything smaller) are left as they are
+    kept |= (lengths <= 4)[loop_ids]
+
+    positions = np.arange(len(closed))
+
+    while True:
+
+        # The kept points either side of every point
+        before = np.maximum.accumulate(np.where(kept, positions, 0))
+        after = np.minimum.accumulate(np.where(kept, positions, len(closed))[::-1])[::-1]
+
+        segment = closed[after] - closed[before]
+        offset = closed - closed[before]
+
+        length = np.hypot(segment[:, 0], segment[:, 1])
+        across = np.abs(segment[:, 0] * offset[:, 1] - segment[:, 1] * offset[:, 0])
+
+        distances = np.where(length > 0, across / np.where(length > 0, length, 1), np.hypot(offset[:, 0], offset[:, 1]))
+        distances[kept] = 0
+
+        # Split each run at its farthest point, if it's out of tolerance
+        run_starts = np.flatnonzero(kept)
+        farthest = np.maximum.reduceat(distances, run_starts)[np.searchsorted(run_starts, before)]
+
+        split = (distances == farthest) & (distances > tolerance)
+
+        if not split.any():
+            break
+
+        # Only the first of any equally far points
+        candidates = np.flatnonzero(split)
+        first = np.ones(len(candidates), dtype = bool)
+        first[1:] = before[candidates[1:]] != before[candidates[:-1]]
+
+        kept[candidates[first]] = True
+
+    # Open the loops back up
+    kept = np.delete(kept, closed_starts + lengths)
+
+    return _drop_points(points, loops, kept)
+
+def _drop_points(points: np.ndarray, loops: List[Tuple[int, int]], keep: np.ndarray) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+
+    # Remove points from loops, and then the loops with less than 3 points left
+    starts = np.array([start for start, _ in loops], dtype = np.int64)
+
+    counts = np.add.reduceat(keep, starts) if len(starts) > 0 else np.empty(0, dtype = np.int64)
+
+    loop_ids = np.repeat(np.arange(len(loops)), np.diff(np.append(starts, len(points))))
+    keep = keep & (counts[loop_ids] >= 3)
+
+    counts = counts[counts >= 3]
+    ends = np.cumsum(counts)
+
+    return points[keep], list(zip((ends - counts).tolist(), ends.tolist()))
+
+def _fit_outlines(points: np.ndarray, loops: List[Tuple[int, int]], max_vertices: int, max_indices: int) -> Optional[np.ndarray]:
+
+    # Triangulate some outlines, if they fit under the limits and the result is sound
+    areas = loop_areas(points, loops)
+
+    # Each loop adds its points to the triangle count, minus 2 per outline and plus 2 per hole
+    triangle_count = len(points) - 2 * (areas > 0).sum() + 2 * (areas < 0).sum()
+
+    if len(points) > max_vertices or 3 * triangle_count > max_indices:
+        return None
+
+    # Simplifying can (rarely) fold outlines over each other, which either breaks the sweep or leaves
+    # triangles covering the wrong area
+    try:
+        tris = triangulate_loops(points, loops)
+    except (IndexError, KeyError, ValueError):
+        return None
+
+    if not np.isclose(triangles_area(points, tris), areas.sum(), rtol = 1e-6, atol = 1e-6):
+        return None
+
+    return tris
+
+def downscale_mask(mask: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+
+    '''
+    Resize a 2D boolean mask to size (width, height), keeping the filled area.
+
+    Each new pixel covers some fraction of the old ones. Instead of filling the ones over half covered
+    (which turns fine detail like a checkerboard or noise into solid ground, or nothing), the most covered
+    pixels are filled until they add up to the same area as before, ties going to the first in row order.
+    '''
+
+    coverage = np.asarray(Image.fromarray(mask.astype(np.float32)).resize(size, Image.BOX), dtype = np.float64)
+
+    filled = min(coverage.size, int(round(coverage.sum())))
+    order = np.argsort(-coverage, axis = None, kind = 'stable')
+
+    scaled = np.zeros(coverage.size, dtype = bool)
+    scaled[order[:filled]] = True
+
+    return scaled.reshape(coverage.shape)
+
+def mask_to_mesh(
+    mask: np.ndarray,
+    tolerance: float = 0.5,
+    max_vertices: int = UINT16_LIMIT,
+    max_indices: int = UINT16_LIMIT,
+    stacklevel: int = 2
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    Turn a 2D boolean mask covering a whole tile (row 0 at the top, like an image) into a triangle mesh.
+
+    The outlines of the filled pixels are traced, simplified so they stay within tolerance pixels of the
+    pixel edges, and triangulated with their holes (see triangulate.py).
+
+    If the mesh would have more than max_vertices vertices, or max_indices triangle indices (by default
+    the limits of the file format), the tolerance is doubled up to 2 times, and after that the mask is
+    halved in resolution until it fits (see downscale_mask), with a warning giving the scale used.
+    stacklevel is passed on to warnings.warn, so functions wrapping this one can point it at their caller.
+
+    Returns (vertices, triangles), an (N, 2) array of tile coordinates and an (M, 3) array of CCW triangles.
+    '''
+
+    mask = np.asarray(mask, dtype = bool)
+
+    if mask.ndim != 2:
+        raise ValueError(f'Expected a 2D mask, got shape {mask.shape}')
+
+    scaled = mask
+    scale = 1
+    tris = None
+
+    while True:
+
+        height, width = scaled.shape
+
+        traced, traced_loops, keep = trace_mask(scaled)
+
+        # However far they get simplified, loops keep at least 3 points (or all of them, if they have 4 or less)
+        lengths = np.array([end - start for start, end in traced_loops], dtype = np.int64)
+
+        if np.where(lengths > 4, 3, lengths).sum() <= max_vertices:
+
+            # Try simplifying further, and then the exact pixel outlines, which never cross
+            for attempt in ([tolerance * 2 ** step for step in range(SIMPLIFY_STEPS)] if tolerance > 0 else []) + [0]:
+
+                points, loops = simplify_loops(traced, traced_loops, keep, attempt)
+                tris = _fit_outlines(points, loops, max_vertices, max_indices)
+
+                if tris is not None:
+                    break
+
+            if tris is not None:
+                break
+
+        if max(height, width) == 1:
+            raise ValueError(f'The mask can not be fit in {max_vertices} vertices, and {max_indices} triangle indices')
+
+        # Try again with half the detail
+        scale *= 2
+
+        size = (max(1, round(mask.shape[1] / scale)), max(1, round(mask.shape[0] / scale)))
+        scaled = downscale_mask(mask, size)
+
+    if scale > 1:
+        warnings.warn(
+            f'The {mask.shape[1]}x{mask.shape[0]} mask did not fit in {max_vertices} vertices and {max_indices} '
+            f'triangle indices, so it was imported at 1/{scale} resolution ({width}x{height})',
+            stacklevel = stacklevel
+        )
+
+    # Pixel units to tile coordinates
+    verts = np.empty_like(points)
+    verts[:, 0] = points[:, 0] * 1000 / width - 500
+    verts[:, 1] = points[:, 1] * 1000 / height - 500
+
+    return verts, tris
+
+def image_layer_masks(image: Union[Image.Image, np.ndarray], layer_colors: Dict[str, Tuple[int, int, int]], memory_order: List[str]) -> Dict[str, np.ndarray]:
+
+    '''
+    Split a palette image of a tile (like one from render_to_image, without lines) into a mask per layer,
+    by matching each pixel to the colors of the layers exactly. Pixels of any other color belong to no layer.
+
+    Layers which share a color (like Pond and Sea-3) are matched to the first of them in memory order.
+    '''
+
+    pixels = np.asarray(image.convert('RGB') if isinstance(image, Image.Image) else image)[:, :, :3]
+
+    # Pack every pixel into a single integer, to compare whole colors at once
+    packed = (pixels[:, :, 0].astype(np.int64) << 16) | (pixels[:, :, 1].astype(np.int64) << 8) | pixels[:, :, 2]
+
+    masks = {}
+    claimed = set()
+
+    for layer in memory_order:
+
+        red, green, blue = layer_colors[layer]
+        color = (red << 16) | (green << 8) | blue
+
+        if color in claimed:
+            continue
+
+        claimed.add(color)
+
+        mask = packed == color
+
+        if mask.any():
+            masks[layer] = mask
+
+    return masks
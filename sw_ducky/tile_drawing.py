@@ -1,7 +1,28 @@
 from PIL import Image, ImageDraw
 from PIL.Image import Image as PILImage
 from PIL.ImageDraw import ImageDraw as PILImageDraw
-from typing import Tuple, List
+from typing import List, Optional, Tuple
+
+import math
+
+import numpy as np
+
+from .profiling import phase
+
+# The vectorized rasterizer costs roughly the same per pixel of a batch's bounding box, as Pillow does
+# per triangle divided by this. Sparser batches (a handful of huge triangles) are cheaper to draw with Pillow.
+PIXELS_PER_TRIANGLE = 256
+
+# The same for line outlines, which are thin enough that the rasterizer only pays for the box around them
+PIXELS_PER_LINE = 1024
+
+# Masks covering fewer than 1 in this many pixels of their box are painted pixel by pixel, rather than run by run
+SPARSE_FILL_RATIO = 8
+
+# Styling of the map lines, in pixels
+LINE_WIDTH = 2
+DASH_LENGTH = 4
+DASH_GAP = 4
 
 def draw_dashed_line(
     draw: PILImageDraw,
@@ -68,6 +89,337 @@ def convert_coords(size: int, coords: List[Tuple[float, float]]) -> List[Tuple[f
     return [convert_coord(size, c) for c in coords]
 
 
+def convert_coords_array(size: int, coords: np.ndarray) -> np.ndarray:
+    '''
+    Vectorized version of convert_coords, for an (N, 2) array of coordinates.
+    '''
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    converted = np.empty_like(coords)
+    converted[:, 0] = size * ((coords[:, 0] + 500) / 1000)
+    converted[:, 1] = size - (size * ((coords[:, 1] + 500) / 1000))
+
+    return converted
+
+
+def _round_up(values: np.ndarray) -> np.ndarray:
+    '''
+    Pillow's ROUND_UP macro, rounds halves away from zero.
+    '''
+    return np.where(values >= 0, np.floor(values + 0.5), -np.floor(np.abs(values) + 0.5))
+
+
+def _round_down(values: np.ndarray) -> np.ndarray:
+    '''
+    Pillow's ROUND_DOWN macro, rounds halves towards zero.
+    '''
+    return np.where(values >= 0, np.ceil(values - 0.5), -np.ceil(np.abs(values) - 0.5))
+
+
+def triangle_mask(size: int, points: np.ndarray, tris: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+    '''
+    Rasterize a batch of triangles at once. Returns a boolean mask of the covered pixels, cropped to the
+    bounding box of the triangles, along with the (x, y) position of the top left corner of that box.
+
+    points is an (N, 2) array of image space coordinates, and tris an (M, 3) array of indices into it.
+    This follows the scanline rules of Pillow's polygon fill (truncated vertices, inclusive rows,
+    spans rounded the same way, and the gap filling at sharp corners), so the result matches
+    drawing each triangle with ImageDraw.polygon. The only known differences are single pixels at
+    the tips of some very thin sliver triangles, well under 0.01% of the pixels of a real tile.
+    '''
+    return polygon_mask(size, points, np.asarray(tris, dtype=np.int64).reshape(-1, 3))
+
+
+def polygon_mask(size: int, points: np.ndarray, polygons: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+    '''
+    Same as triangle_mask, for a batch of convex polygons with the same number of corners each.
+    polygons is an (M, K) array of indices into points, going around each polygon in order.
+    '''
+    # Pillow truncates the vertices to integers before filling
+    polygons = np.asarray(polygons, dtype=np.int64)
+    corner_count = polygons.shape[1]
+
+    corner_points = np.trunc(np.asarray(points, dtype=np.float64))[polygons]
+
+    xs = corner_points[:, :, 0]
+    ys = corner_points[:, :, 1]
+
+    # Every polygon covers the rows between its lowest and highest vertex, inclusive
+    row_min = np.maximum(ys.min(axis=1), 0).astype(np.int64)
+    row_max = np.minimum(ys.max(axis=1), size - 1).astype(np.int64)
+
+    visible = row_min <= row_max
+    xs, ys, row_min, row_max = xs[visible], ys[visible], row_min[visible], row_max[visible]
+
+    # Expand into one entry per (polygon, row) pair
+    heights = row_max - row_min + 1
+    owner = np.repeat(np.arange(len(heights)), heights)
+    rows = row_min[owner] + np.arange(heights.sum()) - np.repeat(np.cumsum(heights) - heights, heights)
+
+    row_values = rows.astype(np.float32)
+    span_left = np.full(len(rows), np.inf, dtype=np.float32)
+    span_right = np.full(len(rows), -np.inf, dtype=np.float32)
+
+    # Intersect every row with the edges of its polygon
+    for a in range(corner_count):
+
+        b = (a + 1) % corner_count
+
+        # Work out each edge once per polygon, in the same single precision math as Pillow
+        xa, ya = xs[:, a].astype(np.float32), ys[:, a].astype(np.float32)
+        xb, yb = xs[:, b].astype(np.float32), ys[:, b].astype(np.float32)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (xb - xa) / (yb - ya)
+
+        horizontal = ya == yb
+
+        # Horizontal edges cover their whole length
+        edge_left = np.minimum(xa, xb)
+        edge_right = np.maximum(xa, xb)
+
+        # Then spread it out over the rows
+        row_y = row_values - ya[owner]
+        on_edge = (row_values >= np.minimum(ya, yb)[owner]) & (row_values <= np.maximum(ya, yb)[owner])
+
+        with np.errstate(invalid='ignore'):
+            crossing = row_y * slope[owner] + xa[owner]
+
+        flat = horizontal[owner]
+
+        left = np.where(flat, edge_left[owner], crossing)
+        right = np.where(flat, edge_right[owner], crossing)
+
+        span_left = np.where(on_edge, np.minimum(span_left, left), span_left)
+        span_right = np.where(on_edge, np.maximum(span_right, right), span_right)
+
+    span_rows = [rows]
+    span_starts = [_round_up(span_left)]
+    span_ends = [_round_down(span_right)]
+
+    # At the top and bottom tips of a polygon leaning to one side, Pillow fills the
+    # gap between the tip and where the span of the next row starts
+    for tip in range(corner_count):
+
+        # The corners on either side of the tip
+        tip_x, tip_y = xs[:, tip], ys[:, tip]
+        other_a, other_b = (tip + 1) % corner_count, (tip - 1) % corner_count
+
+        top = (ys[:, other_a] > tip_y) & (ys[:, other_b] > tip_y)
+        bottom = (ys[:, other_a] < tip_y) & (ys[:, other_b] < tip_y)
+
+        step = np.where(top, 1.0, -1.0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            next_a = tip_x + step * (xs[:, other_a] - tip_x) / (ys[:, other_a] - tip_y)
+            next_b = tip_x + step * (xs[:, other_b] - tip_x) / (ys[:, other_b] - tip_y)
+
+        leaning_right = (next_a > tip_x) & (next_b > tip_x)
+        leaning_left = (next_a < tip_x) & (next_b < tip_x)
+
+        selected = (top | bottom) & (leaning_right | leaning_left) & (tip_y >= 0) & (tip_y <= size - 1)
+
+        start = np.where(leaning_right, tip_x, np.minimum(tip_x, _round_down(np.maximum(next_a, next_b)) + 1))
+        end = np.where(leaning_right, np.maximum(tip_x, _round_up(np.minimum(next_a, next_b)) - 1), tip_x)
+
+        span_rows.append(tip_y[selected].astype(np.int64))
+        span_starts.append(start[selected])
+        span_ends.append(end[selected])
+
+    rows = np.concatenate(span_rows)
+    starts = np.maximum(np.concatenate(span_starts), 0)
+    ends = np.minimum(np.concatenate(span_ends), size - 1)
+
+    filled = starts <= ends
+    rows, starts, ends = rows[filled], starts[filled].astype(np.int64), ends[filled].astype(np.int64)
+
+    if len(rows) == 0:
+        return np.zeros((0, 0), dtype=bool), (0, 0)
+
+    # Only work inside the bounding box of the spans
+    top, left = rows.min(), starts.min()
+    height, width = rows.max() - top + 1, ends.max() - left + 2
+
+    rows, starts, ends = rows - top, starts - left, ends - left
+
+    # Sort the spans, and merge the ones that overlap or touch, so every row is a set of disjoint runs
+    start_keys = rows * width + starts
+    order = np.argsort(start_keys)
+
+    start_keys = start_keys[order]
+    run_ends = np.maximum.accumulate((rows * width + ends)[order])
+
+    new_run = np.ones(len(start_keys), dtype=bool)
+    new_run[1:] = start_keys[1:] > run_ends[:-1] + 1
+
+    last_in_run = np.ones(len(start_keys), dtype=bool)
+    last_in_run[:-1] = new_run[1:]
+
+    run_starts = start_keys[new_run]
+    run_stops = run_ends[last_in_run] + 1
+
+    covered = int((run_stops - run_starts).sum())
+
+    if covered * SPARSE_FILL_RATIO < height * width:
+
+        # Few pixels spread over a big box (like thin lines): set just those pixels
+        lengths = run_stops - run_starts
+        pixels = np.repeat(run_starts - np.cumsum(lengths) + lengths, lengths) + np.arange(covered)
+
+        # Runs never reach the spare column at the end of each row, so leave it out
+        mask = np.zeros((height, width - 1), dtype=bool)
+        mask.reshape(-1)[pixels - pixels // width] = True
+
+        return mask, (int(left), int(top))
+
+    # Paint all the runs at once, by marking where each one starts and stops, and summing along each row
+    changes = np.zeros(height * width, dtype=np.int8)
+    changes[run_starts] = 1
+    changes[run_stops] = -1
+
+    # Runs never cross the end of a row, so the sum can run over the flat array
+    mask = np.cumsum(changes, dtype=np.int8).view(bool).reshape(height, width)[:, :width - 1]
+
+    return mask, (int(left), int(top))
+
+
+def wide_line_polygons(starts: np.ndarray, ends: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Get the outlines Pillow fills when drawing a batch of lines with ImageDraw.line(..., width=width).
+    starts and ends are (N, 2) arrays of image space coordinates.
+
+    Returns an (M, 4, 2) array of the corners of each line with any length, and an (K, 2) array of
+    the pixels of the lines that start and end on the same pixel, which Pillow draws as a single point.
+    '''
+    # Pillow truncates the end points to integers first
+    starts = np.trunc(np.asarray(starts, dtype=np.float64).reshape(-1, 2))
+    ends = np.trunc(np.asarray(ends, dtype=np.float64).reshape(-1, 2))
+
+    deltas = ends - starts
+    single = (deltas == 0).all(axis=1)
+
+    single_points = starts[single]
+    starts, ends, deltas = starts[~single], ends[~single], deltas[~single]
+
+    # Offset to either side of the line, rounded the same way as Pillow
+    lengths = np.hypot(deltas[:, 0], deltas[:, 1])[:, None]
+    half_width = np.float64((width - 1) / 2)
+
+    inner = _round_down(deltas[:, ::-1] * (_round_down(half_width) / lengths))
+    outer = _round_down(deltas[:, ::-1] * (_round_up(half_width) / lengths))
+
+    # inner and outer hold the (y, x) offsets, Pillow's dxmin, dymin / dxmax, dymax
+    left = np.stack([-inner[:, 0], outer[:, 1]], axis=1)
+    right = np.stack([outer[:, 0], -inner[:, 1]], axis=1)
+
+    corners = np.stack([starts + left, ends + left, ends + right, starts + right], axis=1)
+
+    return corners, single_points
+
+
+def dash_segments(points: np.ndarray, offsets: np.ndarray, dash_length: float, gap: float) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Cut paths up into dashes, all at once. points and offsets describe the paths the same way as
+    line_paths (in utilitity.py) does, in image space.
+
+    The dash pattern runs on along each path, starting over at the start of every path, and a path
+    no longer than one dash is a single dash. Returns (starts, ends) of every dash.
+    '''
+    segment_starts, segment_ends, path_distance = _path_segments(points, offsets)
+
+    if len(segment_starts) == 0:
+        return segment_starts, segment_ends
+
+    lengths = np.hypot(*(segment_ends - segment_starts).T)
+
+    period = dash_length + gap
+
+    # The range of distances along the path each segment covers, and the dashes overlapping it
+    near = path_distance
+    far = path_distance + lengths
+
+    first_dash = np.floor(near / period)
+    last_dash = np.floor(far / period)
+
+    # A segment starting inside a gap doesn't get the dash before it
+    first_dash += near - first_dash * period >= dash_length
+
+    counts = np.maximum(last_dash - first_dash + 1, 0).astype(np.int64)
+
+    owner = np.repeat(np.arange(len(counts)), counts)
+    dash = first_dash[owner] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    dash_near = np.maximum(dash * period, near[owner])
+    dash_far = np.minimum(dash * period + dash_length, far[owner])
+
+    # Drop the empty dashes at the very end of a segment, unless the segment itself is empty
+    kept = (dash_far > dash_near) | (lengths[owner] == 0)
+    owner, dash_near, dash_far = owner[kept], dash_near[kept], dash_far[kept]
+
+    # Points along the segments, as fractions of their length
+    with np.errstate(divide='ignore', invalid='ignore'):
+        start_fraction = np.where(lengths[owner] > 0, (dash_near - near[owner]) / lengths[owner], 0)[:, None]
+        end_fraction = np.where(lengths[owner] > 0, (dash_far - near[owner]) / lengths[owner], 0)[:, None]
+
+    directions = (segment_ends - segment_starts)[owner]
+
+    return segment_starts[owner] + directions * start_fraction, segment_starts[owner] + directions * end_fraction
+
+
+def _path_segments(points: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Split paths into their segments, along with how far along its path each segment starts
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    if len(points) < 2:
+        return np.empty((0, 2)), np.empty((0, 2)), np.empty(0)
+
+    # A segment joins every point to the next one, except across the end of a path
+    inside = np.ones(len(points) - 1, dtype=bool)
+    inside[offsets[1:-1] - 1] = False
+
+    lengths = np.hypot(*(points[1:] - points[:-1]).T)
+
+    # Distance from the start of the path, restarting at each new path
+    distance = np.concatenate([[0.0], np.cumsum(lengths)])
+    path_start = np.repeat(distance[offsets[:-1]], np.diff(offsets))
+
+    return points[:-1][inside], points[1:][inside], (distance[:-1] - path_start[:-1])[inside]
+
+
+def line_outlines(size: int, points: np.ndarray, offsets: np.ndarray, dashed: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Get the outlines to fill to draw a batch of paths at size x size pixels, in the map line style
+    (see wide_line_polygons). points and offsets describe the paths in tile coordinates, like
+    line_paths (in utilitity.py) returns them.
+
+    Returns an (M, 4, 2) array of outline corners, and a (K, 2) int array of single pixels on the image.
+    '''
+    if len(points) == 0:
+        return np.empty((0, 4, 2)), np.empty((0, 2), dtype=np.int64)
+
+    with phase('render/convert_coords'):
+        pixels = convert_coords_array(size, np.asarray(points, dtype=np.float64).reshape(-1, 2))
+
+    if dashed:
+        starts, ends = dash_segments(pixels, offsets, DASH_LENGTH, DASH_GAP)
+    else:
+        starts, ends, _ = _path_segments(pixels, offsets)
+
+    # Paths made of a single point still get drawn as a dot
+    lone = np.diff(offsets) == 1
+
+    if lone.any():
+        lone_points = pixels[np.asarray(offsets[:-1])[lone]]
+        starts, ends = np.concatenate([starts, lone_points]), np.concatenate([ends, lone_points])
+
+    corners, single_points = wide_line_polygons(starts, ends, LINE_WIDTH)
+
+    single_points = single_points[((single_points >= 0) & (single_points < size)).all(axis=1)].astype(np.int64)
+
+    return corners, single_points
+
+
 class TileCanvas:
     '''
     A simple canvas that allows drawing triangles and lines onto a tile image.
@@ -78,12 +430,89 @@ class TileCanvas:
         self.tile_draw: PILImageDraw = ImageDraw.Draw(self.tile_img)
         self.size: int = size
 
+    def begin_layer(self, index: int) -> None:
+        '''
+        Mark the start of a terrain layer (by its position in the render order). Only ArrayCanvas keeps track of layers.
+        '''
+
     def triangle(self, coords: List[Tuple[float, float]], color: Tuple[int, int, int]) -> None:
         '''
         Draw a filled triangle on the canvas.
         '''
         self.tile_draw.polygon(convert_coords(self.size, coords), fill=color)
 
+    def triangles(self, coords: np.ndarray, tris: np.ndarray, color: Tuple[int, int, int]) -> None:
+        '''
+        Draw a batch of filled triangles on the canvas.
+        coords is an (N, 2) array of tile coordinates, and tris an (M, 3) array of indices into it.
+
+        All the coordinates are converted to image space in one go. Dense batches are then rasterized in a
+        single vectorized pass, while sparse ones are cheaper to hand to Pillow one triangle at a time.
+        '''
+        tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3)
+
+        if len(tris) == 0:
+            return
+
+        with phase('render/convert_coords'):
+            points = convert_coords_array(self.size, coords)
+
+        self._fill(points, tris, color)
+
+    def _fill(self, points: np.ndarray, polygons: np.ndarray, color: Tuple[int, int, int], pixels_per_polygon: int = PIXELS_PER_TRIANGLE) -> None:
+        # Fill convex polygons given in image space, picking whichever of Pillow or the rasterizer is cheaper
+        if len(polygons) == 0:
+            return
+
+        # Estimate the area the batch covers on the canvas
+        corner_min = np.clip(points.min(axis=0), 0, self.size)
+        corner_max = np.clip(points.max(axis=0), 0, self.size)
+        area = np.prod(corner_max - corner_min + 1)
+
+        if len(polygons) * pixels_per_polygon < area:
+
+            with phase('render/polygons'):
+                for polygon in points[polygons].tolist():
+                    self.tile_draw.polygon([tuple(point) for point in polygon], fill=color)
+
+            return
+
+        with phase('render/rasterize'):
+            mask, (left, top) = polygon_mask(self.size, points, polygons)
+
+        if mask.size == 0:
+            return
+
+        box = (left, top, left + mask.shape[1], top + mask.shape[0])
+
+        # A 1 bit mask pastes several times faster than an 8 bit one (which Pillow blends with)
+        self.tile_img.paste(color, box, mask=Image.fromarray(mask))
+
+    def points(self, coords: np.ndarray, color: Tuple[int, int, int]) -> None:
+        '''
+        Fill the pixels under an (N, 2) array of tile coordinates.
+        '''
+        pixels = np.trunc(convert_coords_array(self.size, coords)).astype(np.int64)
+        pixels = pixels[((pixels >= 0) & (pixels < self.size)).all(axis=1)]
+
+        if len(pixels) > 0:
+            self.tile_draw.point([tuple(pixel) for pixel in pixels.tolist()], fill=color)
+
+    def lines(self, points: np.ndarray, offsets: np.ndarray, color: Tuple[int, int, int], dashed: bool = False) -> None:
+        '''
+        Draw a batch of paths on the canvas, optionally dashed, in the same style as draw_line.
+        points and offsets describe the paths in tile coordinates, like line_paths (in utilitity.py) returns them.
+
+        Every segment (or dash) is turned into the outline Pillow would fill for it, and all of them are
+        then filled in one go, rather than drawing each segment with its own call.
+        '''
+        corners, single_points = line_outlines(self.size, points, offsets, dashed)
+
+        self._fill(corners.reshape(-1, 2), np.arange(4 * len(corners)).reshape(-1, 4), color, PIXELS_PER_LINE)
+
+        if len(single_points) > 0:
+            self.tile_draw.point([tuple(pixel) for pixel in single_points.tolist()], fill=color)
+
     def draw_line(
         self,
         cord_1: Tuple[float, float],
@@ -97,19 +526,158 @@ class TileCanvas:
         converted_cord_1 = convert_coord(self.size, cord_1)
         converted_cord_2 = convert_coord(self.size, cord_2)
 
-        if dashed:
+        # A line no longer than one dash is drawn as a single dash anyway
+        length = math.hypot(converted_cord_2[0] - converted_cord_1[0], converted_cord_2[1] - converted_cord_1[1])
+
+        if dashed and length > DASH_LENGTH:
             draw_dashed_line(
                 self.tile_draw,
                 converted_cord_1,
                 converted_cord_2,
                 fill=color,
-                width=2,
-                dash_length=4,
-                gap=4
+                width=LINE_WIDTH,
+                dash_length=DASH_LENGTH,
+                gap=DASH_GAP
             )
         else:
             self.tile_draw.line(
                 [converted_cord_1, converted_cord_2],
                 fill=color,
-                width=2
+                width=LINE_WIDTH
             )
+
+
+class ArrayCanvas:
+    '''
+    A canvas with the same drawing methods as TileCanvas, which draws into NumPy arrays rather than
+    a PIL image. Everything is filled with the vectorized rasterizer.
+
+    Drawing only records an index into a palette of the colors used for each pixel, and the RGB image
+    is looked up from it once at the end (see finish), which is much cheaper than painting 3 channels
+    per fill. Alongside it the canvas keeps a raster of the topmost terrain layer under each pixel
+    (by position in the render order, see begin_layer, or NO_LAYER), and optionally a mask of the
+    pixels lines were drawn on.
+    '''
+
+    # Value of the layer raster where no terrain layer was drawn
+    NO_LAYER = 255
+
+    def __init__(self, size: int, back_color: Tuple[int, int, int], line_mask: bool = False):
+        self.size: int = size
+
+        self.palette: List[Tuple[int, int, int]] = [tuple(back_color)]
+        self.colors: np.ndarray = np.zeros((size, size), dtype=np.uint8)
+
+        self.layers: np.ndarray = np.full((size, size), self.NO_LAYER, dtype=np.uint8)
+        self.line_mask: Optional[np.ndarray] = np.zeros((size, size), dtype=bool) if line_mask else None
+
+        self.layer: Optional[int] = None
+
+    def begin_layer(self, index: int) -> None:
+        '''
+        Mark the start of a terrain layer (by its position in the render order). The fills drawn from
+        here on are recorded as that layer in the layer raster.
+        '''
+        self.layer = index
+
+    def finish(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        Get the drawn (size, size, 3) uint8 RGB image, written into out if it is given.
+        '''
+        shape = (self.size, self.size, 3)
+
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        elif out.shape != shape or out.dtype != np.uint8:
+            raise ValueError(f'Output array must be uint8 with shape {shape}, got {out.dtype} with shape {out.shape}')
+
+        np.take(np.array(self.palette, dtype=np.uint8), self.colors, axis=0, out=out)
+
+        return out
+
+    def _color_index(self, color: Tuple[int, int, int]) -> int:
+        color = tuple(color)
+
+        if color not in self.palette:
+            if len(self.palette) == 256:
+                raise ValueError('ArrayCanvas supports at most 256 different colors')
+
+            self.palette.append(color)
+
+        return self.palette.index(color)
+
+    def _paint(self, mask: np.ndarray, left: int, top: int, color: Tuple[int, int, int], line: bool) -> None:
+        # Paint a mask returned by polygon_mask, with its top left corner at (left, top)
+        if mask.size == 0:
+            return
+
+        window = (slice(top, top + mask.shape[0]), slice(left, left + mask.shape[1]))
+
+        self.colors[window][mask] = self._color_index(color)
+
+        if line:
+            if self.line_mask is not None:
+                self.line_mask[window] |= mask
+        elif self.layer is not None:
+            self.layers[window][mask] = self.layer
+
+    def _paint_pixels(self, pixels: np.ndarray, color: Tuple[int, int, int], line: bool) -> None:
+        # Paint an (N, 2) int array of (x, y) pixels, already clipped to the canvas
+        if len(pixels) == 0:
+            return
+
+        rows, columns = pixels[:, 1], pixels[:, 0]
+
+        self.colors[rows, columns] = self._color_index(color)
+
+        if line:
+            if self.line_mask is not None:
+                self.line_mask[rows, columns] = True
+        elif self.layer is not None:
+            self.layers[rows, columns] = self.layer
+
+    def triangle(self, coords: List[Tuple[float, float]], color: Tuple[int, int, int]) -> None:
+        '''
+        Draw a filled triangle on the canvas.
+        '''
+        self.triangles(np.asarray(coords, dtype=np.float64).reshape(-1, 2), np.arange(3).reshape(1, 3), color)
+
+    def triangles(self, coords: np.ndarray, tris: np.ndarray, color: Tuple[int, int, int]) -> None:
+        '''
+        Draw a batch of filled triangles on the canvas, see TileCanvas.triangles.
+        '''
+        tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3)
+
+        if len(tris) == 0:
+            return
+
+        with phase('render/convert_coords'):
+            points = convert_coords_array(self.size, coords)
+
+        with phase('render/rasterize'):
+            mask, (left, top) = polygon_mask(self.size, points, tris)
+
+        self._paint(mask, left, top, color, line=False)
+
+    def points(self, coords: np.ndarray, color: Tuple[int, int, int]) -> None:
+        '''
+        Fill the pixels under an (N, 2) array of tile coordinates.
+        '''
+        pixels = np.trunc(convert_coords_array(self.size, coords)).astype(np.int64)
+        pixels = pixels[((pixels >= 0) & (pixels < self.size)).all(axis=1)]
+
+        self._paint_pixels(pixels, color, line=False)
+
+    def lines(self, points: np.ndarray, offsets: np.ndarray, color: Tuple[int, int, int], dashed: bool = False) -> None:
+        '''
+        Draw a batch of paths on the canvas, see TileCanvas.lines.
+        '''
+        corners, single_points = line_outlines(self.size, points, offsets, dashed)
+
+        if len(corners) > 0:
+            with phase('render/rasterize'):
+                mask, (left, top) = polygon_mask(self.size, corners.reshape(-1, 2), np.arange(4 * len(corners)).reshape(-1, 4))
+
+            self._paint(mask, left, top, color, line=True)
+
+        self._paint_pixels(single_points, color, line=True)
@@ -0,0 +1,222 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .sw_ducky import MapGeometry
+
+# Tiles are named like: mega_island_12_7_map_geometry.bin
+TILE_FILENAME_PATTERN = re.compile(r'^(?P<island>.+)_(?P<x>\d+)_(?P<y>\d+)_map_geometry\.bin$')
+
+def tile_filename(island: str, x: int, y: int) -> str:
+
+    '''
+    Get the file name of a given tile of an island
+    '''
+
+    return f'{island}_{x}_{y}_map_geometry.bin'
+
+def find_tiles(tiles_directory: str, island: str) -> Dict[Tuple[int, int], str]:
+
+    '''
+    Find all the geometry files of an island in a tiles directory, i.e.:
+
+    find_tiles('.../Stormworks/rom/data/tiles', 'arid_island')
+
+    Returns a dict of (x, y) -> path to the tile
+    '''
+
+    tiles = {}
+
+    for filename in os.listdir(tiles_directory):
+
+        match = TILE_FILENAME_PATTERN.match(filename)
+
+        if match is None or match.group('island') != island:
+            continue
+
+        tiles[(int(match.group('x')), int(match.group('y')))] = os.path.join(tiles_directory, filename)
+
+    return tiles
+
+def list_islands(tiles_directory: str) -> List[str]:
+
+    '''
+    List the names of all the islands that have geometry files in a tiles directory
+    '''
+
+    islands = set()
+
+    for filename in os.listdir(tiles_directory):
+
+        match = TILE_FILENAME_PATTERN.match(filename)
+
+        if match is not None:
+            islands.add(match.group('island'))
+
+    return sorted(islands)
+
+def _load_tile(arguments: Tuple[str, bool, dict]) -> MapGeometry:
+
+    # Runs inside the worker processes, so it has to live at module level to be picklable
+    path, moon, kwargs = arguments
+
+    return MapGeometry.from_file(path, moon = moon, **kwargs)
+
+class TileSet:
+
+    '''
+    All the tiles that make up a single island, i.e.:
+
+    island = TileSet('.../Stormworks/rom/data/tiles', 'mega_island').load()
+
+    The grid extents are worked out from the files that exist, so islands that
+    don't start at tile 0_0 (like arid_island) need no hard coded offsets.
+    Tiles which are missing from the grid are given as empty MapGeometry objects,
+    which are kept like loaded tiles, so edits made to them aren't lost.
+    '''
+
+    def __init__(self, tiles_directory: str, island: str, moon: bool = False):
+
+        self.tiles_directory = tiles_directory
+        self.island = island
+        self.moon = moon
+
+        # (x, y) -> path to the .bin file
+        self.paths = find_tiles(tiles_directory, island)
+
+        if len(self.paths) == 0:
+            raise FileNotFoundError(f'No geometry files found for island "{island}" in: {tiles_directory}')
+
+        xs = [x for x, _ in self.paths]
+        ys = [y for _, y in self.paths]
+
+        self.min_x, self.max_x = min(xs), max(xs)
+        self.min_y, self.max_y = min(ys), max(ys)
+
+        # (x, y) -> loaded MapGeometry
+        self.tiles: Dict[Tuple[int, int], MapGeometry] = {}
+
+        # Extra arguments given to MapGeometry.from_file, and MapGeometry() for missing tiles
+        self._load_kwargs = {}
+
+    @property
+    def width(self) -> int:
+
+        return self.max_x - self.min_x + 1
+
+    @property
+    def height(self) -> int:
+
+        return self.max_y - self.min_y + 1
+
+    def coordinates(self) -> Iterator[Tuple[int, int]]:
+
+        '''
+        Iterate over the (x, y) position of every tile in the grid, including missing ones.
+        '''
+
+        for y in range(self.min_y, self.max_y + 1):
+            for x in range(self.min_x, self.max_x + 1):
+                yield x, y
+
+    def grid_position(self, x: int, y: int) -> Tuple[int, int]:
+
+        '''
+        Get the (column, row) of a tile in an image of the whole island.
+        Tile indexing starts from the bottom left, while image rows start from the top.
+        '''
+
+        return x - self.min_x, self.max_y - y
+
+    def load(self, processes: Optional[int] = None, **kwargs) -> 'TileSet':
+
+        '''
+        Load every tile of the island, spread across a pool of worker processes.
+
+        processes defaults to the number of cores. Use processes = 1 to load everything
+        in the current process instead. Any extra keyword arguments are passed through
+        to MapGeometry.from_file (i.e. compact = True). Returns the TileSet itself.
+
+        Tiles loaded by the pool are compact unless compact = False is given: they have to be
+        pickled back to this process, and lists of tuples take longer to unpickle than to parse.
+
+        Tiles which were already loaded are loaded again, but tiles created to fill in
+        missing positions are kept.
+        '''
+
+        if kwargs.get('lazy') and processes != 1:
+            raise ValueError('Lazily loaded tiles are memory mapped, and cannot be sent between processes. Use processes = 1')
+
+        if processes != 1:
+            kwargs.setdefault('compact', True)
+
+        self._load_kwargs = kwargs
+
+        positions = list(self.paths)
+        arguments = [(self.paths[position], self.moon, kwargs) for position in positions]
+
+        # Tiles with no file only exist in memory
+        created = {position: geo for position, geo in self.tiles.items() if position not in self.paths}
+
+        if processes == 1:
+
+            loaded = map(_load_tile, arguments)
+
+            self.tiles = {**created, **dict(zip(positions, loaded))}
+
+            return self
+
+        workers = processes or os.cpu_count() or 1
+
+        # Hand out work in batches, so the per tile overhead stays small
+        chunksize = max(1, len(arguments) // (4 * workers))
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            self.tiles = {**created, **dict(zip(positions, executor.map(_load_tile, arguments, chunksize = chunksize)))}
+
+        return self
+
+    def empty_tile(self) -> MapGeometry:
+
+        '''
+        Create an empty MapGeometry, used to fill in tiles which have no file.
+        '''
+
+        return MapGeometry(moon = self.moon, compact = self._load_kwargs.get('compact', False))
+
+    def __getitem__(self, position: Tuple[int, int]) -> MapGeometry:
+
+        if position in self.tiles:
+            return self.tiles[position]
+
+        if position not in self.paths:
+            # Missing tile, assume empty. Keep it, so anything added to it is still there next time.
+            self.tiles[position] = self.empty_tile()
+        else:
+            # Tile exists but wasn't loaded yet, so load it on demand
+            self.tiles[position] = _load_tile((self.paths[position], self.moon, self._load_kwargs))
+
+        return self.tiles[position]
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+
+        '''
+        Determine if a tile has a file. Tiles created to fill in missing positions don't count.
+        '''
+
+        return position in self.paths
+
+    def __iter__(self) -> Iterator[Tuple[Tuple[int, int], MapGeometry]]:
+
+        '''
+        Iterate over ((x, y), MapGeometry) for every tile in the grid, filling in missing tiles.
+        '''
+
+        for position in self.coordinates():
+            yield position, self[position]
+
+    def __len__(self) -> int:
+
+        return self.width * self.height
@@ -0,0 +1,103 @@
+from typing import Callable
+
+class TrackedList(list):
+
+    '''
+    A list which remembers if it was ever modified, through its dirty attribute, and counts
+    its modifications in its version attribute.
+
+    MapGeometry keeps its layers and line groups in these, so that saving can tell which chunks
+    still match the file they came from, and cached data worked out from a layer (like the spatial
+    index) can tell when it is out of date. Compact storage (ArrayList) has the same attributes.
+    '''
+
+    __slots__ = ('dirty', 'version')
+
+    def __init__(self, *args):
+
+        super().__init__(*args)
+
+        self.dirty = False
+        self.version = 0
+
+    def touch(self):
+
+        '''
+        Record a modification made some other way than through the list's own methods.
+        '''
+
+        self.dirty = True
+        self.version += 1
+
+    def __reduce_ex__(self, protocol):
+
+        # Keep the flag when sent to another process
+        return _rebuild_tracked_list, (list(self), self.dirty)
+
+def _rebuild_tracked_list(values: list, dirty: bool) -> TrackedList:
+
+    output = TrackedList(values)
+    output.dirty = dirty
+
+    return output
+
+def _mark_dirty(name: str):
+
+    method = getattr(list, name)
+
+    def mutate(self, *args, **kwargs):
+
+        self.dirty = True
+        self.version += 1
+
+        return method(self, *args, **kwargs)
+
+    mutate.__name__ = name
+    mutate.__doc__ = method.__doc__
+
+    return mutate
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(TrackedList, _name, _mark_dirty(_name))
+
+def change_key(container) -> tuple:
+
+    '''
+    Get a key for the current contents of a layer or line group, which changes with every modification.
+
+    Use it along with the identity of the container (replacing a container is a change too). Containers
+    without a version counter, like plain lists assigned by hand, only give their length, so in place
+    edits to those aren't seen.
+    '''
+
+    return getattr(container, 'version', None), len(container)
+
+def track(container):
+
+    '''
+    Wrap a freshly decoded layer or line group so changes to it can be detected.
+    '''
+
+    if type(container) is list:
+        return TrackedList(container)
+
+    return container
+
+def tracked_reader(reader: Callable) -> Callable:
+
+    '''
+    Wrap a chunk reader (like read_single_mesh_chunk or read_line_quads), so that everything it decodes is tracked.
+    '''
+
+    def read(bin: bytes, index: int):
+
+        data, size = reader(bin, index)
+
+        if isinstance(data, tuple):
+            data = tuple(track(part) for part in data)
+        else:
+            data = track(data)
+
+        return data, size
+
+    return read
@@ -0,0 +1,84 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+# 2D affine transforms are 3x3 matrices, acting on column vectors (x, y, 1).
+# Combine them with @, the rightmost one is applied first, i.e.:
+#
+#   rotation(math.pi / 2) @ translation(100, 0)
+#
+# moves things 100 to the right, then rotates them a quarter turn around the tile center.
+
+def identity() -> np.ndarray:
+
+    return np.eye(3)
+
+def translation(offset_x: float, offset_y: float) -> np.ndarray:
+
+    matrix = np.eye(3)
+    matrix[:2, 2] = offset_x, offset_y
+
+    return matrix
+
+def scaling(scale_x: float, scale_y: float = None, center: Tuple[float, float] = (0, 0)) -> np.ndarray:
+
+    '''
+    Scale around a center point (the middle of the tile by default). scale_y defaults to scale_x.
+    '''
+
+    if scale_y is None:
+        scale_y = scale_x
+
+    return translation(*center) @ np.diag([scale_x, scale_y, 1.0]) @ translation(-center[0], -center[1])
+
+def rotation(angle: float, center: Tuple[float, float] = (0, 0)) -> np.ndarray:
+
+    '''
+    Rotate counter clockwise by an angle in radians, around a center point (the middle of the tile by default).
+    '''
+
+    cos, sin = math.cos(angle), math.sin(angle)
+
+    matrix = np.array([
+        [cos, -sin, 0],
+        [sin, cos, 0],
+        [0, 0, 1],
+    ])
+
+    return translation(*center) @ matrix @ translation(-center[0], -center[1])
+
+def mirror_x(center_x: float = 0) -> np.ndarray:
+
+    '''
+    Mirror left to right, across a vertical line at center_x.
+    '''
+
+    return scaling(-1, 1, (center_x, 0))
+
+def mirror_y(center_y: float = 0) -> np.ndarray:
+
+    '''
+    Mirror top to bottom, across a horizontal line at center_y.
+    '''
+
+    return scaling(1, -1, (0, center_y))
+
+def is_mirroring(matrix: np.ndarray) -> bool:
+
+    '''
+    Determine if a transform flips shapes over (so reverses the winding of triangles).
+    '''
+
+    return np.linalg.det(np.asarray(matrix)[:2, :2]) < 0
+
+def apply_affine(points: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+
+    '''
+    Transform an array of X,Y points with shape (..., 2) in a single operation.
+    '''
+
+    points = np.asarray(points, dtype = np.float64)
+    matrix = np.asarray(matrix, dtype = np.float64)
+
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
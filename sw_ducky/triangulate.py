@@ -0,0 +1,355 @@
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Vertex types of the monotone decomposition sweep
+START, SPLIT, END, MERGE, REGULAR = range(5)
+
+def loop_areas(points: np.ndarray, loops: Sequence[Tuple[int, int]]) -> np.ndarray:
+
+    '''
+    Get the signed area of each (start, end) range of points in a loop, positive for CCW loops.
+    '''
+
+    if len(loops) == 0:
+        return np.empty(0)
+
+    starts = np.array([start for start, _ in loops], dtype = np.int64)
+    ends = np.array([end for _, end in loops], dtype = np.int64)
+
+    # The point after each one in its loop
+    following = np.arange(1, len(points) + 1)
+    following[ends - 1] = starts
+
+    x, y = points[:, 0], points[:, 1]
+
+    return np.add.reduceat(x * y[following] - x[following] * y, starts) / 2
+
+def _cross(o: Tuple[float, float], a: Tuple[float, float], b: Tuple[float, float]) -> float:
+
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+def _monotone_pieces(points: List[Tuple[float, float]], next_vertex: np.ndarray, prev_vertex: np.ndarray, rank: np.ndarray, order: np.ndarray) -> List[Tuple[int, int]]:
+
+    # Sweep a line from the top down, adding the diagonals that split the polygon into y-monotone pieces.
+    # This is the algorithm from chapter 3 of "Computational Geometry" (de Berg et al.), where the sweep
+    # status holds the edges with the inside of the polygon to their right, sorted by x.
+
+    # A vertex is "below" another when it comes later in the sweep (lower y, or same y and higher x)
+    below_prev = rank[prev_vertex] < rank
+    below_next = rank[next_vertex] < rank
+
+    xy = np.asarray(points)
+    turn = (
+        (xy[:, 0] - xy[prev_vertex, 0]) * (xy[next_vertex, 1] - xy[:, 1]) -
+        (xy[:, 1] - xy[prev_vertex, 1]) * (xy[next_vertex, 0] - xy[:, 0])
+    )
+
+    convex = turn > 0
+
+    kinds = np.full(len(points), REGULAR)
+    kinds[~below_prev & ~below_next & convex] = START
+    kinds[~below_prev & ~below_next & ~convex] = SPLIT
+    kinds[below_prev & below_next & convex] = END
+    kinds[below_prev & below_next & ~convex] = MERGE
+
+    kinds = kinds.tolist()
+    next_list = next_vertex.tolist()
+    prev_list = prev_vertex.tolist()
+    boundary_goes_down = below_prev.tolist()
+
+    # Edges are named after their first vertex. Every edge in the status runs downwards.
+    status: List[int] = []
+    helper: Dict[int, int] = {}
+
+    diagonals = []
+
+    def edge_x(edge: int, y: float) -> float:
+
+        (ax, ay), (bx, by) = points[edge], points[next_list[edge]]
+
+        if ay == by:
+            return ax
+
+        return ax + (y - ay) * (bx - ax) / (by - ay)
+
+    def left_of(x: float, y: float) -> int:
+
+        # Binary search for the position of the last edge left of (x, y)
+        low, high = 0, len(status)
+
+        while low < high:
+
+            middle = (low + high) // 2
+
+            if edge_x(status[middle], y) < x:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low - 1
+
+    def insert(edge: int):
+
+        x, y = points[edge]
+
+        status.insert(left_of(x, y) + 1, edge)
+
+        helper[edge] = edge
+
+    def connect_merge_helper(vertex: int, edge: int):
+
+        if kinds[helper[edge]] == MERGE:
+            diagonals.append((vertex, helper[edge]))
+
+    def remove(edge: int):
+
+        # Edges are removed at their lower end, where they are found by binary search too. Edges meeting
+        # there have the same x, so step over them, and only fall back to a scan if rounding moved it.
+        x, y = points[next_list[edge]]
+        position = left_of(x, y) + 1
+
+        while position < len(status) and status[position] != edge and edge_x(status[position], y) <= x:
+            position += 1
+
+        if position < len(status) and status[position] == edge:
+            del status[position]
+        else:
+            status.remove(edge)
+
+    for vertex in order.tolist():
+
+        kind = kinds[vertex]
+        x, y = points[vertex]
+
+        if kind == START:
+            insert(vertex)
+
+        elif kind == END:
+            connect_merge_helper(vertex, prev_list[vertex])
+            remove(prev_list[vertex])
+
+        elif kind == SPLIT:
+            left = status[left_of(x, y)]
+            diagonals.append((vertex, helper[left]))
+            helper[left] = vertex
+            insert(vertex)
+
+        elif kind == MERGE:
+            connect_merge_helper(vertex, prev_list[vertex])
+            remove(prev_list[vertex])
+
+            left = status[left_of(x, y)]
+            connect_merge_helper(vertex, left)
+            helper[left] = vertex
+
+        elif boundary_goes_down[vertex]:
+            # The inside of the polygon is to the right of this vertex
+            connect_merge_helper(vertex, prev_list[vertex])
+            remove(prev_list[vertex])
+            insert(vertex)
+
+        else:
+            left = status[left_of(x, y)]
+            connect_merge_helper(vertex, left)
+            helper[left] = vertex
+
+    return diagonals
+
+def _faces(points: List[Tuple[float, float]], next_vertex: List[int], diagonals: List[Tuple[int, int]]) -> List[List[int]]:
+
+    # Walk the faces the diagonals cut the polygon into, each with its inside on the left
+    extra: Dict[int, List[int]] = {}
+
+    for a, b in diagonals:
+        extra.setdefault(a, []).append(b)
+        extra.setdefault(b, []).append(a)
+
+    # Outgoing edges of the vertices with diagonals, sorted by angle
+    fans = {}
+
+    for vertex, targets in extra.items():
+
+        targets = targets + [next_vertex[vertex]]
+        x, y = points[vertex]
+
+        fans[vertex] = sorted(targets, key = lambda target: math.atan2(points[target][1] - y, points[target][0] - x))
+
+    def step(previous: int, vertex: int) -> int:
+
+        fan = fans.get(vertex)
+
+        if fan is None:
+            return next_vertex[vertex]
+
+        # Turn clockwise from the edge we came in on, to the first edge out
+        x, y = points[vertex]
+        back = math.atan2(points[previous][1] - y, points[previous][0] - x)
+
+        best, best_turn = None, 0.0
+
+        for target in fan:
+
+            if target == previous:
+                continue
+
+            turn = (back - math.atan2(points[target][1] - y, points[target][0] - x)) % (2 * math.pi)
+
+            if best is None or turn < best_turn:
+                best, best_turn = target, turn
+
+        return previous if best is None else best
+
+    used = set()
+    faces = []
+
+    starts = [(vertex, next_vertex[vertex]) for vertex in range(len(points))]
+    starts += [(a, b) for a, b in diagonals] + [(b, a) for a, b in diagonals]
+
+    for edge in starts:
+
+        if edge in used:
+            continue
+
+        face = []
+        previous, vertex = edge
+
+        while (previous, vertex) not in used:
+
+            used.add((previous, vertex))
+            face.append(previous)
+
+            previous, vertex = vertex, step(previous, vertex)
+
+        faces.append(face)
+
+    return faces
+
+def _triangulate_monotone(points: List[Tuple[float, float]], face: List[int], rank: List[int]) -> List[Tuple[int, int, int]]:
+
+    # Triangulate a y-monotone polygon in linear time (after sorting), the second half of chapter 3 of de Berg et al.
+    if len(face) == 3:
+        return [tuple(face)]
+
+    top = min(range(len(face)), key = lambda index: rank[face[index]])
+    bottom = max(range(len(face)), key = lambda index: rank[face[index]])
+
+    # Going CCW from the top leads down the left chain
+    on_left = {}
+    index = top
+
+    while index != bottom:
+        on_left[face[index]] = True
+        index = (index + 1) % len(face)
+
+    while index != top:
+        on_left[face[index]] = False
+        index = (index + 1) % len(face)
+
+    ordered = sorted(face, key = rank.__getitem__)
+
+    tris = []
+    stack = [ordered[0], ordered[1]]
+
+    for vertex in ordered[2:-1]:
+
+        if on_left[vertex] != on_left[stack[-1]]:
+
+            # Fan out to everything on the other chain
+            for a, b in zip(stack, stack[1:]):
+                tris.append((vertex, a, b))
+
+            stack = [stack[-1], vertex]
+
+        else:
+
+            last = stack.pop()
+
+            while len(stack) > 0:
+
+                turn = _cross(points[vertex], points[last], points[stack[-1]])
+
+                # Only cut off the corner if the diagonal lies inside the polygon
+                if (turn < 0) if on_left[vertex] else (turn > 0):
+                    tris.append((vertex, last, stack[-1]))
+                    last = stack.pop()
+                else:
+                    break
+
+            stack += [last, vertex]
+
+    for a, b in zip(stack, stack[1:]):
+        tris.append((ordered[-1], a, b))
+
+    return tris
+
+def triangulate_loops(points: np.ndarray, loops: Sequence[Tuple[int, int]]) -> np.ndarray:
+
+    '''
+    Triangulate a set of polygons with holes, given as closed loops of points.
+
+    points is an (N, 2) array with the points of every loop one after the other, and loops gives the
+    (start, end) range of each loop. Outlines must run CCW and holes CW (the inside always on the left),
+    and no loops may cross or touch. Loops don't need to be grouped by polygon.
+
+    The polygons are split into y-monotone pieces with a sweep line, and each piece is then
+    triangulated in linear time. Edges are found in the sweep status by binary search, so this takes
+    O(n log n) comparisons, but the status is a plain list: inserting and removing shifts the edges
+    after them, which is O(n^2) memory moves in the worst case (cheap next to the comparisons, until
+    the sweep line crosses tens of thousands of edges at once). Returns an (M, 3) array of CCW
+    triangles, indexing into points.
+    '''
+
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+
+    if len(points) == 0:
+        return np.empty((0, 3), dtype = np.int64)
+
+    next_vertex = np.arange(1, len(points) + 1)
+    prev_vertex = np.arange(-1, len(points) - 1)
+
+    for start, end in loops:
+        next_vertex[end - 1] = start
+        prev_vertex[start] = end - 1
+
+    # Sweep from the top down, and left to right along each row
+    order = np.lexsort((points[:, 0], -points[:, 1]))
+
+    rank = np.empty(len(points), dtype = np.int64)
+    rank[order] = np.arange(len(points))
+
+    point_list = [tuple(point) for point in points.tolist()]
+
+    diagonals = _monotone_pieces(point_list, next_vertex, prev_vertex, rank, order)
+
+    rank_list = rank.tolist()
+
+    tris = []
+
+    for face in _faces(point_list, next_vertex.tolist(), diagonals):
+        tris += _triangulate_monotone(point_list, face, rank_list)
+
+    tris = np.array(tris, dtype = np.int64).reshape(-1, 3)
+
+    # Wind them all CCW, and drop the slivers left between collinear points
+    turns = _cross_array(points[tris])
+
+    tris[turns < 0] = tris[turns < 0][:, ::-1]
+
+    return tris[turns != 0]
+
+def _cross_array(corners: np.ndarray) -> np.ndarray:
+
+    return (
+        (corners[:, 1, 0] - corners[:, 0, 0]) * (corners[:, 2, 1] - corners[:, 0, 1]) -
+        (corners[:, 1, 1] - corners[:, 0, 1]) * (corners[:, 2, 0] - corners[:, 0, 0])
+    )
+
+def triangles_area(points: np.ndarray, tris: np.ndarray) -> float:
+
+    '''
+    Get the total area covered by some triangles.
+    '''
+
+    return float(np.abs(_cross_array(np.asarray(points, dtype = np.float64)[tris])).sum() / 2)
@@ -1,7 +1,9 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import math
 
+import numpy as np
+
 def is_cord_valid(coord: Tuple[float, float]) -> bool:
 
     '''
@@ -39,4 +41,91 @@ def line_from_quad(quad: Tuple[Tuple[float, float]]) -> List[Tuple[float, float]
 
         return ((coords[0][0] + coords[1][0]) / 2, (coords[0][1] + coords[1][1]) / 2)
 
-    return [avg_2_coords(quad[0: 2]), avg_2_coords(quad[2: 4])]
\ No newline at end of file
+    return [avg_2_coords(quad[0: 2]), avg_2_coords(quad[2: 4])]
+
+def quads_from_lines(starts: np.ndarray, ends: np.ndarray, thickness: float = 4) -> np.ndarray:
+
+    '''
+    Vectorized version of the quad construction in MapGeometry.add_line.
+
+    Given (N, 2) arrays of line start and end points, return an (N, 4, 2) array of quads,
+    each one offset by thickness to either side of its line, preserving the CCW rotation.
+    '''
+
+    starts = np.asarray(starts, dtype = np.float64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype = np.float64).reshape(-1, 2)
+
+    # Angles 90 degrees off each line bearing
+    angles = np.arctan2(ends[:, 1] - starts[:, 1], ends[:, 0] - starts[:, 0])
+
+    left = thickness * np.stack([np.cos(angles + math.pi / 2), np.sin(angles + math.pi / 2)], axis = 1)
+    right = thickness * np.stack([np.cos(angles - math.pi / 2), np.sin(angles - math.pi / 2)], axis = 1)
+
+    return np.stack([starts + right, starts + left, ends + left, ends + right], axis = 1)
+
+def valid_coords_mask(coords: np.ndarray) -> np.ndarray:
+
+    '''
+    Vectorized version of is_cord_valid / is_poly_valid.
+
+    Given an array of X,Y values with shape (..., 2), or of polygons with shape (N, corners, 2),
+    return a boolean array with one entry per leading element, which is False wherever that element
+    contains a NaN or an inf.
+    '''
+
+    finite = np.isfinite(coords)
+
+    # Collapse every axis except the first one
+    return finite.all(axis = tuple(range(1, finite.ndim)))
+
+def line_paths(quads, join_tolerance: float = 1e-3, angle_tolerance: Optional[float] = 1e-4) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    Vectorized version of line_from_quad, for a whole line group, which also joins the lines up into paths.
+
+    Consecutive quads where one starts (within join_tolerance) where the one before it ended are chained
+    into a single path, and the points where a path carries on in the same direction (within angle_tolerance
+    radians) are dropped, so runs of collinear quads become one longer line. With angle_tolerance = None
+    every point is kept, and with join_tolerance = 0 only quads starting exactly where the one before
+    ended are chained, which gives exactly the lines of the quads themselves.
+
+    Returns an (N, 2) array with the points of every path one after the other, and an array of the
+    offsets where each path starts in it, followed by N.
+    '''
+
+    quads = np.asarray(quads, dtype = np.float64).reshape(-1, 4, 2)
+
+    if len(quads) == 0:
+        return np.empty((0, 2)), np.zeros(1, dtype = np.int64)
+
+    # The middle of each end of the quad
+    starts = (quads[:, 0] + quads[:, 1]) / 2
+    ends = (quads[:, 2] + quads[:, 3]) / 2
+
+    chain_start = np.ones(len(quads), dtype = bool)
+    chain_start[1:] = np.hypot(*(starts[1:] - ends[:-1]).T) > join_tolerance
+
+    # Where a quad continues the path in the same direction, the point between them can go
+    directions = ends - starts
+    lengths = np.hypot(*directions.T)
+
+    cross = directions[:-1, 0] * directions[1:, 1] - directions[:-1, 1] * directions[1:, 0]
+    dot = (directions[:-1] * directions[1:]).sum(axis = 1)
+
+    straight = np.zeros(len(quads), dtype = bool)
+
+    if angle_tolerance is not None:
+        straight[1:] = ~chain_start[1:] & (np.abs(cross) <= angle_tolerance * lengths[:-1] * lengths[1:]) & (dot > 0)
+
+    # Lay out the points of all the paths: the start of each path, then the end of every quad,
+    # except the ones in the middle of a straight run
+    points = np.stack([starts, ends], axis = 1).reshape(-1, 2)
+
+    present = np.ones(2 * len(quads), dtype = bool)
+    present[0::2] = chain_start
+    present[1:-1:2] = ~straight[1:]
+
+    path_start = np.zeros(2 * len(quads), dtype = bool)
+    path_start[0::2] = chain_start
+
+    return points[present], np.append(np.flatnonzero(path_start[present]), np.count_nonzero(present))
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .optimize import mesh_headroom
+from .parsing import QUAD_DTYPE, TRIANGLE_DTYPE, VERTEX_DTYPE, index_chunks
+from .sw_ducky import EARTH_LAYER_MEM_ORDER, MOON_LAYER_MEM_ORDER
+from .utilitity import valid_coords_mask
+
+# Files usually end right after the quad chunks, or with these 4 bytes, whose meaning is unknown
+KNOWN_TRAILING_BYTES = (b'', b'\x00\x00\x00\x00')
+
+# Layers with less room than this left under the 65535 limit of the format get a warning
+DEFAULT_HEADROOM_WARNING = 4096
+
+def _diagnostic(code: str, message: str, **location) -> dict:
+
+    return {'code': code, 'message': message, **location}
+
+def _check_mesh_chunk(data: bytes, start: int, name: str, headroom_warning: int, errors: List[dict], warnings: List[dict]) -> dict:
+
+    # Same layout as read_mesh_chunk_arrays, except nothing is rejected, just counted
+    vertex_count = struct.unpack_from('<H', data, start)[0]
+
+    raw_vertices = np.frombuffer(data, dtype = VERTEX_DTYPE, count = vertex_count, offset = start + 2)
+    coordinates = np.stack([raw_vertices['x'], raw_vertices['z']], axis = 1)
+
+    tris_start = start + 2 + vertex_count * VERTEX_DTYPE.itemsize
+    index_count = struct.unpack_from('<H', data, tris_start)[0]
+
+    tris = np.frombuffer(data, dtype = TRIANGLE_DTYPE, count = index_count // 3, offset = tris_start + 2).view('<u2').reshape(-1, 3).astype(np.int64)
+
+    invalid_vertices = int((~valid_coords_mask(coordinates)).sum())
+
+    if invalid_vertices > 0:
+        errors.append(_diagnostic('invalid_vertices', f'{invalid_vertices} vertices contain NaNs or infs, the file will not load', layer = name))
+
+    if index_count % 3 != 0:
+        warnings.append(_diagnostic('partial_triangle', f'The triangle index count ({index_count}) is not a multiple of 3, the extra indices are ignored', layer = name))
+
+    out_of_range = (tris >= vertex_count).any(axis = 1)
+    out_of_range_count = int(out_of_range.sum())
+
+    if out_of_range_count > 0:
+        errors.append(_diagnostic('out_of_range_indices', f'{out_of_range_count} triangles refer to vertices past the end of the layer ({vertex_count} vertices)', layer = name))
+
+    # Triangles which repeat a corner, or whose corners are in a line, have no area to draw
+    valid_tris = tris[~out_of_range]
+    corners = coordinates.astype(np.float64)[valid_tris]
+
+    repeated = (valid_tris[:, 0] == valid_tris[:, 1]) | (valid_tris[:, 1] == valid_tris[:, 2]) | (valid_tris[:, 2] == valid_tris[:, 0])
+
+    with np.errstate(invalid = 'ignore'):
+
+        doubled_area = (
+            (corners[:, 1, 0] - corners[:, 0, 0]) * (corners[:, 2, 1] - corners[:, 0, 1]) -
+            (corners[:, 1, 1] - corners[:, 0, 1]) * (corners[:, 2, 0] - corners[:, 0, 0])
+        )
+
+        degenerate_count = int((repeated | (doubled_area == 0)).sum())
+
+    if degenerate_count > 0:
+        warnings.append(_diagnostic('degenerate_triangles', f'{degenerate_count} triangles have no area', layer = name))
+
+    headroom = mesh_headroom(vertex_count, index_count // 3)
+
+    if min(headroom.values()) < headroom_warning:
+        warnings.append(_diagnostic('near_uint16_limit', f'Only {min(headroom.values())} vertices / indices left before the 65535 limit', layer = name))
+
+    return {
+        'vertices': vertex_count,
+        'triangles': index_count // 3,
+        'invalid_vertices': invalid_vertices,
+        'out_of_range_triangles': out_of_range_count,
+        'degenerate_triangles': degenerate_count,
+        **headroom,
+    }
+
+def _check_quad_chunk(data: bytes, start: int, group: int, errors: List[dict], warnings: List[dict]) -> dict:
+
+    # Same layout as read_line_quad_arrays
+    index_count = struct.unpack_from('<H', data, start)[0]
+
+    raw_quads = np.frombuffer(data, dtype = QUAD_DTYPE, count = index_count // 4, offset = start + 2)['corners']
+    quads = np.stack([raw_quads['x'], raw_quads['z']], axis = 2)
+
+    if index_count % 4 != 0:
+        warnings.append(_diagnostic('partial_quad', f'The quad index count ({index_count}) is not a multiple of 4, the extra indices are ignored', line_group = group))
+
+    # The parsers silently skip these
+    dropped = int((~valid_coords_mask(quads)).sum())
+
+    if dropped > 0:
+        warnings.append(_diagnostic('dropped_quads', f'{dropped} quads contain NaNs or infs, and are dropped when loading', line_group = group))
+
+    return {'quads': index_count // 4, 'dropped_quads': dropped}
+
+def is_moon_file(path: str) -> bool:
+
+    '''
+    Whether a geometry file belongs to the moon, going by its name (like moon_surface_0_0_map_geometry.bin).
+    '''
+
+    return os.path.basename(path).startswith('moon_')
+
+def validate_file(path: str, moon: Optional[bool] = None, headroom_warning: int = DEFAULT_HEADROOM_WARNING) -> dict:
+
+    '''
+    Check a single geometry file for problems, without building a MapGeometry out of it.
+    The layers are named as moon layers if moon is set, or by default if the file name starts with moon_.
+
+    Returns a JSON friendly report: the errors (which stop the file loading, or corrupt it) and warnings
+    (which Ducky or Stormworks quietly work around) found, and the statistics of every layer and line group.
+    '''
+
+    if moon is None:
+        moon = is_moon_file(path)
+
+    report = {'path': path, 'moon': moon, 'errors': [], 'warnings': []}
+    errors, warnings = report['errors'], report['warnings']
+
+    with open(path, 'rb') as file_obj:
+        data = file_obj.read()
+
+    report['size_bytes'] = len(data)
+
+    start_time = time.perf_counter()
+
+    try:
+        mesh_spans, quad_spans, end = index_chunks(data)
+    except struct.error:
+        end = None
+
+    if end is None or end > len(data):
+
+        errors.append(_diagnostic('truncated', 'The file ends part way through the geometry chunks'))
+        report['parse_seconds'] = time.perf_counter() - start_time
+
+        return report
+
+    layer_names = MOON_LAYER_MEM_ORDER if moon else EARTH_LAYER_MEM_ORDER
+
+    report['layers'] = {
+        name: _check_mesh_chunk(data, start, name, headroom_warning, errors, warnings)
+        for name, (start, _) in zip(layer_names, mesh_spans)
+    }
+
+    report['line_groups'] = [
+        _check_quad_chunk(data, start, group, errors, warnings)
+        for group, (start, _) in enumerate(quad_spans)
+    ]
+
+    trailing_bytes = data[end:]
+    report['trailing_bytes'] = len(trailing_bytes)
+
+    if trailing_bytes not in KNOWN_TRAILING_BYTES:
+        warnings.append(_diagnostic('trailing_bytes', f'{len(trailing_bytes)} unexpected bytes after the geometry: {trailing_bytes[:16].hex()}'))
+
+    report['parse_seconds'] = time.perf_counter() - start_time
+
+    return report
+
+def _validate_file(arguments: tuple) -> dict:
+
+    # Runs inside the worker processes
+    path, moon, headroom_warning = arguments
+
+    try:
+        return validate_file(path, moon, headroom_warning)
+    except OSError as error:
+        return {'path': path, 'errors': [_diagnostic('unreadable', str(error))], 'warnings': []}
+
+def find_geometry_files(directory: str) -> List[str]:
+
+    '''
+    Find every map_geometry.bin file in a directory (like rom/data/tiles), and all of its subdirectories.
+    '''
+
+    paths = []
+
+    for root, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(root, filename) for filename in filenames if filename.endswith('map_geometry.bin'))
+
+    return sorted(paths)
+
+def validate_files(paths: List[str], moon: Optional[bool] = None, headroom_warning: int = DEFAULT_HEADROOM_WARNING, processes: Optional[int] = None) -> dict:
+
+    '''
+    Validate many geometry files across a process pool (processes = 1 to do everything in the current process).
+    Unless moon is given, it is worked out for each file from its name (see is_moon_file).
+
+    Returns {'files': [one validate_file report per path], 'summary': totals across all the files}
+    '''
+
+    start_time = time.perf_counter()
+
+    arguments = [(path, moon, headroom_warning) for path in paths]
+
+    if processes == 1 or len(paths) <= 1:
+        reports = list(map(_validate_file, arguments))
+    else:
+        workers = processes or os.cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            reports = list(executor.map(_validate_file, arguments, chunksize = max(1, len(arguments) // (4 * workers))))
+
+    codes: Dict[str, int] = {}
+
+    for report in reports:
+        for diagnostic in report['errors'] + report['warnings']:
+            codes[diagnostic['code']] = codes.get(diagnostic['code'], 0) + 1
+
+    summary = {
+        'files': len(reports),
+        'files_with_errors': sum(len(report['errors']) > 0 for report in reports),
+        'files_with_warnings': sum(len(report['warnings']) > 0 for report in reports),
+        'errors': sum(len(report['errors']) for report in reports),
+        'warnings': sum(len(report['warnings']) for report in reports),
+        'diagnostic_counts': dict(sorted(codes.items())),
+        'total_bytes': sum(report.get('size_bytes', 0) for report in reports),
+        'parse_seconds': sum(report.get('parse_seconds', 0) for report in reports),
+        'wall_seconds': time.perf_counter() - start_time,
+    }
+
+    return {'files': reports, 'summary': summary}
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    '''
+    Entry point of the ducky-validate command, i.e.:
+
+    ducky-validate .../Stormworks/rom/data/tiles --output report.json
+
+    Exits with 1 if any file has errors (or warnings, with --strict), so it can gate a release.
+    '''
+
+    parser = argparse.ArgumentParser(prog = 'ducky-validate', description = 'Check Stormworks map_geometry.bin files for problems, and report them as JSON.')
+
+    parser.add_argument('paths', nargs = '+', help = 'Geometry files, or directories to search for them')
+    parser.add_argument('--moon', action = 'store_const', const = True, default = None, help = 'Name the layers of every file as moon layers (by default, only files named moon_*)')
+    parser.add_argument('--processes', type = int, default = None, help = 'Number of worker processes (default: one per CPU)')
+    parser.add_argument('--headroom', type = int, default = DEFAULT_HEADROOM_WARNING, help = 'Warn about layers with less room than this left under the 65535 limit')
+    parser.add_argument('--output', default = '-', help = 'File to write the report to (default: stdout)')
+    parser.add_argument('--summary-only', action = 'store_true', help = 'Leave the per file reports out')
+    parser.add_argument('--strict', action = 'store_true', help = 'Fail on warnings too')
+
+    args = parser.parse_args(argv)
+
+    paths = []
+
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(find_geometry_files(path))
+        else:
+            paths.append(path)
+
+    result = validate_files(paths, moon = args.moon, headroom_warning = args.headroom, processes = args.processes)
+
+    if args.summary_only:
+        del result['files']
+
+    if args.output == '-':
+        json.dump(result, sys.stdout, indent = 4)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as file_obj:
+            json.dump(result, file_obj, indent = 4)
+
+    summary = result['summary']
+
+    return int(summary['errors'] > 0 or (args.strict and summary['warnings'] > 0))
+
+if __name__ == '__main__':
+    sys.exit(main())
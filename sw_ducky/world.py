@@ -0,0 +1,432 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .columnar import TriangleArray, VertexArray
+from .profiling import count, phase
+from .spatial import TILE_MIN, TILE_SIZE
+from .sw_ducky import MapGeometry
+from .tileset import TileSet
+from .tracking import TrackedList
+
+# World coordinates put the centre of tile (x, y) at (x * TILE_SIZE, y * TILE_SIZE), so tile x covers
+# [x * TILE_SIZE - 500, x * TILE_SIZE + 500) along the X axis, with Y up like the tiles themselves.
+
+# Clipped polygons smaller than this (in square metres) are dropped, they are left over where a
+# triangle only touches a tile along its border
+MIN_PIECE_AREA = 1e-9
+
+def tile_offset(x: int, y: int) -> Tuple[float, float]:
+
+    '''
+    Get the world coordinates of the centre of a tile, which is what gets added to its local coordinates.
+    '''
+
+    return float(x * TILE_SIZE), float(y * TILE_SIZE)
+
+def tiles_of_points(points: np.ndarray, lower: bool = False) -> np.ndarray:
+
+    '''
+    Get the (x, y) tile each of an (N, 2) array of world coordinates lies in, as an (N, 2) int array.
+    Points on a border belong to the tile above / to the right of it, or with lower, the tile below /
+    to the left of it (which is where _tile_ranges puts geometry ending on a border).
+    '''
+
+    scaled = (np.asarray(points, dtype = np.float64) - TILE_MIN) / TILE_SIZE
+
+    if lower:
+        return (np.ceil(scaled) - 1).astype(np.int64)
+
+    return np.floor(scaled).astype(np.int64)
+
+def merge_tiles(island: TileSet, min_x: Optional[int] = None, min_y: Optional[int] = None, max_x: Optional[int] = None, max_y: Optional[int] = None) -> MapGeometry:
+
+    '''
+    Merge a rectangular block of tiles into one MapGeometry in world coordinates, i.e.:
+
+    world = merge_tiles(island, 2, 3, 4, 5)
+
+    The block runs from tile (min_x, min_y) to (max_x, max_y) inclusive, and defaults to the whole island.
+    Tiles which aren't loaded yet are loaded on demand. Each tile's vertices and quads are offset
+    by its position (see tile_offset), and every layer and line group is concatenated.
+
+    The merged object usually holds more than the file format allows per layer (and coordinates
+    outside a single tile), so it is always stored as lists, and is meant to be edited and then
+    split back into tiles with split_tiles rather than saved as it is.
+    '''
+
+    min_x = island.min_x if min_x is None else min_x
+    min_y = island.min_y if min_y is None else min_y
+    max_x = island.max_x if max_x is None else max_x
+    max_y = island.max_y if max_y is None else max_y
+
+    world = MapGeometry(moon = island.moon)
+
+    vertices = {layer: [] for layer in world.memory_order}
+    tris = {layer: [] for layer in world.memory_order}
+    quads = [[] for _ in world.line_data]
+
+    with phase('world/merge'):
+
+        for y in range(min_y, max_y + 1):
+            for x in range(min_x, max_x + 1):
+
+                # Skip missing tiles, unless one was created (and maybe edited) in memory
+                if (x, y) not in island and (x, y) not in island.tiles:
+                    continue
+
+                geo = island[(x, y)]
+                offset = np.array(tile_offset(x, y))
+
+                for layer in world.memory_order:
+
+                    layer_tris = np.asarray(geo.terrain_tris[layer], dtype = np.int64).reshape(-1, 3)
+
+                    if len(layer_tris) == 0:
+                        continue
+
+                    # Indices carry on from the tiles merged before this one
+                    base = sum(len(verts) for verts in vertices[layer])
+
+                    vertices[layer].append(np.asarray(geo.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2) + offset)
+                    tris[layer].append(layer_tris + base)
+
+                for index, group in enumerate(geo.line_data):
+
+                    if len(group) > 0:
+                        quads[index].append(np.asarray(group, dtype = np.float64).reshape(-1, 4, 2) + offset)
+
+        for layer in world.memory_order:
+
+            if len(tris[layer]) > 0:
+                world.terrain_vertices[layer] = TrackedList(tuple(vert) for vert in np.concatenate(vertices[layer]).tolist())
+                world.terrain_tris[layer] = TrackedList(tuple(tri) for tri in np.concatenate(tris[layer]).tolist())
+
+        for index, group in enumerate(quads):
+
+            if len(group) > 0:
+                world._append_quads(index, np.concatenate(group))
+
+    return world
+
+def _tile_ranges(mins: np.ndarray, maxs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    # The first and last tile each bounding box overlaps. A box ending exactly on a border doesn't
+    # reach into the next tile, so geometry drawn right up to a tile's edge stays in that tile.
+    low = np.floor((mins - TILE_MIN) / TILE_SIZE).astype(np.int64)
+    high = np.maximum(np.ceil((maxs - TILE_MIN) / TILE_SIZE).astype(np.int64) - 1, low)
+
+    return low, high
+
+def _clip_polygons(polygons: np.ndarray, sizes: np.ndarray, axis: int, bounds: np.ndarray, keep_above: bool) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    One step of Sutherland-Hodgman, for every polygon at once: clip an (N, K, 2) array of convex polygons,
+    each using the first sizes[i] corners, to one side of the line where coordinate `axis` equals
+    bounds[i] (bounds is given as an (N, 1) column).
+
+    Returns the clipped (N, K + 1, 2) polygons and their new sizes.
+    '''
+
+    polygon_count, corners = polygons.shape[:2]
+
+    columns = np.arange(corners)
+
+    # The corner at the far end of each edge, wrapping around at each polygon's own size
+    following = np.where(columns + 1 < sizes[:, None], columns + 1, 0)
+
+    current = polygons
+    after = np.take_along_axis(polygons, following[:, :, None], axis = 1)
+
+    side = (polygons[:, :, axis] - bounds) if keep_above else (bounds - polygons[:, :, axis])
+
+    current_in = side >= 0
+    after_in = np.take_along_axis(current_in, following, axis = 1)
+
+    valid = columns < sizes[:, None]
+
+    crossing = valid & (current_in != after_in)
+
+    # Always work out where an edge crosses from its inside end, so the two triangles sharing an edge
+    # get exactly the same point, and welding can find it again
+    inside = np.where(current_in[:, :, None], current, after)
+    outside = np.where(current_in[:, :, None], after, current)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        t = (bounds - inside[:, :, axis]) / (outside[:, :, axis] - inside[:, :, axis])
+        hits = inside + t[:, :, None] * (outside - inside)
+
+    hits[:, :, axis] = bounds
+
+    # Inside to inside gives the far corner, inside to outside the crossing,
+    # and outside to inside gives the crossing then the far corner
+    first = np.where((current_in & after_in)[:, :, None], after, hits)
+    emitted = np.where(valid, crossing.astype(np.int64) + (after_in & valid), 0)
+
+    positions = np.cumsum(emitted, axis = 1) - emitted
+
+    clipped = np.zeros((polygon_count, corners + 1, 2))
+
+    rows, edges = np.nonzero(emitted > 0)
+    clipped[rows, positions[rows, edges]] = first[rows, edges]
+
+    rows, edges = np.nonzero(emitted == 2)
+    clipped[rows, positions[rows, edges] + 1] = after[rows, edges]
+
+    return clipped, emitted.sum(axis = 1)
+
+def clip_triangles(corners: np.ndarray, tiles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    Clip an (N, 3, 2) array of triangles (in world coordinates) to the square of the (N, 2) array of tiles
+    paired with them, and fan triangulate what's left.
+
+    Returns the (M, 3, 2) triangles, and the index of the input each one came from. Winding is kept.
+    '''
+
+    count('world/clipped_triangles', len(corners))
+
+    polygons = np.asarray(corners, dtype = np.float64)
+    sizes = np.full(len(polygons), 3)
+
+    lows = tiles * TILE_SIZE + TILE_MIN
+
+    # A triangle clipped by the 4 sides of a square has at most 7 corners
+    for axis in (0, 1):
+        polygons, sizes = _clip_polygons(polygons, sizes, axis, lows[:, axis, None], True)
+        polygons, sizes = _clip_polygons(polygons, sizes, axis, lows[:, axis, None] + TILE_SIZE, False)
+
+    # Fan out from the first corner of each polygon
+    fan = np.arange(1, polygons.shape[1] - 1)
+    owner, step = np.nonzero(fan[None, :] + 1 < sizes[:, None])
+
+    triangles = np.stack([polygons[owner, 0], polygons[owner, fan[step]], polygons[owner, fan[step] + 1]], axis = 1)
+
+    # Drop the slivers left where a triangle only touches the square, or lies along its edge
+    areas = (
+        (triangles[:, 1, 0] - triangles[:, 0, 0]) * (triangles[:, 2, 1] - triangles[:, 0, 1]) -
+        (triangles[:, 1, 1] - triangles[:, 0, 1]) * (triangles[:, 2, 0] - triangles[:, 0, 0])
+    )
+
+    keep = np.abs(areas) > 2 * MIN_PIECE_AREA
+
+    return triangles[keep], owner[keep]
+
+def clip_quads(quads: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    '''
+    Cut an (N, 4, 2) array of quads (in world coordinates) wherever their lines cross a tile border.
+
+    The line of a quad runs between the middles of its ends (see line_from_quad). Each quad is cut
+    across at every point its line crosses a border, by cutting both of its long sides at the same
+    fraction of their length, so the pieces keep the quad's width and mitred ends, and their lines
+    join up end to end along the original line.
+
+    Returns the (M, 4, 2) pieces, and the (M, 2) tile each piece's line lies in. Lines running along
+    a border belong to the tile below / to the left of it, like triangles ending on one do.
+    '''
+
+    quads = np.asarray(quads, dtype = np.float64).reshape(-1, 4, 2)
+
+    starts = (quads[:, 0] + quads[:, 1]) / 2
+    ends = (quads[:, 2] + quads[:, 3]) / 2
+
+    low, high = _tile_ranges(np.minimum(starts, ends), np.maximum(starts, ends))
+
+    # Every line crosses the borders between its first and last tile along each axis
+    crossings = high - low
+
+    count('world/clipped_quads', int((crossings.sum(axis = 1) > 0).sum()))
+
+    fractions = [np.zeros(len(quads)), np.ones(len(quads))]
+    owners = [np.arange(len(quads)), np.arange(len(quads))]
+
+    for axis in (0, 1):
+
+        owner = np.repeat(np.arange(len(quads)), crossings[:, axis])
+        step = np.arange(len(owner)) - np.repeat(np.cumsum(crossings[:, axis]) - crossings[:, axis], crossings[:, axis])
+
+        borders = (low[owner, axis] + step + 1) * TILE_SIZE + TILE_MIN
+
+        fractions.append((borders - starts[owner, axis]) / (ends[owner, axis] - starts[owner, axis]))
+        owners.append(owner)
+
+    fractions = np.concatenate(fractions)
+    owners = np.concatenate(owners)
+
+    order = np.lexsort((fractions, owners))
+    fractions, owners = fractions[order], owners[order]
+
+    # Pieces run between neighbouring cuts along the same quad, skipping any of no length
+    # (where a line passes exactly through the corner of a tile)
+    piece = (owners[:-1] == owners[1:]) & (fractions[1:] > fractions[:-1])
+
+    owner = owners[:-1][piece]
+    t0 = fractions[:-1][piece, None]
+    t1 = fractions[1:][piece, None]
+
+    source = quads[owner]
+
+    # Corners 0 and 3 are the right hand side of the line, 1 and 2 the left
+    right = source[:, 3] - source[:, 0]
+    left = source[:, 2] - source[:, 1]
+
+    pieces = np.stack([
+        source[:, 0] + t0 * right,
+        source[:, 1] + t0 * left,
+        source[:, 1] + t1 * left,
+        source[:, 0] + t1 * right,
+    ], axis = 1)
+
+    # Keep the uncut quads exactly as they were
+    whole = (t0[:, 0] == 0) & (t1[:, 0] == 1)
+    pieces[whole] = source[whole]
+
+    middles = starts[owner] + (t0 + t1) / 2 * (ends[owner] - starts[owner])
+
+    return pieces, tiles_of_points(middles, lower = True)
+
+def _weld(keys: np.ndarray, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    # Find the distinct (key, x, y) rows. Returns the key and point of each distinct row, sorted by key,
+    # and the index of the distinct row for every input row.
+    order = np.lexsort((points[:, 1], points[:, 0], keys))
+
+    sorted_keys, sorted_points = keys[order], points[order]
+
+    new = np.ones(len(order), dtype = bool)
+    new[1:] = (sorted_keys[1:] != sorted_keys[:-1]) | (sorted_points[1:] != sorted_points[:-1]).any(axis = 1)
+
+    inverse = np.empty(len(order), dtype = np.int64)
+    inverse[order] = np.cumsum(new) - 1
+
+    return sorted_keys[new], sorted_points[new], inverse
+
+def split_tiles(world: MapGeometry, min_x: int, min_y: int, max_x: int, max_y: int, compact: bool = False) -> Dict[Tuple[int, int], MapGeometry]:
+
+    '''
+    Split a MapGeometry in world coordinates (i.e. from merge_tiles) back into tiles, i.e.:
+
+    world = merge_tiles(island, 2, 3, 4, 5)
+    world.add_lines(4, [(2100, 3200)], [(3900, 4800)])
+
+    for (x, y), geo in split_tiles(world, 2, 3, 4, 5).items():
+        geo.save_as(os.path.join(tiles_directory, tile_filename(island.island, x, y)))
+
+    Returns (x, y) -> MapGeometry in that tile's local coordinates, for every tile in the block
+    (min_x, min_y) to (max_x, max_y) inclusive, including empty ones. Geometry outside the block is dropped.
+
+    Triangles crossing a border are clipped to each tile they overlap, and the pieces fan triangulated.
+    Quads are cut where their lines cross a border (see clip_quads), and lines running along a border
+    go to the tile below / to the left of it, unless that is outside the block. Vertices at the same place in a
+    tile are welded together, which also merges the duplicates merge_tiles leaves along the tile borders.
+    Everything is done in a few passes over whole layers, rather than tile by tile.
+    '''
+
+    width = max_x - min_x + 1
+    height = max_y - min_y + 1
+
+    tiles = {(x, y): MapGeometry(moon = world.moon, compact = compact) for y in range(min_y, max_y + 1) for x in range(min_x, max_x + 1)}
+
+    def tile_ids(positions: np.ndarray) -> np.ndarray:
+
+        # Number the tiles of the block, with -1 for anything outside of it
+        inside = (positions[:, 0] >= min_x) & (positions[:, 0] <= max_x) & (positions[:, 1] >= min_y) & (positions[:, 1] <= max_y)
+
+        return np.where(inside, (positions[:, 1] - min_y) * width + positions[:, 0] - min_x, -1)
+
+    def position_of(tile_id: int) -> Tuple[int, int]:
+
+        return min_x + tile_id % width, min_y + tile_id // width
+
+    offsets = np.array([tile_offset(*position_of(tile_id)) for tile_id in range(width * height)]).reshape(-1, 2)
+
+    with phase('world/split_meshes'):
+
+        for layer in world.memory_order:
+
+            tris = np.asarray(world.terrain_tris[layer], dtype = np.int64).reshape(-1, 3)
+
+            if len(tris) == 0:
+                continue
+
+            verts = np.asarray(world.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2)
+            corners = verts[tris]
+
+            low, high = _tile_ranges(corners.min(axis = 1), corners.max(axis = 1))
+
+            # Triangles inside a single tile are kept as they are
+            single = (low == high).all(axis = 1)
+            single_tiles = low[single]
+
+            # The rest are paired up with every tile their bounding box overlaps, within the block
+            low = np.maximum(low[~single], [min_x, min_y])
+            high = np.minimum(high[~single], [max_x, max_y])
+
+            spans = np.maximum(high - low + 1, 0)
+            pairs = spans[:, 0] * spans[:, 1]
+
+            owner = np.repeat(np.arange(len(pairs)), pairs)
+            local = np.arange(len(owner)) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+
+            positions = low[owner] + np.stack([local % spans[owner, 0], local // spans[owner, 0]], axis = 1)
+
+            pieces, piece_owner = clip_triangles(corners[~single][owner], positions)
+
+            triangles = np.concatenate([corners[single], pieces])
+            ids = np.concatenate([tile_ids(single_tiles), tile_ids(positions[piece_owner])])
+
+            triangles, ids = triangles[ids >= 0], ids[ids >= 0]
+
+            # Weld each tile's corners, which gives the vertices and triangles of every tile in one go
+            vertex_ids, vertex_points, inverse = _weld(np.repeat(ids, 3), triangles.reshape(-1, 2))
+
+            vertex_points -= offsets[vertex_ids]
+
+            tri_order = np.argsort(ids, kind = 'stable')
+            tri_indices = inverse.reshape(-1, 3)[tri_order]
+            tri_ids = ids[tri_order]
+
+            vertex_starts = np.searchsorted(vertex_ids, np.arange(width * height + 1))
+            tri_starts = np.searchsorted(tri_ids, np.arange(width * height + 1))
+
+            for tile_id in np.unique(tri_ids).tolist():
+
+                geo = tiles[position_of(tile_id)]
+
+                tile_verts = vertex_points[vertex_starts[tile_id]:vertex_starts[tile_id + 1]]
+                tile_tris = tri_indices[tri_starts[tile_id]:tri_starts[tile_id + 1]] - vertex_starts[tile_id]
+
+                if compact:
+                    geo.terrain_vertices[layer] = VertexArray.from_array(tile_verts)
+                    geo.terrain_tris[layer] = TriangleArray.from_array(tile_tris)
+                else:
+                    geo.terrain_vertices[layer] = TrackedList(tuple(vert) for vert in tile_verts.tolist())
+                    geo.terrain_tris[layer] = TrackedList(tuple(tri) for tri in tile_tris.tolist())
+
+    with phase('world/split_quads'):
+
+        for index, group in enumerate(world.line_data):
+
+            if len(group) == 0:
+                continue
+
+            pieces, positions = clip_quads(np.asarray(group, dtype = np.float64).reshape(-1, 4, 2))
+
+            # Lines along the bottom / left edge of the block belong to the tile inside it instead
+            below = positions < [min_x, min_y]
+
+            if below.any():
+                positions = np.where(below, tiles_of_points(pieces.mean(axis = 1)), positions)
+
+            ids = tile_ids(positions)
+            order = np.argsort(ids, kind = 'stable')
+
+            pieces, ids = pieces[order], ids[order]
+
+            starts = np.searchsorted(ids, np.arange(width * height + 1))
+
+            for tile_id in np.unique(ids[ids >= 0]).tolist():
+                tiles[position_of(tile_id)]._append_quads(index, pieces[starts[tile_id]:starts[tile_id + 1]] - offsets[tile_id])
+
+    return tiles
@@ -0,0 +1,47 @@
+from sw_ducky.archive import IslandArchive, pack_island
+from sw_ducky.synthetic import write_synthetic_island
+from sw_ducky.tileset import TileSet
+
+def _archive(tmp_path):
+
+    write_synthetic_island(str(tmp_path / 'tiles'), 'test_island', width = 2, height = 2, triangles_per_layer = 50, quads_per_group = 20)
+
+    path = tmp_path / 'test_island.duckyarc'
+
+    pack_island(TileSet(str(tmp_path / 'tiles'), 'test_island'), path)
+
+    return path
+
+def test_close_with_live_lazy_tile(tmp_path):
+
+    path = _archive(tmp_path)
+
+    with IslandArchive(path) as archive:
+
+        expected = archive.load(1, 0)
+
+        geo = archive.load(1, 0, lazy = True)
+
+        # Decode one chunk while the archive is open, and leave the rest for later
+        roads = list(geo.terrain_tris['Road'])
+
+    assert archive.data.closed
+
+    # Chunks read before and after closing both still work
+    assert roads == list(expected.terrain_tris['Road'])
+    assert list(geo.terrain_tris['Sand']) == list(expected.terrain_tris['Sand'])
+    assert len(geo.line_data[2]) == len(expected.line_data[2])
+    assert geo.to_bytes() == expected.to_bytes()
+
+def test_close_after_lazy_tile_closed(tmp_path):
+
+    path = _archive(tmp_path)
+
+    archive = IslandArchive(path)
+
+    with archive.load(0, 1, lazy = True) as geo:
+        geo.terrain_vertices['Grass']
+
+    archive.close()
+
+    assert archive.data.closed
@@ -0,0 +1,54 @@
+import io
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+from sw_ducky import MapGeometry
+from sw_ducky.export import export_tile
+
+ARID = os.path.join(os.path.dirname(__file__), '..', 'arid.bin')
+
+def _export(export_format: str) -> str:
+
+    output = io.BytesIO()
+
+    export_tile(MapGeometry.from_file(ARID), output, export_format)
+
+    return output.getvalue().decode()
+
+def test_svg_parses():
+
+    root = ElementTree.fromstring(_export('svg'))
+
+    assert root.tag.endswith('svg')
+    assert len(list(root.iter())) > 1
+
+def test_geojson_parses_with_ccw_rings():
+
+    document = json.loads(_export('geojson'))
+
+    rings = [np.array(polygon[0]) for feature in document['features'] if feature['geometry']['type'] == 'MultiPolygon' for polygon in feature['geometry']['coordinates']]
+
+    assert len(rings) > 0
+
+    for ring in rings:
+        assert (ring[0] == ring[-1]).all()
+        # Slivers with no area can go either way
+        assert (ring[:-1, 0] * ring[1:, 1] - ring[1:, 0] * ring[:-1, 1]).sum() > -1e-6
+
+def test_obj_indices_in_range():
+
+    vertex_count = 0
+
+    for line in _export('obj').splitlines():
+
+        if line.startswith('v '):
+            vertex_count += 1
+
+        elif line.startswith(('f ', 'l ')):
+            indices = [int(corner.split('/')[0]) for corner in line.split()[1:]]
+            assert all(1 <= index <= vertex_count for index in indices)
+
+    assert vertex_count > 0
@@ -0,0 +1,28 @@
+from sw_ducky import MapGeometry
+from sw_ducky.optimize import optimize_mesh
+from sw_ducky.validate import validate_file
+
+def test_collinear_triangles_are_dropped():
+
+    verts = [(0, 0), (5, 0), (10, 0), (0, 10), (0, 0)]
+    tris = [(0, 1, 2), (0, 2, 3), (0, 4, 1), (2, 3, 0)]
+
+    new_verts, new_tris, report = optimize_mesh(verts, tris)
+
+    assert new_tris.tolist() == [[0, 1, 2]]
+    assert new_verts.tolist() == [[0, 0], [10, 0], [0, 10]]
+    assert report['degenerate_triangles'] == 2
+    assert report['duplicate_triangles'] == 1
+
+def test_optimized_tile_validates(tmp_path):
+
+    geo = MapGeometry()
+    geo.add_geometry('Sand', [(0, 0), (5, 0), (10, 0), (0, 10)], [(0, 1, 2), (0, 2, 3)])
+    geo.optimize_geometry()
+
+    path = str(tmp_path / 'test_island_0_0_map_geometry.bin')
+    geo.save_as(path)
+
+    report = validate_file(path)
+
+    assert not any(diagnostic['code'] == 'degenerate_triangles' for diagnostic in report['warnings'])
@@ -0,0 +1,88 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from sw_ducky import MapGeometry
+from sw_ducky.parsing import index_chunks, read_line_quad_arrays, read_line_quads, read_mesh_chunk_arrays, read_single_mesh_chunk
+
+ARID = os.path.join(os.path.dirname(__file__), '..', 'arid.bin')
+
+def _arid() -> bytes:
+
+    with open(ARID, 'rb') as file_obj:
+        return file_obj.read()
+
+def _quad_chunk(quads: list) -> bytes:
+
+    # Pack quads the way the game does, with the alt and one_or_zero fields filled in
+    corners = b''.join(struct.pack('<fffIf', x, 0, y, 7, (1, 0, 0, 1)[corner]) for quad in quads for corner, (x, y) in enumerate(quad))
+
+    return struct.pack('<H', len(quads) * 4) + corners
+
+def test_mesh_arrays_match_scalar_parser():
+
+    data = _arid()
+    mesh_spans, _, _ = index_chunks(data)
+
+    for start, stop in mesh_spans:
+
+        (verts, tris), size = read_single_mesh_chunk(data, start)
+        (vert_array, tri_array), array_size = read_mesh_chunk_arrays(data, start)
+
+        assert size == array_size == stop - start
+        assert list(map(tuple, vert_array.tolist())) == verts
+        assert list(map(tuple, tri_array.tolist())) == tris
+
+def test_quad_arrays_match_scalar_parser():
+
+    data = _arid()
+    _, quad_spans, _ = index_chunks(data)
+
+    for start, stop in quad_spans:
+
+        quads, size = read_line_quads(data, start)
+        quad_array, array_size = read_line_quad_arrays(data, start)
+
+        assert size == array_size == stop - start
+        assert [tuple(map(tuple, quad)) for quad in quad_array.tolist()] == quads
+
+def test_broken_input_matches_scalar_parser():
+
+    square = ((0, 0), (1, 0), (1, 1), (0, 1))
+
+    chunk = _quad_chunk([square, ((np.nan, 0), (1, 0), (1, 1), (0, 1)), square, ((0, 0), (np.inf, 0), (1, 1), (0, 1)), ((0, 0), (1, 0), (1, -np.inf), (0, 1))])
+
+    quads, size = read_line_quads(chunk, 0)
+    quad_array, array_size = read_line_quad_arrays(chunk, 0)
+
+    assert len(quads) == 2
+    assert size == array_size
+    assert [tuple(map(tuple, quad)) for quad in quad_array.tolist()] == quads
+
+    mesh = struct.pack('<H', 2) + struct.pack('<fff', 1, 0, 2) + struct.pack('<fff', np.nan, 0, 3) + struct.pack('<H', 0)
+
+    with pytest.raises(ValueError) as scalar_error:
+        read_single_mesh_chunk(mesh, 0)
+
+    with pytest.raises(ValueError) as array_error:
+        read_mesh_chunk_arrays(mesh, 0)
+
+    assert str(scalar_error.value) == str(array_error.value)
+
+def test_storage_modes_load_the_same_layers():
+
+    plain = MapGeometry.from_file(ARID, vectorized = False)
+    compact = MapGeometry.from_file(ARID, compact = True)
+
+    with MapGeometry.from_file(ARID, lazy = True) as lazy:
+
+        for geo in (compact, lazy):
+
+            for layer in plain.memory_order:
+                assert np.array_equal(np.asarray(geo.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2), np.asarray(plain.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2))
+                assert np.array_equal(np.asarray(geo.terrain_tris[layer], dtype = np.int64).reshape(-1, 3), np.asarray(plain.terrain_tris[layer], dtype = np.int64).reshape(-1, 3))
+
+            for group, plain_group in zip(geo.line_data, plain.line_data):
+                assert np.array_equal(np.asarray(group, dtype = np.float64).reshape(-1, 4, 2), np.asarray(plain_group, dtype = np.float64).reshape(-1, 4, 2))
@@ -0,0 +1,45 @@
+import os
+
+from sw_ducky import MapGeometry
+from sw_ducky.patch import apply_patch_bytes, diff_bytes
+from sw_ducky.synthetic import synthetic_tile
+
+ARID = os.path.join(os.path.dirname(__file__), '..', 'arid.bin')
+
+def _arid() -> bytes:
+
+    with open(ARID, 'rb') as file_obj:
+        return file_obj.read()
+
+def test_round_trip():
+
+    base = _arid()
+
+    geo = MapGeometry.from_file(ARID)
+
+    for layer in geo.memory_order:
+        if len(geo.terrain_vertices[layer]) > 10:
+            geo.terrain_vertices[layer].insert(7, (1.0, 2.0))
+            del geo.terrain_tris[layer][2]
+
+    geo.add_line(2, (0, 0), (100, 100))
+    del geo.line_data[0][:8]
+
+    for target in (geo.to_bytes(), MapGeometry().to_bytes(), synthetic_tile(seed = 1, triangles_per_layer = 500).to_bytes()):
+        assert apply_patch_bytes(base, diff_bytes(base, target)) == target
+        assert apply_patch_bytes(target, diff_bytes(target, base)) == base
+
+def test_in_place_edit_is_small():
+
+    base = _arid()
+
+    geo = MapGeometry.from_file(ARID)
+
+    x, y = geo.terrain_vertices['Sand'][50]
+    geo.terrain_vertices['Sand'][50] = (x + 3, y - 2)
+
+    target = geo.to_bytes()
+    patch = diff_bytes(base, target)
+
+    assert apply_patch_bytes(base, patch) == target
+    assert len(patch) < 200
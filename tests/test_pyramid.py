@@ -0,0 +1,29 @@
+import os
+
+import pytest
+from PIL import Image
+
+from sw_ducky import TileSet
+from sw_ducky.pyramid import export_pyramid
+from sw_ducky.synthetic import write_synthetic_island
+
+@pytest.mark.parametrize('image_format', ['png', 'jpg', 'tif'])
+def test_image_formats(tmp_path, image_format):
+
+    write_synthetic_island(str(tmp_path / 'tiles'), 'test_island', width = 2, height = 2, triangles_per_layer = 50, quads_per_group = 10)
+
+    counts = export_pyramid(TileSet(str(tmp_path / 'tiles'), 'test_island'), str(tmp_path / 'pyramid'), tile_size = 64, image_format = image_format, processes = 1)
+
+    assert counts['rendered'] == 4
+
+    with Image.open(tmp_path / 'pyramid' / '0' / '0' / f'0.{image_format}') as img:
+        assert img.size == (64, 64)
+
+def test_unknown_image_format(tmp_path):
+
+    write_synthetic_island(str(tmp_path / 'tiles'), 'test_island', width = 1, height = 1, triangles_per_layer = 10, quads_per_group = 10)
+
+    with pytest.raises(ValueError):
+        export_pyramid(TileSet(str(tmp_path / 'tiles'), 'test_island'), str(tmp_path / 'pyramid'), image_format = 'bin', processes = 1)
+
+    assert not os.path.exists(tmp_path / 'pyramid' / '0')
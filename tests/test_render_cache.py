@@ -0,0 +1,36 @@
+import os
+
+from sw_ducky import MapGeometry
+from sw_ducky.parsing import index_chunks
+from sw_ducky.render_cache import RenderCache
+
+ARID = os.path.join(os.path.dirname(__file__), '..', 'arid.bin')
+
+def test_key_ignores_what_is_not_drawn():
+
+    with open(ARID, 'rb') as file_obj:
+        data = file_obj.read()
+
+    _, quad_spans, end = index_chunks(data)
+
+    # Fill in the alt value of the first quad corner, and add trailing bytes
+    alt = next(start for start, stop in quad_spans if stop - start > 2) + 2 + 12
+    modded = data[:alt] + b'\x07\x00\x00\x00' + data[alt + 4:end] + b'\x01\x02\x03\x04'
+
+    key = RenderCache.key(MapGeometry.from_bytes(data), 256)
+
+    assert RenderCache.key(MapGeometry.from_bytes(modded), 256) == key
+    assert RenderCache.key(MapGeometry.from_bytes(modded, compact = True), 256) == key
+    assert RenderCache.key(MapGeometry.from_bytes(modded, lazy = True), 256) == key
+
+    # Repacking a layer without changing it keeps the key, and so does an empty tile's missing chunks
+    geo = MapGeometry.from_bytes(data)
+    geo.terrain_vertices['Sand'] = list(geo.terrain_vertices['Sand'])
+
+    assert RenderCache.key(geo, 256) == key
+    assert RenderCache.key(MapGeometry(), 256) == RenderCache.key(MapGeometry.from_bytes(MapGeometry().to_bytes() + b'\x05'), 256)
+
+    geo.terrain_vertices['Sand'][0] = (0.0, 0.0)
+
+    assert RenderCache.key(geo, 256) != key
+    assert RenderCache.key(MapGeometry.from_bytes(data), 512) != key
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+from sw_ducky import MapGeometry
+from sw_ducky.parsing import QUAD_DTYPE, index_chunks
+from sw_ducky.profiling import Profile
+
+ARID = os.path.join(os.path.dirname(__file__), '..', 'arid.bin')
+
+def _arid() -> bytes:
+
+    with open(ARID, 'rb') as file_obj:
+        return file_obj.read()
+
+def _modded_arid() -> bytes:
+
+    # arid.bin, with the unused alt values of the quads filled in and extra bytes on the end
+    data = bytearray(_arid())
+
+    _, quad_spans, end = index_chunks(bytes(data))
+
+    for start, stop in quad_spans:
+
+        quads = np.frombuffer(data, dtype = QUAD_DTYPE, count = (stop - start - 2) // QUAD_DTYPE.itemsize, offset = start + 2)['corners']
+        alts = np.arange(quads.size, dtype = '<u4').reshape(quads.shape) + 1000
+
+        corners = np.frombuffer(data, dtype = np.uint8, count = stop - start - 2, offset = start + 2).reshape(-1, 20)
+        corners[:, 12:16] = alts.reshape(-1, 1).view(np.uint8)
+
+    return bytes(data[:end]) + b'\x01\x02\x03\x04\x05'
+
+@pytest.mark.parametrize('kwargs', [{}, {'vectorized': False}, {'compact': True}, {'lazy': True}])
+def test_unmodified_tiles_round_trip(kwargs):
+
+    for data in (_arid(), _modded_arid()):
+
+        geo = MapGeometry.from_bytes(data, **kwargs)
+
+        assert geo.modified_layers() == []
+        assert geo.modified_line_groups() == []
+        assert geo.to_bytes() == data
+
+@pytest.mark.parametrize('kwargs', [{}, {'compact': True}, {'lazy': True}])
+def test_editing_one_layer_repacks_one_chunk(kwargs):
+
+    data = _modded_arid()
+
+    geo = MapGeometry.from_bytes(data, **kwargs)
+
+    x, y = geo.terrain_vertices['Sand'][0]
+    geo.terrain_vertices['Sand'][0] = (x + 1, y)
+
+    assert geo.modified_layers() == ['Sand']
+    assert geo.modified_line_groups() == []
+
+    with Profile() as profile:
+        edited = geo.to_bytes()
+
+    assert profile.counters['save/chunks_packed'] == 1
+    assert profile.counters['save/chunks_copied'] == 20
+
+    # Everything but the Sand chunk is kept byte for byte, alt values and trailing bytes included
+    base_meshes, base_quads, base_end = index_chunks(data)
+    edited_meshes, edited_quads, edited_end = index_chunks(edited)
+
+    sand = geo.memory_order.index('Sand')
+
+    for index, ((start, stop), (edited_start, edited_stop)) in enumerate(zip(base_meshes + base_quads, edited_meshes + edited_quads)):
+        assert (data[start:stop] == edited[edited_start:edited_stop]) == (index != sand)
+
+    assert data[base_end:] == edited[edited_end:]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from sw_ducky import MapGeometry
+from sw_ducky.terrain_import import downscale_mask, mask_to_mesh
+from sw_ducky.triangulate import triangles_area
+
+def test_downscale_keeps_area():
+
+    checkerboard = (np.add.outer(np.arange(200), np.arange(200)) % 2).astype(bool)
+    noise = np.random.default_rng(0).random((300, 300)) < 0.3
+
+    for mask in (checkerboard, noise):
+        scaled = downscale_mask(mask, (mask.shape[1] // 2, mask.shape[0] // 2))
+        assert scaled.mean() == pytest.approx(mask.mean(), abs = 1e-3)
+
+def test_downscaled_import_warns():
+
+    checkerboard = (np.add.outer(np.arange(200), np.arange(200)) % 2).astype(bool)
+
+    with pytest.warns(UserWarning, match = '1/2 resolution'):
+        verts, tris = mask_to_mesh(checkerboard)
+
+    assert triangles_area(verts, tris) == pytest.approx(500000)
+
+def test_downscale_warning_points_at_the_caller():
+
+    checkerboard = (np.add.outer(np.arange(200), np.arange(200)) % 2).astype(bool)
+
+    geo = MapGeometry()
+
+    with pytest.warns(UserWarning) as add_mask_warnings:
+        geo.add_mask('Sand', checkerboard)
+
+    colors = np.zeros((200, 200, 3), dtype = np.uint8)
+    colors[checkerboard] = geo.layer_colors['Grass']
+
+    with pytest.warns(UserWarning) as import_warnings:
+        geo.import_image(colors)
+
+    for recorded in (add_mask_warnings, import_warnings):
+        assert recorded[0].filename == __file__
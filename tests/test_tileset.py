@@ -0,0 +1,23 @@
+import numpy as np
+
+from sw_ducky import TileSet
+from sw_ducky.columnar import VertexArray
+from sw_ducky.synthetic import write_synthetic_island
+
+def test_pool_load_matches_serial_load(tmp_path):
+
+    write_synthetic_island(str(tmp_path), 'test_island', width = 2, height = 2, triangles_per_layer = 50, quads_per_group = 20)
+
+    serial = TileSet(str(tmp_path), 'test_island').load(processes = 1)
+    pooled = TileSet(str(tmp_path), 'test_island').load(processes = 2)
+
+    for position in serial.paths:
+
+        assert isinstance(pooled[position].terrain_vertices['Sand'], VertexArray)
+        assert pooled[position].to_bytes() == serial[position].to_bytes()
+
+        for layer in serial[position].memory_order:
+            assert np.array_equal(np.asarray(pooled[position].terrain_vertices[layer]).reshape(-1, 2), np.asarray(serial[position].terrain_vertices[layer]).reshape(-1, 2))
+
+    # Missing tiles match the loaded ones
+    assert isinstance(pooled[(5, 5)].terrain_vertices['Sand'], VertexArray)
@@ -0,0 +1,17 @@
+import os
+
+from sw_ducky.synthetic import write_synthetic_island
+from sw_ducky.validate import find_geometry_files, validate_files
+
+def test_moon_inferred_per_file(tmp_path):
+
+    write_synthetic_island(str(tmp_path), 'moon_surface', width = 1, height = 1, triangles_per_layer = 20, quads_per_group = 5)
+    write_synthetic_island(str(tmp_path), 'arid_island', width = 1, height = 1, triangles_per_layer = 20, quads_per_group = 5)
+
+    paths = find_geometry_files(str(tmp_path))
+
+    reports = validate_files(paths, processes = 1)['files']
+    assert {report['path']: report['moon'] for report in reports} == {path: os.path.basename(path).startswith('moon_') for path in paths}
+
+    reports = validate_files(paths, moon = True, processes = 1)['files']
+    assert all(report['moon'] for report in reports)
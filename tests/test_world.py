@@ -0,0 +1,68 @@
+import numpy as np
+
+from sw_ducky import MapGeometry, TileSet
+from sw_ducky.synthetic import write_synthetic_island
+from sw_ducky.world import merge_tiles, split_tiles
+
+def _triangles(geo: MapGeometry, layer: str) -> list:
+
+    corners = np.asarray(geo.terrain_vertices[layer], dtype = np.float64).reshape(-1, 2)[np.asarray(geo.terrain_tris[layer], dtype = np.int64).reshape(-1, 3)]
+
+    # Start each triangle from its smallest corner, so welding and reindexing don't matter
+    shapes = []
+
+    for tri in np.round(corners, 3).tolist():
+        first = tri.index(min(tri))
+        shapes.append(tuple(map(tuple, tri[first:] + tri[:first])))
+
+    return sorted(shapes)
+
+def _quads(geo: MapGeometry, index: int) -> list:
+
+    return sorted(map(tuple, np.round(np.asarray(geo.line_data[index], dtype = np.float64).reshape(-1, 8), 3).tolist()))
+
+def test_lines_on_the_border_stay(tmp_path):
+
+    geo = MapGeometry()
+    geo.add_line(0, (500, -100), (500, 100))
+    geo.add_line(0, (-200, 0), (200, 0))
+    geo.save_as(str(tmp_path / 'test_island_0_0_map_geometry.bin'))
+
+    island = TileSet(str(tmp_path), 'test_island')
+
+    tiles = split_tiles(merge_tiles(island), 0, 0, 0, 0)
+
+    assert _quads(tiles[(0, 0)], 0) == _quads(island[(0, 0)], 0)
+
+def _on_border(quad: tuple, axis: int, side: float) -> bool:
+
+    # Whether the line of a quad runs along one edge of its tile
+    return (quad[axis] + quad[2 + axis] + quad[4 + axis] + quad[6 + axis]) / 4 == side
+
+def test_merge_split_round_trip(tmp_path):
+
+    write_synthetic_island(str(tmp_path), 'test_island', width = 3, height = 3, triangles_per_layer = 50, quads_per_group = 100)
+
+    island = TileSet(str(tmp_path), 'test_island')
+
+    tiles = split_tiles(merge_tiles(island), island.min_x, island.min_y, island.max_x, island.max_y)
+
+    for index in range(len(island[(0, 0)].line_data)):
+        assert sum(len(geo.line_data[index]) for geo in tiles.values()) == sum(len(island[position].line_data[index]) for position in tiles)
+
+    for (x, y), geo in tiles.items():
+
+        original = island[(x, y)]
+
+        for layer in geo.memory_order:
+            assert _triangles(geo, layer) == _triangles(original, layer)
+
+        # Lines along a border between two tiles can only go to one of them, the one below / to the left
+        shared = [(0, x > island.min_x, x < island.max_x), (1, y > island.min_y, y < island.max_y)]
+
+        def away_from_shared_borders(quads: list) -> list:
+            return [quad for quad in quads if not any((low and _on_border(quad, axis, -500)) or (high and _on_border(quad, axis, 500)) for axis, low, high in shared)]
+
+        for index in range(len(geo.line_data)):
+            assert away_from_shared_borders(_quads(geo, index)) == away_from_shared_borders(_quads(original, index))
+            assert not any(_on_border(quad, axis, -500) for quad in _quads(geo, index) for axis, low, _ in shared if low)